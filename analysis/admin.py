@@ -1,22 +1,64 @@
 from django.contrib import admin
-from django.utils.html import format_html
-from .models import Analysis
+from django.utils.html import format_html, format_html_join
+from .models import Analysis, AnalysisJob, VariantAnnotation
 
 @admin.register(Analysis)
 class AnalysisAdmin(admin.ModelAdmin):
-    list_display = ('id', 'vcf_file', 'created_at', 'status', 'total_variants', 'plot_quality_img')
+    list_display = ('id', 'vcf_file', 'created_at', 'status', 'total_variants', 'completed_at', 'duration',
+                    'plot_quality_img')
     list_filter = ('status', 'created_at')
     search_fields = ('vcf_file',)
-    readonly_fields = ('metrics', 'plot_quality', 'plot_density', 'annotation_file')
+    readonly_fields = ('metrics', 'plot_quality', 'plot_density', 'annotation_file',
+                       'total_variants', 'snp_count', 'indel_count', 'mnv_count', 'completed_at', 'stage_timings_table')
+    exclude = ('stage_timings',)
+    list_per_page = 50
 
-    def total_variants(self, obj):
-        if obj.metrics and 'total_variants' in obj.metrics:
-            return obj.metrics['total_variants']
-        return '-'
-    total_variants.short_description = 'Total de Variantes'
+    def get_queryset(self, request):
+        # A lista lê só o resumo; a página de edição carrega tudo
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            return queryset.only(*Analysis.SUMMARY_FIELDS, 'plot_quality', 'stage_timings')
+        return queryset.with_results()
 
     def plot_quality_img(self, obj):
         if obj.plot_quality:
             return format_html('<img src="/media/{}" width="200"/>', obj.plot_quality)
         return '-'
     plot_quality_img.short_description = 'Gráfico QUAL'
+
+    def duration(self, obj):
+        if not obj.stage_timings:
+            return '-'
+        return f"{sum(stage.get('wall_s', 0) for stage in obj.stage_timings):.1f}s"
+    duration.short_description = 'Duração'
+
+    def stage_timings_table(self, obj):
+        if not obj.stage_timings:
+            return '-'
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+            ((s['stage'], f"{s['wall_s']:.2f}", '-' if s.get('cpu_s') is None else f"{s['cpu_s']:.2f}",
+              '-' if s.get('peak_rss_mb') is None else f"{s['peak_rss_mb']:.1f}",
+              '-' if s.get('rows') is None else s['rows']) for s in obj.stage_timings),
+        )
+        return format_html(
+            '<table><thead><tr><th>Etapa</th><th>Tempo (s)</th><th>CPU (s)</th><th>Pico RSS (MB)</th>'
+            '<th>Linhas</th></tr></thead><tbody>{}</tbody></table>', rows,
+        )
+    stage_timings_table.short_description = 'Tempo por etapa'
+
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'analysis_id', 'status', 'attempts', 'locked_by', 'heartbeat_at', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('locked_by', 'locked_at', 'heartbeat_at', 'finished_at', 'last_error')
+
+
+@admin.register(VariantAnnotation)
+class VariantAnnotationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'analysis_id', 'chrom', 'pos', 'ref', 'alt', 'genes')
+    search_fields = ('genes', 'chrom')
+    raw_id_fields = ('analysis',)
+    # Contagem exata é cara em tabelas grandes
+    show_full_result_count = False
@@ -0,0 +1,495 @@
+import os
+import numpy as np
+from collections import Counter
+from fractions import Fraction
+
+from .annotation import TI, TV
+
+# Resolução base (bp) das contagens de densidade mantidas durante o streaming
+DENSITY_BASE_WINDOW = 100
+
+# Pirâmide de densidade de cada análise (em results/<id>/)
+DENSITY_PYRAMID_NAME = "density.npz"
+
+LOW_QUALITY_THRESHOLD = 20
+
+# Quantis de QUAL reportados (mediana e percentis)
+QUAL_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Máximo de bins do histograma de QUAL: acima disso a largura dobra
+QUAL_MAX_BINS = 4096
+
+# Bins do histograma de QUAL gravado em plot_data (resumo, não o estado completo)
+QUAL_SUMMARY_BINS = 100
+
+
+class ExactSum:
+    """Soma exata de valores de ponto flutuante.
+
+    Cada float é decomposto em mantissa inteira e expoente binário e somado
+    como inteiro, então o resultado não depende da ordem em que os valores
+    (ou somas de outros blocos) são adicionados: médias calculadas em blocos
+    ou em paralelo coincidem bit a bit.
+    """
+
+    _BLOCK = 1 << 20
+
+    def __init__(self):
+        self.numerator = 0
+        self.exponent = 0
+        self.special = 0.0
+
+    def _add_int(self, numerator, exponent):
+        if exponent < self.exponent:
+            self.numerator <<= self.exponent - exponent
+            self.exponent = exponent
+        self.numerator += numerator << (exponent - self.exponent)
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        finite = np.isfinite(values)
+        if not finite.all():
+            self.special += float(values[~finite].sum())
+            values = values[finite]
+        values = values[values != 0]
+        if values.size == 0:
+            return
+
+        mantissa, exp = np.frexp(values)
+        m = (mantissa * 2.0 ** 53).astype(np.int64)
+        exp = exp.astype(np.int64) - 53
+        # Metades de 27 bits: somas por expoente cabem exatamente em float64
+        sign = np.sign(m)
+        hi = (np.abs(m) >> 26) * sign
+        lo = (np.abs(m) & ((1 << 26) - 1)) * sign
+        uniq, inv = np.unique(exp, return_inverse=True)
+        for start in range(0, values.size, self._BLOCK):
+            block = slice(start, start + self._BLOCK)
+            sum_hi = np.bincount(inv[block], weights=hi[block], minlength=uniq.size)
+            sum_lo = np.bincount(inv[block], weights=lo[block], minlength=uniq.size)
+            for e, sh, sl in zip(uniq.tolist(), sum_hi.tolist(), sum_lo.tolist()):
+                self._add_int((int(sh) << 26) + int(sl), e)
+
+    def add(self, x):
+        self.add_many([x])
+
+    def merge(self, other):
+        self._add_int(other.numerator, other.exponent)
+        self.special += other.special
+        return self
+
+    def state(self):
+        # Numerador inteiro sem limite de tamanho: guardado como texto
+        return {"numerator": str(self.numerator), "exponent": self.exponent, "special": self.special}
+
+    @classmethod
+    def from_state(cls, state):
+        total = cls()
+        total.numerator = int(state["numerator"])
+        total.exponent = int(state["exponent"])
+        total.special = float(state["special"])
+        return total
+
+    @property
+    def value(self):
+        if self.exponent >= 0:
+            exact = Fraction(self.numerator << self.exponent)
+        else:
+            exact = Fraction(self.numerator, 1 << -self.exponent)
+        return float(exact) + self.special
+
+
+def _group_bins(counts, factor):
+    """Soma grupos de ``factor`` bins vizinhos (o último grupo pode ser incompleto)."""
+    padded = np.zeros(-(-counts.size // factor) * factor, dtype=np.int64)
+    padded[:counts.size] = counts
+    return padded.reshape(-1, factor).sum(axis=1)
+
+
+class QualHistogram:
+    """Histograma de QUAL com bins de largura fixa, crescendo sob demanda.
+
+    O número de bins é limitado a ``max_bins``: um QUAL que exigiria mais
+    bins dobra a largura (somando bins vizinhos aos pares) até caber, de modo
+    que a memória não depende do maior QUAL do arquivo.
+    """
+
+    def __init__(self, bin_width=1.0, max_bins=QUAL_MAX_BINS):
+        self.bin_width = float(bin_width)
+        self.max_bins = int(max_bins)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.count = 0
+        self.total = ExactSum()
+        self.min = None
+        self.max = None
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        self.count += int(values.size)
+        self.total.add_many(values)
+        # QUAL "nan"/"inf" entra na média (como no PyVCF), mas não nos bins
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+        values = np.clip(values, 0, None)
+        while np.floor(values.max() / self.bin_width) >= self.max_bins:
+            self._coarsen()
+        bins = np.floor(values / self.bin_width).astype(np.int64)
+        self._grow(int(bins.max()) + 1)
+        self.counts[:bins.max() + 1] += np.bincount(bins)
+        vmin, vmax = float(values.min()), float(values.max())
+        self.min = vmin if self.min is None else min(self.min, vmin)
+        self.max = vmax if self.max is None else max(self.max, vmax)
+
+    def _grow(self, size):
+        if size > self.counts.size:
+            self.counts = np.concatenate([self.counts, np.zeros(size - self.counts.size, dtype=np.int64)])
+
+    def _coarsen(self, factor=2):
+        """Multiplica a largura dos bins por ``factor``, somando grupos de bins vizinhos."""
+        self.counts = _group_bins(self.counts, factor)
+        self.bin_width *= factor
+
+    def merge(self, other):
+        other_counts = other.counts
+        while self.bin_width < other.bin_width:
+            self._coarsen()
+        if other.bin_width < self.bin_width:
+            # Larguras são a largura inicial vezes potências de dois
+            other_counts = _group_bins(other_counts, int(round(self.bin_width / other.bin_width)))
+        self._grow(other_counts.size)
+        self.counts[:other_counts.size] += other_counts
+        self.count += other.count
+        self.total.merge(other.total)
+        for attr, pick in (("min", min), ("max", max)):
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            if theirs is not None:
+                setattr(self, attr, theirs if mine is None else pick(mine, theirs))
+        return self
+
+    @property
+    def mean(self):
+        return self.total.value / self.count if self.count else 0
+
+    def edges(self):
+        return np.arange(self.counts.size + 1) * self.bin_width
+
+    def quantile(self, q):
+        """Quantil ``q`` (0-1) estimado pelos bins, com interpolação linear dentro do bin.
+
+        O erro é de no máximo ``bin_width``; valores não finitos não entram.
+        """
+        binned = int(self.counts.sum())
+        if not binned:
+            return None
+        cumulative = np.cumsum(self.counts)
+        target = q * binned
+        i = int(np.searchsorted(cumulative, target, side="left"))
+        i = min(i, self.counts.size - 1)
+        before = cumulative[i - 1] if i else 0
+        fraction = (target - before) / self.counts[i] if self.counts[i] else 0.0
+        value = (i + fraction) * self.bin_width
+        # Limita ao intervalo observado (bins das pontas são parcialmente ocupados)
+        return float(min(max(value, self.min), self.max))
+
+    def rebinned(self, max_bins=60):
+        """``(edges, counts)`` agrupando bins vizinhos até no máximo ``max_bins``."""
+        first = int(np.flatnonzero(self.counts)[0]) if self.counts.any() else 0
+        counts = self.counts[first:]
+        k = max(1, -(-counts.size // max_bins))
+        padded = np.zeros(-(-counts.size // k) * k, dtype=np.int64)
+        padded[:counts.size] = counts
+        grouped = padded.reshape(-1, k).sum(axis=1)
+        edges = (first + np.arange(grouped.size + 1) * k) * self.bin_width
+        return edges, grouped
+
+    def summary(self):
+        """Resumo compacto: média, extremos e quantis (para métricas e relatório)."""
+        return {
+            "count": self.count,
+            "mean": float(self.mean),
+            "min": self.min,
+            "max": self.max,
+            "quantiles": {f"p{int(q * 100)}": self.quantile(q) for q in QUAL_QUANTILES},
+        }
+
+    def state(self):
+        """Estado completo (para retomar a análise sem reler o VCF)."""
+        return {"bin_width": self.bin_width, "max_bins": self.max_bins, "counts": self.counts.tolist(),
+                "count": self.count, "total": self.total.state(), "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_state(cls, state):
+        histogram = cls(state["bin_width"], state.get("max_bins", QUAL_MAX_BINS))
+        histogram.counts = np.asarray(state["counts"], dtype=np.int64)
+        histogram.count = int(state["count"])
+        histogram.total = ExactSum.from_state(state["total"])
+        histogram.min, histogram.max = state["min"], state["max"]
+        return histogram
+
+    def to_dict(self, max_bins=QUAL_SUMMARY_BINS):
+        """Histograma serializável com até ``max_bins`` bins (pontas vazias removidas) + resumo."""
+        nonzero = np.flatnonzero(self.counts)
+        first, last = (int(nonzero[0]), int(nonzero[-1]) + 1) if nonzero.size else (0, 0)
+        factor = max(1, -(-(last - first) // max_bins))
+        return {
+            "bin_width": self.bin_width * factor,
+            "start": first * self.bin_width,
+            "counts": _group_bins(self.counts[first:last], factor).tolist(),
+            **self.summary(),
+        }
+
+
+class DensityCounter:
+    """Contagens de variantes por janela, por cromossomo, numa resolução base.
+
+    Janelas maiores são obtidas somando bins base, com a mesma convenção de
+    ``np.histogram`` usada em ``VCFAnalyzer.calculate_density`` (a última
+    janela é fechada à direita).
+    """
+
+    def __init__(self, base_window=DENSITY_BASE_WINDOW):
+        self.base_window = int(base_window)
+        self.counts = {}
+        self.max_pos = {}
+
+    def add(self, chrom, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        if positions.size == 0:
+            return
+        bins = positions // self.base_window
+        size = int(bins.max()) + 1
+        current = self.counts.get(chrom)
+        if current is None:
+            current = np.zeros(size, dtype=np.int64)
+        elif current.size < size:
+            current = np.concatenate([current, np.zeros(size - current.size, dtype=np.int64)])
+        current[:size] += np.bincount(bins, minlength=size)
+        self.counts[chrom] = current
+        self.max_pos[chrom] = max(self.max_pos.get(chrom, 0), int(positions.max()))
+
+    def merge(self, other):
+        if other.base_window != self.base_window:
+            raise ValueError("Resoluções base de densidade diferentes")
+        for chrom, counts in other.counts.items():
+            current = self.counts.get(chrom)
+            if current is None:
+                self.counts[chrom] = counts.copy()
+            else:
+                size = max(current.size, counts.size)
+                merged = np.zeros(size, dtype=np.int64)
+                merged[:current.size] += current
+                merged[:counts.size] += counts
+                self.counts[chrom] = merged
+            self.max_pos[chrom] = max(self.max_pos.get(chrom, 0), other.max_pos[chrom])
+        return self
+
+    def windows(self, chrom, window_size):
+        """Retorna (inícios, contagens) das janelas de ``window_size`` bp."""
+        if window_size % self.base_window:
+            raise ValueError(
+                f"Janela de {window_size} bp não é múltipla da resolução base ({self.base_window} bp)"
+            )
+        k = window_size // self.base_window
+        n_windows = -(-self.max_pos.get(chrom, 0) // window_size)
+        base = self.counts.get(chrom, np.zeros(0, dtype=np.int64))
+        padded = np.zeros(max(n_windows * k, -(-base.size // k) * k), dtype=np.int64)
+        padded[:base.size] = base
+        counts = padded.reshape(-1, k).sum(axis=1)
+        if counts.size > n_windows:
+            if n_windows:
+                counts[n_windows - 1] += counts[n_windows:].sum()
+            counts = counts[:n_windows]
+        return np.arange(n_windows, dtype=np.int64) * window_size, counts
+
+
+class DensityPyramid:
+    """Contagens de densidade em vários níveis de resolução, por cromossomo.
+
+    O nível 0 são os bins base de um ``DensityCounter`` e o nível ``k`` soma
+    ``2**k`` bins base. Uma janela qualquer (múltipla da resolução base) é
+    obtida somando o nível mais grosso que a divide, só no trecho pedido.
+    Os bins além da última janela (posição igual ao máximo) são somados ao
+    último bin, mantendo a convenção de ``np.histogram``.
+    """
+
+    def __init__(self, base_window, levels, max_pos):
+        self.base_window = int(base_window)
+        self.levels = levels
+        self.max_pos = max_pos
+
+    @classmethod
+    def from_counter(cls, counter):
+        levels = {}
+        for chrom, counts in counter.counts.items():
+            n_base = -(-counter.max_pos[chrom] // counter.base_window)
+            base = np.zeros(n_base, dtype=np.int64)
+            base[:min(n_base, counts.size)] = counts[:n_base]
+            if n_base and counts.size > n_base:
+                base[-1] += counts[n_base:].sum()
+            chrom_levels = [base]
+            while chrom_levels[-1].size > 1:
+                prev = chrom_levels[-1]
+                padded = np.zeros(prev.size + prev.size % 2, dtype=np.int64)
+                padded[:prev.size] = prev
+                chrom_levels.append(padded.reshape(-1, 2).sum(axis=1))
+            levels[chrom] = chrom_levels
+        return cls(counter.base_window, levels, dict(counter.max_pos))
+
+    @property
+    def chroms(self):
+        return list(self.levels)
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for chrom_levels in self.levels.values() for level in chrom_levels)
+
+    def length(self, chrom):
+        """Fim (exclusivo) do trecho coberto pelos bins de ``chrom``."""
+        return self.levels[chrom][0].size * self.base_window
+
+    def auto_window(self, start, end, max_bins):
+        """Menor janela da pirâmide (base × 2**k) com no máximo ``max_bins`` janelas em [start, end)."""
+        window = self.base_window
+        while -(-(end - start) // window) > max_bins:
+            window *= 2
+        return window
+
+    def windows(self, chrom, window_size, start=0, end=None):
+        """Retorna (inícios, contagens) das janelas de ``window_size`` bp que cobrem [start, end)."""
+        if window_size <= 0 or window_size % self.base_window:
+            raise ValueError(
+                f"Janela de {window_size} bp não é múltipla da resolução base ({self.base_window} bp)"
+            )
+        k = window_size // self.base_window
+        level = min((k & -k).bit_length() - 1, len(self.levels[chrom]) - 1)
+        counts = self.levels[chrom][level]
+        step = k >> level
+        n_windows = -(-self.levels[chrom][0].size // k)
+        first = max(int(start), 0) // window_size
+        last = n_windows if end is None else min(n_windows, -(-int(end) // window_size))
+        if last <= first:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        padded = np.zeros((last - first) * step, dtype=np.int64)
+        chunk = counts[first * step:last * step]
+        padded[:chunk.size] = chunk
+        return np.arange(first, last, dtype=np.int64) * window_size, padded.reshape(-1, step).sum(axis=1)
+
+    def save(self, path):
+        """Grava a pirâmide (todos os níveis) em ``path`` (.npz compactado)."""
+        chroms = self.chroms
+        arrays = {
+            f"c{i}_l{k}": level
+            for i, chrom in enumerate(chroms) for k, level in enumerate(self.levels[chrom])
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                base_window=np.array(self.base_window),
+                chroms=np.array(chroms, dtype=str),
+                max_pos=np.array([self.max_pos[c] for c in chroms], dtype=np.int64),
+                n_levels=np.array([len(self.levels[c]) for c in chroms], dtype=np.int64),
+                **arrays,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            chroms = data["chroms"].tolist()
+            levels = {
+                chrom: [data[f"c{i}_l{k}"] for k in range(int(data["n_levels"][i]))]
+                for i, chrom in enumerate(chroms)
+            }
+            max_pos = dict(zip(chroms, data["max_pos"].tolist()))
+            return cls(int(data["base_window"]), levels, max_pos)
+
+
+class VariantStats:
+    """Agregados de um conjunto de variantes, atualizados bloco a bloco.
+
+    Cada bloco é um DataFrame com as colunas de ``VARIANT_COLUMNS``; os
+    contadores são calculados de forma vetorizada e blocos (ou shards)
+    diferentes podem ser combinados com ``merge``.
+    """
+
+    def __init__(self, base_window=DENSITY_BASE_WINDOW, qual_bin_width=1.0):
+        self.counters = Counter()
+        self.chrom_distribution = {}
+        self.impact_counts = {}
+        self.quality = QualHistogram(qual_bin_width)
+        self.density = DensityCounter(base_window)
+
+    def update(self, chunk):
+        if chunk.empty:
+            return
+        types = chunk["TYPE"].to_numpy()
+        qual = chunk["QUAL"].to_numpy(dtype=np.float64)
+        self.counters["total_variants"] += len(chunk)
+        self.counters["snp_count"] += int((types == "SNP").sum())
+        self.counters["indel_count"] += int((types == "INDEL").sum())
+        self.counters["mnv_count"] += int((types == "MNV").sum())
+        self.counters["low_quality_count"] += int((qual < LOW_QUALITY_THRESHOLD).sum())
+
+        pair = chunk["REF"].astype(str) + ">" + chunk["ALT"].astype(str)
+        snp = types == "SNP"
+        self.counters["transitions"] += int((snp & pair.isin({f"{r}>{a}" for r, a in TI}).to_numpy()).sum())
+        self.counters["transversions"] += int((snp & pair.isin({f"{r}>{a}" for r, a in TV}).to_numpy()).sum())
+
+        self.quality.add(qual)
+        for chrom, rows in chunk.groupby("CHROM", sort=False).indices.items():
+            self.chrom_distribution[chrom] = self.chrom_distribution.get(chrom, 0) + len(rows)
+            self.density.add(chrom, chunk["POS"].to_numpy(dtype=np.int64)[rows])
+
+        impacts = chunk.loc[chunk["IMPACT"].fillna("") != "", "IMPACT"]
+        for impact, n in impacts.groupby(impacts, sort=False).size().items():
+            self.impact_counts[impact] = self.impact_counts.get(impact, 0) + int(n)
+
+    def state(self):
+        """Agregados serializáveis em JSON (a densidade é refeita das posições)."""
+        return {
+            "counters": dict(self.counters),
+            "chrom_distribution": self.chrom_distribution,
+            "impact_counts": self.impact_counts,
+            "quality": self.quality.state(),
+        }
+
+    @classmethod
+    def from_state(cls, state, positions, base_window=DENSITY_BASE_WINDOW):
+        """Reconstrói os agregados a partir de ``state`` e das posições por cromossomo."""
+        stats = cls(base_window=base_window)
+        stats.counters.update(state["counters"])
+        stats.chrom_distribution = dict(state["chrom_distribution"])
+        stats.impact_counts = dict(state["impact_counts"])
+        stats.quality = QualHistogram.from_state(state["quality"])
+        for chrom, pos in positions.items():
+            stats.density.add(chrom, pos)
+        return stats
+
+    def merge(self, other):
+        self.counters.update(other.counters)
+        for attr in ("chrom_distribution", "impact_counts"):
+            mine = getattr(self, attr)
+            for key, n in getattr(other, attr).items():
+                mine[key] = mine.get(key, 0) + n
+        self.quality.merge(other.quality)
+        self.density.merge(other.density)
+        return self
+
+    def apply(self, metrics):
+        """Copia os agregados para o dicionário ``metrics`` do analisador."""
+        for key in ("total_variants", "snp_count", "indel_count", "mnv_count",
+                    "low_quality_count", "transitions", "transversions"):
+            metrics[key] = self.counters[key]
+        metrics["chrom_distribution"] = dict(self.chrom_distribution)
+        metrics["impact_counts"] = dict(self.impact_counts)
+        if self.quality.count:
+            metrics["mean_quality"] = float(self.quality.mean)
+            metrics["quality_quantiles"] = self.quality.summary()["quantiles"]
+            metrics["median_quality"] = metrics["quality_quantiles"]["p50"]
+        if metrics["transversions"] > 0:
+            metrics["ti_tv_ratio"] = metrics["transitions"] / metrics["transversions"]
+        return metrics
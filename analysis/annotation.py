@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+TI = {("A", "G"), ("G", "A"), ("C", "T"), ("T", "C")}
+TV = {("A", "C"), ("C", "A"), ("A", "T"), ("T", "A"),
+      ("G", "C"), ("C", "G"), ("G", "T"), ("T", "G")}
+
+# Ordem de prioridade usada para classificar o primeiro registro do campo ANN
+IMPACT_TERMS = [
+    ("synonymous_variant", "synonymous"),
+    ("missense_variant", "nonsynonymous"),
+    ("frameshift_variant", "frameshift"),
+    ("stop_gained", "stop_gain"),
+    ("stop_lost", "stop_loss"),
+]
+
+PAIR_COLUMNS = ["ROW", "GENE", "ORDER"]
+
+
+def classify_impact(ann_str):
+    """Retorna a categoria de impacto funcional de uma anotação ANN (ou '')."""
+    if ann_str:
+        for term, label in IMPACT_TERMS:
+            if term in ann_str:
+                return label
+    return ""
+
+
+def assign_genes(df, gene_index):
+    """Associa variantes a genes com uma junção ordenada por cromossomo.
+
+    Retorna um DataFrame com uma linha por par (variante, gene): ``ROW`` é a
+    posição da variante em ``df``, ``GENE`` o nome do gene e ``ORDER`` a ordem
+    do gene no GFF, já ordenado por ``ROW``/``ORDER``.
+    """
+    if df.empty or gene_index is None:
+        return pd.DataFrame({col: [] for col in PAIR_COLUMNS})
+
+    positions = df["POS"].to_numpy(dtype=np.int64)
+    parts = []
+    for chrom, rows in df.groupby("CHROM", sort=False).indices.items():
+        var_idx, names, order = gene_index.overlap_pairs(chrom, positions[rows])
+        if var_idx.size:
+            parts.append(pd.DataFrame({"ROW": rows[var_idx], "GENE": names, "ORDER": order}))
+
+    if not parts:
+        return pd.DataFrame({col: [] for col in PAIR_COLUMNS})
+    pairs = pd.concat(parts, ignore_index=True)
+    return pairs.sort_values(["ROW", "ORDER"], kind="stable", ignore_index=True)
+
+
+def join_genes(pairs, n_rows, empty=""):
+    """Monta a coluna GENES (nomes separados por vírgula) a partir dos pares."""
+    genes = np.full(n_rows, empty, dtype=object)
+    if not len(pairs):
+        return genes
+
+    # Os pares estão ordenados por ROW: o k-ésimo gene de cada linha é
+    # concatenado em bloco, uma passada por k, sem agrupar linha a linha.
+    rows = pairs["ROW"].to_numpy(dtype=np.int64)
+    names = pairs["GENE"].to_numpy(dtype=object)
+    rank = np.arange(rows.size) - np.searchsorted(rows, rows, side="left")
+    first = rank == 0
+    genes[rows[first]] = names[first]
+    for k in range(1, int(rank.max()) + 1):
+        sel = rank == k
+        genes[rows[sel]] = genes[rows[sel]] + "," + names[sel]
+    return genes
+
+
+class GeneTally:
+    """Contagens por gene acumuladas bloco a bloco.
+
+    Guarda o número de variantes e as transições/transversões de cada gene na
+    ordem de primeira ocorrência, de modo que o resultado de vários blocos
+    combinados é igual ao de uma única passada sobre a tabela inteira.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.ti_tv = {}
+
+    def update(self, df, pairs, weights=None):
+        if not len(pairs):
+            return self
+        rows = pairs["ROW"].to_numpy(dtype=np.int64)
+        genes = pairs["GENE"].to_numpy()
+        w = np.ones(rows.size, dtype=np.int64) if weights is None else np.asarray(weights)[rows]
+        is_ti, is_tv = substitution_classes(df)
+        tally = pd.DataFrame({
+            "GENE": genes,
+            "N": w,
+            "Ti": is_ti[rows].astype(np.int64),
+            "Tv": is_tv[rows].astype(np.int64),
+        }).groupby("GENE", sort=False)[["N", "Ti", "Tv"]].sum()
+
+        for gene, n, ti, tv in zip(tally.index, tally["N"].tolist(), tally["Ti"].tolist(), tally["Tv"].tolist()):
+            self.counts[gene] = self.counts.get(gene, 0) + n
+            if ti or tv or gene in self.ti_tv:
+                entry = self.ti_tv.setdefault(gene, [0, 0])
+                entry[0] += ti
+                entry[1] += tv
+        return self
+
+    def merge(self, other):
+        for gene, n in other.counts.items():
+            self.counts[gene] = self.counts.get(gene, 0) + n
+        for gene, (ti, tv) in other.ti_tv.items():
+            entry = self.ti_tv.setdefault(gene, [0, 0])
+            entry[0] += ti
+            entry[1] += tv
+        return self
+
+    def top(self, n=10):
+        """Genes mais mutados, desempatando pela ordem de primeira ocorrência."""
+        return sorted(self.counts.items(), key=lambda kv: -kv[1])[:n]
+
+    def ratios(self):
+        return {gene: ti / tv if tv > 0 else 0 for gene, (ti, tv) in self.ti_tv.items()}
+
+
+def substitution_classes(df):
+    """Retorna arrays booleanos (transição, transversão) para cada variante."""
+    pair = df["REF"].astype(str) + ">" + df["ALT"].astype(str)
+    is_ti = pair.isin({f"{r}>{a}" for r, a in TI}).to_numpy()
+    is_tv = pair.isin({f"{r}>{a}" for r, a in TV}).to_numpy()
+    return is_ti, is_tv
@@ -0,0 +1,313 @@
+import importlib
+import os
+import random
+import shutil
+import time
+import traceback
+
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .gff_parser import load_gene_index
+from .models import Analysis
+from .processes import get_context, run_with_django
+from .profiling import peak_rss_bytes
+from .services import run_analysis
+from .vcf_analyzer import VCFAnalyzer
+from .views import analysis_variants_api
+
+BASES = "ACGT"
+ANN_TERMS = ["missense_variant", "synonymous_variant", "frameshift_variant", "stop_gained", "stop_lost"]
+
+# Distância máxima entre variantes vizinhas no VCF sintético (em média, metade)
+MAX_STEP = 20
+
+# Percentis de latência do relatório
+PERCENTILES = (50, 90, 99)
+
+
+def write_synthetic_vcf(path, n_records, n_contigs=1, seed=0):
+    """Gera um VCF sintético e determinístico (SNPs, indels, multialélicos, ANN)."""
+    rng = random.Random(seed)
+    per_contig = -(-n_records // n_contigs) if n_contigs else 0
+    written = 0
+    with open(path, "w") as f:
+        f.write("##fileformat=VCFv4.2\n")
+        f.write('##INFO=<ID=ANN,Number=.,Type=String,Description="Functional annotations">\n')
+        f.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for c in range(n_contigs):
+            chrom = f"contig{c + 1}"
+            pos = 0
+            for _ in range(min(per_contig, n_records - written)):
+                pos += rng.randint(1, MAX_STEP)
+                ref = rng.choice(BASES)
+                alt = rng.choice(BASES.replace(ref, ""))
+                kind = rng.random()
+                if kind < 0.08:
+                    ref += "".join(rng.choice(BASES) for _ in range(rng.randint(1, 4)))
+                elif kind < 0.12:
+                    alt += "".join(rng.choice(BASES) for _ in range(rng.randint(1, 4)))
+                elif kind < 0.15:
+                    alt += "," + rng.choice(BASES.replace(ref, ""))
+                qual = "." if rng.random() < 0.02 else f"{rng.random() * 100:.2f}"
+                if rng.random() < 0.6:
+                    info = f"DP={rng.randint(5, 200)};ANN={alt[0]}|{rng.choice(ANN_TERMS)}|MODERATE|gene{pos // 1000}"
+                else:
+                    info = f"DP={rng.randint(5, 200)}"
+                f.write(f"{chrom}\t{pos}\t.\t{ref}\t{alt}\t{qual}\tPASS\t{info}\n")
+                written += 1
+    return path
+
+
+def synthetic_contig_length(n_records, n_contigs=1):
+    """Comprimento aproximado de cada contig do VCF de ``write_synthetic_vcf`` (para um GFF compatível)."""
+    per_contig = -(-n_records // n_contigs) if n_contigs else 0
+    return max(per_contig * (MAX_STEP + 1) // 2, 1000)
+
+
+def write_synthetic_gff(path, n_genes, n_contigs=1, contig_length=1000000, seed=0):
+    """Gera um GFF3 sintético e determinístico: genes (com um CDS filho) espalhados pelos contigs.
+
+    Os contigs têm os nomes de ``write_synthetic_vcf`` (``contig1``, ...);
+    genes vizinhos podem se sobrepor.
+    """
+    rng = random.Random(seed)
+    per_contig = -(-n_genes // n_contigs) if n_contigs else 0
+    written = 0
+    with open(path, "w") as f:
+        f.write("##gff-version 3\n")
+        for c in range(n_contigs):
+            f.write(f"##sequence-region contig{c + 1} 1 {contig_length}\n")
+        for c in range(n_contigs):
+            chrom = f"contig{c + 1}"
+            count = min(per_contig, n_genes - written)
+            spacing = max(contig_length // max(count, 1), 1)
+            for i in range(count):
+                start = i * spacing + rng.randint(1, spacing)
+                end = start + rng.randint(300, 3000)
+                strand = rng.choice("+-")
+                name = f"gene{written + 1}"
+                f.write(f"{chrom}\tsynthetic\tgene\t{start}\t{end}\t.\t{strand}\t.\tID={name};Name={name}\n")
+                f.write(f"{chrom}\tsynthetic\tCDS\t{start}\t{end}\t.\t{strand}\t0\t"
+                        f"ID=cds{written + 1};Parent={name}\n")
+                written += 1
+    return path
+
+
+def time_call(func, *args, **kwargs):
+    """Executa ``func`` e retorna (resultado, segundos)."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def percentiles(values, points=PERCENTILES):
+    """Percentis (interpolação linear) de ``values``: {"p50": ..., ...}."""
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        if not ordered:
+            result[f"p{point}"] = None
+            continue
+        rank = (len(ordered) - 1) * point / 100
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        result[f"p{point}"] = ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+    return result
+
+
+# ---------------------------
+# EXECUÇÃO ISOLADA
+# ---------------------------
+def run_isolated(func, *args):
+    """Executa ``func(*args)`` num processo filho (fork) e retorna o resultado.
+
+    Cada medição roda num processo novo: o pico de RSS de uma etapa não
+    inclui o das anteriores e os caches em memória começam vazios.
+    """
+    # fork herda o Django já configurado (conexões são fechadas antes); com
+    # spawn, a etapa é passada pelo nome e importada depois de django.setup()
+    connections.close_all()
+    context = get_context("fork")
+    reader, writer = context.Pipe(duplex=False)
+    proc = context.Process(target=run_with_django, args=(
+        "analysis.benchmarks._isolated_main", writer, f"{func.__module__}.{func.__qualname__}", args))
+    proc.start()
+    writer.close()
+    try:
+        ok, payload = reader.recv()
+    except EOFError:
+        ok, payload = False, None
+    finally:
+        reader.close()
+        proc.join()
+    if not ok:
+        raise RuntimeError(payload or f"Processo de benchmark terminou com código {proc.exitcode}")
+    return payload
+
+
+def _isolated_main(writer, func_path, args):
+    try:
+        module, _, name = func_path.rpartition(".")
+        func = getattr(importlib.import_module(module), name)
+        baseline = peak_rss_bytes()
+        result = func(*args)
+        result.update(baseline_rss=baseline, peak_rss=peak_rss_bytes())
+        writer.send((True, result))
+    except BaseException:
+        writer.send((False, traceback.format_exc()))
+    finally:
+        writer.close()
+        connections.close_all()
+
+
+def measure_stage(name, func, ctx, repeat=1):
+    """Roda a etapa ``func(ctx)`` ``repeat`` vezes, cada uma num processo novo, e resume.
+
+    ``func`` retorna ``{"rows": linhas, "latencies": [segundos, ...]}`` (uma
+    latência por execução, ou uma por requisição, na API) e pode acrescentar
+    outros campos, mantidos da última execução. O resumo traz as linhas, as
+    latências (mín., média e percentis), a vazão (linhas por segundo medido)
+    e o maior pico de RSS, também relativo ao RSS do início da execução.
+    """
+    runs = [run_isolated(func, ctx) for _ in range(repeat)]
+    latencies = [seconds for run in runs for seconds in run.pop("latencies")]
+    # Sem getrusage (Windows) o pico de RSS não é medido
+    measured = all(run["peak_rss"] is not None for run in runs)
+    peak = max(run["peak_rss"] for run in runs) if measured else None
+    delta = max(run.pop("peak_rss") - run.pop("baseline_rss") for run in runs) if measured else None
+    last = runs[-1]
+    rows = last.pop("rows")
+    latency = dict(min=min(latencies), mean=sum(latencies) / len(latencies), **percentiles(latencies))
+    summary = {
+        "stage": name,
+        "rows": rows,
+        "runs": repeat,
+        "samples": len(latencies),
+        "latency_s": {key: round(value, 6) for key, value in latency.items()},
+        "throughput_rows_s": round(rows * repeat / sum(latencies), 1) if rows and sum(latencies) else None,
+        "peak_rss_mb": None if peak is None else round(peak / 2 ** 20, 1),
+        "peak_rss_delta_mb": None if delta is None else round(delta / 2 ** 20, 1),
+    }
+    summary.update(last)
+    return summary
+
+
+# ---------------------------
+# ETAPAS
+# ---------------------------
+def bench_parse(ctx):
+    """``VCFAnalyzer.process_and_export`` (modo streaming) para Parquet."""
+    output_path = os.path.join(ctx["scratch"], f"parse-{os.getpid()}.parquet")
+    analyzer = VCFAnalyzer(ctx["vcf"], streaming=True, window_size=ctx["window_size"], workers=ctx["workers"])
+    _, seconds = time_call(analyzer.process_and_export, output_path)
+    os.remove(output_path)
+    return {"rows": analyzer.metrics["total_variants"], "latencies": [seconds]}
+
+
+def bench_gff(ctx):
+    """``load_gene_index`` sem cache: leitura do GFF e montagem do índice de genes."""
+    gene_index, seconds = time_call(load_gene_index, ctx["gff"])
+    return {"rows": len(gene_index), "latencies": [seconds]}
+
+
+def prepare_parse(ctx):
+    """Leitura única do VCF (tabela em ``ctx["variants"]`` e estado em ``ctx["state"]``).
+
+    As etapas que partem de uma análise já lida (anotação, densidade) a retomam.
+    """
+    analyzer = VCFAnalyzer(ctx["vcf"], streaming=True, window_size=ctx["window_size"], workers=ctx["workers"])
+    analyzer.process_and_export(ctx["variants"])
+    analyzer.save_state(ctx["state"])
+    return {}
+
+
+def _restored_analyzer(ctx):
+    """Analisador retomado da leitura preparada (cópia própria da tabela de variantes)."""
+    variants_path = os.path.join(ctx["scratch"], f"variants-{os.getpid()}.parquet")
+    shutil.copyfile(ctx["variants"], variants_path)
+    analyzer = VCFAnalyzer(ctx["vcf"], window_size=ctx["window_size"])
+    analyzer.restore_state(ctx["state"], variants_path)
+    return analyzer, variants_path
+
+
+def bench_annotate(ctx):
+    """``VCFAnalyzer.annotate_with_gff`` sobre uma leitura já feita."""
+    analyzer, variants_path = _restored_analyzer(ctx)
+    _, seconds = time_call(analyzer.annotate_with_gff, ctx["gff"], weight_by_alleles=True)
+    os.remove(variants_path)
+    return {"rows": analyzer.metrics["total_variants"], "latencies": [seconds]}
+
+
+def bench_density(ctx):
+    """``VCFAnalyzer.calculate_density`` na janela da análise."""
+    analyzer, variants_path = _restored_analyzer(ctx)
+    _, seconds = time_call(analyzer.calculate_density, ctx["window_size"])
+    os.remove(variants_path)
+    return {"rows": analyzer.metrics["total_variants"], "latencies": [seconds]}
+
+
+def bench_run_analysis(ctx):
+    """``services.run_analysis`` completo numa análise nova (sem caches de GFF)."""
+    cache_dir = os.path.join(ctx["scratch"], f"gff-cache-{os.getpid()}")
+    with override_settings(MEDIA_ROOT=ctx["media_root"], GFF_CACHE_DIR=cache_dir):
+        analysis = Analysis.objects.create(vcf_file=ctx["vcf_name"], gff_file=ctx["gff_name"],
+                                           window_size=ctx["window_size"])
+        _, seconds = time_call(run_analysis, analysis.id)
+    analysis = Analysis.objects.only('id', 'status', 'error_message', 'total_variants', 'stage_timings') \
+        .get(id=analysis.id)
+    if analysis.status != 'COMPLETED':
+        raise RuntimeError(f"Análise {analysis.id} falhou: {analysis.error_message}")
+    return {"rows": analysis.total_variants, "latencies": [seconds],
+            "analysis_id": analysis.id, "stage_timings": analysis.stage_timings}
+
+
+def variants_api_requests(n_requests, n_contigs, contig_length, seed=0):
+    """Parâmetros determinísticos de ``n_requests`` consultas à API de variantes.
+
+    Alternam paginação simples, ordenação por QUAL, filtros (QUAL/tipo),
+    região e busca por gene, como a tabela da página de uma análise.
+    """
+    rng = random.Random(seed)
+    columns = {f"columns[{i}][data]": name for i, name in enumerate(["CHROM", "POS", "REF", "ALT", "QUAL"])}
+    requests = []
+    for i in range(n_requests):
+        params = dict(columns, draw=i + 1, start=rng.randint(0, 100) * 50, length=50)
+        kind = i % 5
+        if kind == 1:
+            params.update({"order[0][column]": 4, "order[0][dir]": "desc"})
+        elif kind == 2:
+            params.update(qual_min=30, type="SNP")
+        elif kind == 3:
+            start = rng.randint(1, max(contig_length - 100000, 1))
+            params.update(start=0, region=f"contig{rng.randint(1, n_contigs)}:{start}-{start + 100000}")
+        elif kind == 4:
+            params.update(start=0, gene=f"gene{rng.randint(1, 1000)}")
+        requests.append(params)
+    return requests
+
+
+def bench_variants_api(ctx):
+    """``views.analysis_variants_api``: uma latência por requisição, a primeira com o cache vazio."""
+    factory = RequestFactory()
+    url = reverse('analysis_variants_api', args=[ctx["analysis_id"]])
+    latencies = []
+    with override_settings(MEDIA_ROOT=ctx["media_root"]):
+        for params in ctx["api_requests"]:
+            response, seconds = time_call(analysis_variants_api, factory.get(url, params), ctx["analysis_id"])
+            if response.status_code != 200:
+                raise RuntimeError(f"API de variantes respondeu {response.status_code}: {response.content[:200]}")
+            latencies.append(seconds)
+    return {"rows": len(latencies), "latencies": latencies, "first_request_s": round(latencies[0], 6)}
+
+
+STAGES = {
+    "parse": bench_parse,
+    "gff": bench_gff,
+    "annotate_with_gff": bench_annotate,
+    "calculate_density": bench_density,
+    "run_analysis": bench_run_analysis,
+    "variants_api": bench_variants_api,
+}
@@ -0,0 +1,151 @@
+import struct
+import zlib
+
+# Dados (não compactados) por bloco, como no bgzip/htslib
+BLOCK_SIZE = 0xff00
+
+# Bloco vazio que marca o fim de um arquivo BGZF
+EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def is_bgzf(path):
+    """True se ``path`` começa com um bloco BGZF (gzip com subcampo extra "BC")."""
+    with open(path, "rb") as f:
+        head = f.read(18)
+    return len(head) == 18 and head[:4] == b"\x1f\x8b\x08\x04" and head[12:14] == b"BC"
+
+
+def make_virtual_offset(block_start, within):
+    return (block_start << 16) | within
+
+
+def split_virtual_offset(offset):
+    return offset >> 16, offset & 0xffff
+
+
+class BgzfWriter:
+    """Grava um arquivo BGZF (gzip em blocos independentes, com acesso aleatório).
+
+    ``tell()`` retorna o offset virtual (início do bloco compactado << 16 |
+    posição dentro do bloco) do próximo byte, usado pelo índice tabix.
+    """
+
+    def __init__(self, path, level=6):
+        self.f = open(path, "wb")
+        self.level = level
+        self.buffer = bytearray()
+        self.block_start = 0
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            # Bloco cheio só é gravado na próxima escrita: assim tell() no fim
+            # de um bloco é (bloco, tamanho), como o BgzfReader informa
+            if len(self.buffer) >= BLOCK_SIZE:
+                self._flush_block()
+            room = BLOCK_SIZE - len(self.buffer)
+            self.buffer += view[:room]
+            view = view[room:]
+
+    def tell(self):
+        return make_virtual_offset(self.block_start, len(self.buffer))
+
+    def _flush_block(self):
+        if not self.buffer:
+            return
+        data = bytes(self.buffer)
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        body = compressor.compress(data) + compressor.flush()
+        block = (b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+                 + struct.pack("<H", 25 + len(body)) + body
+                 + struct.pack("<II", zlib.crc32(data), len(data)))
+        self.f.write(block)
+        self.block_start += len(block)
+        self.buffer = bytearray()
+
+    def close(self):
+        self._flush_block()
+        self.f.write(EOF_BLOCK)
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BgzfReader:
+    """Leitura de um arquivo BGZF a partir de offsets virtuais (``seek``/``tell``)."""
+
+    def __init__(self, path):
+        self.f = open(path, "rb")
+        self.block_start = 0
+        self.next_block = 0
+        self.block = b""
+        self.within = 0
+
+    def _load(self, start):
+        self.f.seek(start)
+        header = self.f.read(12)
+        self.block_start = start
+        self.within = 0
+        if len(header) < 12:
+            self.block = b""
+            self.next_block = start
+            return False
+        xlen = struct.unpack("<H", header[10:12])[0]
+        extra = self.f.read(xlen)
+        bsize = None
+        i = 0
+        while i + 4 <= len(extra):
+            length = struct.unpack("<H", extra[i + 2:i + 4])[0]
+            if extra[i:i + 2] == b"BC":
+                bsize = struct.unpack("<H", extra[i + 4:i + 6])[0] + 1
+            i += 4 + length
+        if header[:4] != b"\x1f\x8b\x08\x04" or bsize is None:
+            raise ValueError("Arquivo não está no formato BGZF")
+        rest = self.f.read(bsize - 12 - xlen)
+        self.block = zlib.decompress(rest[:-8], -15)
+        self.next_block = start + bsize
+        return True
+
+    def seek(self, offset):
+        block_start, within = split_virtual_offset(offset)
+        if block_start != self.block_start or not self.block:
+            self._load(block_start)
+        self.within = within
+
+    def tell(self):
+        return make_virtual_offset(self.block_start, self.within)
+
+    def _advance(self):
+        """Passa ao próximo bloco com dados; False no fim do arquivo."""
+        while True:
+            if not self._load(self.next_block):
+                return False
+            if self.block:
+                return True
+
+    def readline(self):
+        parts = []
+        while True:
+            if self.within >= len(self.block) and not self._advance():
+                break
+            end = self.block.find(b"\n", self.within)
+            if end >= 0:
+                parts.append(self.block[self.within:end + 1])
+                self.within = end + 1
+                break
+            parts.append(self.block[self.within:])
+            self.within = len(self.block)
+        return b"".join(parts)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,165 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+from .reference_store import SIDECAR_SUFFIXES
+from .tabix import INDEXED_VCF_NAME, INDEX_SUFFIX
+
+_RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+# Índices servidos ao lado do VCF enviado (tabix / CSI)
+VCF_SIDECAR_SUFFIXES = (INDEX_SUFFIX, '.csi')
+
+
+class RangeFile:
+    """Trecho ``[start, start + length)`` de um arquivo, lido como um arquivo.
+
+    Expõe o ``fileno`` do arquivo (já posicionado em ``start``): servidores
+    com ``wsgi.file_wrapper`` usam ``sendfile`` limitado pelo Content-Length;
+    os demais leem pelo ``read``, que nunca passa do fim do trecho.
+    """
+
+    def __init__(self, f, start, length):
+        self.f = f
+        self.remaining = length
+        f.seek(start)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        self.f.close()
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(mtime) <= since
+
+
+def _requested_range(request, etag, mtime, size):
+    """(início, fim) inclusivos do ``Range`` pedido; None para o arquivo inteiro, False se inválido."""
+    match = _RANGE_PATTERN.match(request.headers.get('Range', '').strip())
+    if not match or not any(match.groups()):
+        # Vários trechos ou unidade desconhecida: o arquivo inteiro (RFC 9110)
+        return None
+    if_range = request.headers.get('If-Range', '').strip()
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(mtime):
+        return None
+
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def serve_file(request, path, content_type=None):
+    """Resposta para ``path`` com ETag/Last-Modified, GET condicional e ``Range`` (206).
+
+    O conteúdo sai por ``FileResponse`` (``sendfile`` quando o servidor
+    oferece ``wsgi.file_wrapper``), sem ser lido para a memória.
+    """
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    if content_type is None:
+        # Arquivos .gz/.bgz vão como binário: Content-Encoding faria o
+        # navegador descompactar o que o IGV lê por offsets
+        guessed, encoding = mimetypes.guess_type(path)
+        content_type = guessed if guessed and not encoding else 'application/octet-stream'
+
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        span = _requested_range(request, etag, stat.st_mtime, stat.st_size)
+        if span is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif span is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = span
+            response = FileResponse(RangeFile(open(path, 'rb'), start, end - start + 1),
+                                    status=206, content_type=content_type)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def results_dir(analysis_id):
+    return os.path.join(settings.MEDIA_ROOT, f'results/{analysis_id}')
+
+
+def find_indexed_vcf(analysis):
+    """VCF em BGZF com índice tabix da análise (o upload ou a cópia em results/), ou None."""
+    candidates = [os.path.join(results_dir(analysis.id), INDEXED_VCF_NAME)]
+    if analysis.vcf_file:
+        candidates.insert(0, analysis.vcf_file.path)
+    for path in candidates:
+        if os.path.exists(path + INDEX_SUFFIX):
+            return path
+    return None
+
+
+def _with_sidecars(prefix, field, suffixes):
+    """Nomes públicos do arquivo de ``field`` e dos seus índices: ``prefix/<nome>[.fai]``."""
+    if not field:
+        return {}
+    name = f"{prefix}/{os.path.basename(field.name)}"
+    files = {name: field.path}
+    files.update({name + suffix: field.path + suffix for suffix in suffixes})
+    return files
+
+
+def analysis_file_path(analysis, name):
+    """Caminho do arquivo ``name`` de uma análise, ou None se não pertence a ela.
+
+    ``name`` é ``vcf/<arquivo>``, ``reference/<arquivo>`` e ``gff/<arquivo>``
+    (uploads, com índices como ``.tbi``/``.fai``), ``variants.vcf.gz[.tbi]``
+    (VCF indexado) ou ``results/<caminho>`` (arquivos gerados pela análise).
+    """
+    if name.startswith('results/'):
+        try:
+            return safe_join(results_dir(analysis.id), name[len('results/'):])
+        except SuspiciousFileOperation:
+            return None
+    if name in (INDEXED_VCF_NAME, INDEXED_VCF_NAME + INDEX_SUFFIX):
+        path = find_indexed_vcf(analysis)
+        return path and path + name[len(INDEXED_VCF_NAME):]
+
+    files = {}
+    files.update(_with_sidecars('vcf', analysis.vcf_file, VCF_SIDECAR_SUFFIXES))
+    files.update(_with_sidecars('reference', analysis.reference_file, SIDECAR_SUFFIXES))
+    files.update(_with_sidecars('gff', analysis.gff_file, ()))
+    return files.get(name)
+
+
+def analysis_file_url(analysis_id, name):
+    return reverse('analysis_file', args=[analysis_id, name])
@@ -1,7 +1,43 @@
 from django import forms
 from .models import Analysis
+from .metrics import record_uploads
 
-class AnalysisForm(forms.ModelForm):
+
+class UploadInspectionMixin:
+    """Mostra os erros do ``InspectingUploadHandler`` e grava os metadados dos uploads.
+
+    ``upload_errors`` (de ``request.upload_errors``) traz, por campo, o motivo
+    de um arquivo ter sido recusado durante o upload.
+    """
+
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+        for field, message in self.upload_errors.items():
+            if field in self.fields:
+                # Arquivo recusado chega como ausente: o erro de "obrigatório" vira o motivo
+                self.fields[field].error_messages['required'] = message
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field, message in self.upload_errors.items():
+            if field in self.fields and field not in self.errors:
+                self.add_error(field, message)
+        return cleaned_data
+
+    def save(self, commit=True):
+        info = dict(self.instance.upload_info or {})
+        received = {}
+        for field in self.files:
+            upload = self.cleaned_data.get(field)
+            if getattr(upload, 'upload_info', None):
+                info[field] = received[field] = upload.upload_info
+        self.instance.upload_info = info or None
+        record_uploads(received)
+        return super().save(commit=commit)
+
+
+class AnalysisForm(UploadInspectionMixin, forms.ModelForm):
     class Meta:
         model = Analysis
         fields = ['vcf_file', 'gff_file', 'reference_file', 'window_size']
@@ -11,3 +47,14 @@ class AnalysisForm(forms.ModelForm):
             'reference_file': forms.FileInput(attrs={'class': 'form-control'}),
             'window_size': forms.NumberInput(attrs={'class': 'form-control'}),
         }
+
+
+class AnalysisRerunForm(UploadInspectionMixin, forms.ModelForm):
+    """Reanálise com outra janela e/ou outro GFF (o VCF não muda)."""
+    class Meta:
+        model = Analysis
+        fields = ['gff_file', 'window_size']
+        widgets = {
+            'gff_file': forms.FileInput(attrs={'class': 'form-control'}),
+            'window_size': forms.NumberInput(attrs={'class': 'form-control'}),
+        }
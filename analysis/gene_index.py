@@ -0,0 +1,106 @@
+import numpy as np
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+# Pares (variante, gene candidato) expandidos de uma vez em overlap_pairs: um
+# gene longo faz cada posição ter muitos candidatos, então as posições são
+# processadas em fatias com até esse número de candidatos
+OVERLAP_CANDIDATES_PER_SLICE = 1 << 22
+
+
+class GeneIndex:
+    """Índice de sobreposição de genes por cromossomo.
+
+    Os intervalos (fechados, ``start <= pos <= end``) de cada cromossomo são
+    ordenados pelo início. Uma consulta usa ``bisect`` para limitar os
+    candidatos aos genes que começam entre ``pos - max_len`` e ``pos``, de modo
+    que cada busca custa O(log n + k) em vez de varrer todos os genes.
+    """
+
+    def __init__(self, intervals=None):
+        self._pending = defaultdict(list)
+        self._chroms = {}
+        self._order = 0
+        if intervals:
+            for chrom, start, end, name in intervals:
+                self.add(chrom, start, end, name)
+
+    def add(self, chrom, start, end, name):
+        self._pending[chrom].append((int(start), int(end), self._order, name))
+        self._order += 1
+        self._chroms.pop(chrom, None)
+
+    def _table(self, chrom):
+        table = self._chroms.get(chrom)
+        if table is None:
+            items = sorted(self._pending.get(chrom, []), key=lambda it: (it[0], it[2]))
+            table = {
+                "starts": [it[0] for it in items],
+                "ends": [it[1] for it in items],
+                "order": [it[2] for it in items],
+                "names": [it[3] for it in items],
+                "max_len": max((it[1] - it[0] for it in items), default=0),
+            }
+            table["starts_arr"] = np.asarray(table["starts"], dtype=np.int64)
+            table["ends_arr"] = np.asarray(table["ends"], dtype=np.int64)
+            table["order_arr"] = np.asarray(table["order"], dtype=np.int64)
+            table["names_arr"] = np.asarray(table["names"], dtype=object)
+            self._chroms[chrom] = table
+        return table
+
+    def __contains__(self, chrom):
+        return bool(self._pending.get(chrom))
+
+    def __len__(self):
+        return sum(len(items) for items in self._pending.values())
+
+    def chromosomes(self):
+        return [chrom for chrom, items in self._pending.items() if items]
+
+    def overlapping(self, chrom, pos):
+        """Retorna os genes que contêm ``pos``, na ordem em que foram adicionados."""
+        if chrom not in self:
+            return []
+        t = self._table(chrom)
+        lo = bisect_left(t["starts"], pos - t["max_len"])
+        hi = bisect_right(t["starts"], pos)
+        hits = [i for i in range(lo, hi) if t["ends"][i] >= pos]
+        hits.sort(key=t["order"].__getitem__)
+        return [t["names"][i] for i in hits]
+
+    def overlap_pairs(self, chrom, positions):
+        """Junção vetorizada de um array de posições com os genes do cromossomo.
+
+        Usa ``np.searchsorted`` para obter, de uma vez, a faixa de candidatos de
+        cada posição e retorna três arrays paralelos com um elemento por par
+        (variante, gene): índice da posição, nome do gene e ordem de inserção.
+        Os candidatos são expandidos em fatias de posições (ver
+        ``OVERLAP_CANDIDATES_PER_SLICE``), de modo que a memória temporária não
+        cresce com variantes x comprimento do maior gene.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if chrom not in self or positions.size == 0:
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=object),
+                    np.empty(0, dtype=np.int64))
+
+        t = self._table(chrom)
+        lo = np.searchsorted(t["starts_arr"], positions - t["max_len"], side="left")
+        hi = np.searchsorted(t["starts_arr"], positions, side="right")
+        counts = hi - lo
+        # Fatia de cada posição pelo total de candidatos antes dela
+        slice_id = (np.cumsum(counts) - counts) // OVERLAP_CANDIDATES_PER_SLICE
+        bounds = np.r_[0, np.flatnonzero(np.diff(slice_id)) + 1, positions.size]
+
+        var_parts, gene_parts = [], []
+        for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            n = counts[a:b]
+            var_idx = np.repeat(np.arange(a, b), n)
+            offsets = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+            gene_idx = np.repeat(lo[a:b], n) + offsets
+            mask = t["ends_arr"][gene_idx] >= positions[var_idx]
+            var_parts.append(var_idx[mask])
+            gene_parts.append(gene_idx[mask])
+
+        var_idx = np.concatenate(var_parts)
+        gene_idx = np.concatenate(gene_parts)
+        return var_idx, t["names_arr"][gene_idx], t["order_arr"][gene_idx]
@@ -1,10 +1,31 @@
 import pandas as pd
+import numpy as np
+import hashlib
+import os
 import csv
+from urllib.parse import unquote
+from .gene_index import GeneIndex
+
+# Versão do formato do cache .npz (mudar invalida caches antigos)
+GFF_CACHE_VERSION = 1
+
+GENE_MODEL_FIELDS = ['chrom', 'start', 'end', 'name', 'type']
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    """Hash SHA-256 do conteúdo de um arquivo, lido em blocos."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
 
 class GFFParser:
     def __init__(self, gff_path):
         self.gff_path = gff_path
         self.genes = []
+        self.index = GeneIndex()
 
     def parse(self):
         """Analisa o arquivo GFF e extrai características de genes."""
@@ -14,29 +35,29 @@ class GFFParser:
                 for line in reader:
                     if not line or line[0].startswith('#'):
                         continue
-                    
+
                     if len(line) < 9:
                         continue
 
                     # Colunas GFF3: seqid, source, type, start, end, score, strand, phase, attributes
                     feature_type = line[2]
-                    
+
                     # Estamos interessados em características 'gene' ou 'CDS'
-                    if feature_type not in ['gene', 'CDS']:
+                    if feature_type.lower() not in ['gene', 'cds']:
                         continue
 
                     chrom = line[0]
                     start = int(line[3])
                     end = int(line[4])
                     attributes_str = line[8]
-                    
-                    # Analisar atributos para obter ID ou Nome
+
+                    # Analisar atributos para obter ID ou Nome (primeiro valor, sem escapes)
                     attributes = {}
                     for attr in attributes_str.split(';'):
                         if '=' in attr:
-                            key, value = attr.split('=', 1)
-                            attributes[key] = value
-                    
+                            key, value = attr.strip().split('=', 1)
+                            attributes[key] = unquote(value.split(',')[0])
+
                     gene_name = attributes.get('Name', attributes.get('ID', 'Unknown'))
 
                     self.genes.append({
@@ -44,8 +65,12 @@ class GFFParser:
                         'start': start,
                         'end': end,
                         'name': gene_name,
-                        'type': feature_type
+                        'type': feature_type,
+                        'parent': attributes.get('Parent')
                     })
+                    # Sub-features (ex.: CDS filho de um gene) não entram no índice
+                    if not attributes.get('Parent'):
+                        self.index.add(chrom, start, end, gene_name)
             print(f"Sucesso ao analisar {len(self.genes)} características de genes.")
         except Exception as e:
             print(f"Erro ao analisar GFF: {e}")
@@ -53,8 +78,57 @@ class GFFParser:
 
     def get_genes(self, chrom, pos):
         """Retorna uma lista de genes que se sobrepõem à posição dada."""
-        overlapping_genes = []
-        for gene in self.genes:
-            if gene['chrom'] == chrom and gene['start'] <= pos <= gene['end']:
-                overlapping_genes.append(gene['name'])
-        return overlapping_genes
+        return self.index.overlapping(chrom, pos)
+
+    def gene_model(self):
+        """Intervalos de nível superior (sem Parent) como arrays NumPy."""
+        top_level = [g for g in self.genes if not g['parent']]
+        return {
+            'chrom': np.array([g['chrom'] for g in top_level], dtype=str),
+            'start': np.array([g['start'] for g in top_level], dtype=np.int64),
+            'end': np.array([g['end'] for g in top_level], dtype=np.int64),
+            'name': np.array([g['name'] for g in top_level], dtype=str),
+            'type': np.array([g['type'] for g in top_level], dtype=str),
+        }
+
+
+def load_gene_model(gff_path, cache_dir=None, sha256=None):
+    """Carrega o modelo de genes de um GFF, usando um cache binário em disco.
+
+    O cache (``<sha256>.v<versão>.npz`` em ``cache_dir``) é indexado pelo hash
+    do conteúdo, então reanálises contra a mesma anotação pulam o parsing.
+    ``sha256``, se já conhecido (armazenamento por conteúdo), evita reler o
+    arquivo para calculá-lo. Sem ``cache_dir`` o arquivo é sempre analisado.
+    """
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, f"{sha256 or file_sha256(gff_path)}.v{GFF_CACHE_VERSION}.npz")
+        if os.path.exists(cache_path):
+            try:
+                with np.load(cache_path) as data:
+                    return {field: data[field] for field in GENE_MODEL_FIELDS}
+            except Exception as e:
+                print(f"Cache de GFF inválido ({cache_path}): {e}")
+
+    parser = GFFParser(gff_path)
+    parser.parse()
+    model = parser.gene_model()
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **model)
+        os.replace(tmp_path, cache_path)
+    return model
+
+
+def load_gene_index(gff_path, cache_dir=None, sha256=None):
+    """Retorna um ``GeneIndex`` com os genes/CDS do GFF (ver ``load_gene_model``)."""
+    model = load_gene_model(gff_path, cache_dir=cache_dir, sha256=sha256)
+    return GeneIndex(zip(
+        model['chrom'].tolist(),
+        model['start'].tolist(),
+        model['end'].tolist(),
+        model['name'].tolist(),
+    ))
@@ -0,0 +1,311 @@
+import signal
+import socket
+import threading
+import time
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Analysis, AnalysisJob
+from .metrics import record_job_started, record_job_finished
+from .processes import get_context, run_with_django
+
+OPEN_STATUSES = ('QUEUED', 'RUNNING')
+
+
+def job_setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ---------------------------
+# Fila
+# ---------------------------
+class JobAlreadyOpen(Exception):
+    """A análise já tem uma tarefa na fila ou em execução."""
+
+
+def enqueue_analysis(analysis_id, reuse_open=True):
+    """Coloca a análise na fila persistente (reutiliza a tarefa se já houver uma aberta).
+
+    A restrição ``unique_open_job_per_analysis`` garante uma só tarefa aberta
+    por análise: de dois envios simultâneos, o que perde a corrida recebe a
+    tarefa criada pelo outro. Com ``reuse_open=False`` (reanálise com novos
+    parâmetros) uma tarefa aberta levanta ``JobAlreadyOpen``.
+    """
+    while True:
+        job = AnalysisJob.objects.filter(analysis_id=analysis_id, status__in=OPEN_STATUSES).first()
+        if job:
+            if not reuse_open:
+                raise JobAlreadyOpen(f"Análise {analysis_id} já tem a tarefa {job.id} aberta")
+            return job
+        try:
+            with transaction.atomic():
+                return AnalysisJob.objects.create(
+                    analysis_id=analysis_id,
+                    max_attempts=job_setting('ANALYSIS_JOB_MAX_ATTEMPTS', 3),
+                )
+        except IntegrityError:
+            # Outra requisição criou a tarefa entre a consulta e o INSERT
+            continue
+
+
+def claim_next_job(worker_id):
+    """Reivindica a tarefa mais antiga da fila para ``worker_id``.
+
+    A trava é um UPDATE condicional (status ainda 'QUEUED'), atômico no banco,
+    então dois processos nunca executam a mesma tarefa.
+    """
+    while True:
+        job_id = (AnalysisJob.objects.filter(status='QUEUED')
+                  .order_by('created_at', 'id')
+                  .values_list('id', flat=True)
+                  .first())
+        if job_id is None:
+            return None
+        now = timezone.now()
+        claimed = AnalysisJob.objects.filter(id=job_id, status='QUEUED').update(
+            status='RUNNING',
+            locked_by=worker_id,
+            locked_at=now,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            record_job_started()
+            return AnalysisJob.objects.get(id=job_id)
+        # Outro worker venceu a corrida; tenta a próxima
+
+
+def finish_job(job, worker_id, status, error=None):
+    """Fecha a tarefa, desde que ela ainda pertença a este worker."""
+    finished_at = timezone.now()
+    closed = AnalysisJob.objects.filter(id=job.id, status='RUNNING', locked_by=worker_id).update(
+        status=status,
+        finished_at=finished_at,
+        locked_by=None,
+        last_error=error,
+    )
+    if closed:
+        record_job_finished(job, status, finished_at)
+    return closed
+
+
+def requeue_or_fail(jobs, reason):
+    """Devolve tarefas interrompidas à fila, ou falha as que esgotaram as tentativas."""
+    recovered = 0
+    for job in jobs:
+        lock = AnalysisJob.objects.filter(id=job.id, status='RUNNING', locked_by=job.locked_by)
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            if lock.update(status='QUEUED', locked_by=None, locked_at=None, heartbeat_at=None, last_error=reason):
+                Analysis.objects.filter(id=job.analysis_id).update(status='PENDING')
+                recovered += 1
+        elif lock.update(status='FAILED', locked_by=None, finished_at=now, last_error=reason):
+            record_job_finished(job, 'FAILED', now)
+            Analysis.objects.filter(id=job.analysis_id).update(
+                status='FAILED',
+                error_message=f"{reason} (após {job.attempts} tentativas)",
+            )
+            recovered += 1
+    return recovered
+
+
+def release_worker_jobs(worker_id, reason):
+    """Libera as tarefas travadas por um worker que morreu."""
+    jobs = list(AnalysisJob.objects.filter(status='RUNNING', locked_by=worker_id))
+    return requeue_or_fail(jobs, reason)
+
+
+def recover_stale_jobs(stale_seconds=None):
+    """Recupera tarefas em 'RUNNING' sem heartbeat há mais de ``stale_seconds``.
+
+    Elas pertencem a um worker que caiu, inclusive em outra máquina.
+    """
+    if stale_seconds is None:
+        stale_seconds = job_setting('ANALYSIS_JOB_STALE_SECONDS', 60)
+    limit = timezone.now() - timedelta(seconds=stale_seconds)
+    stale = list(AnalysisJob.objects.filter(status='RUNNING', heartbeat_at__lt=limit))
+    return requeue_or_fail(stale, f"Worker sem sinal de vida há mais de {stale_seconds}s")
+
+
+def recover_orphan_analyses():
+    """Enfileira análises em 'PENDING'/'PROCESSING' sem tarefa aberta.
+
+    Cobre análises interrompidas por um reinício antes de a fila existir.
+    """
+    orphans = list(Analysis.objects.filter(status__in=['PENDING', 'PROCESSING'])
+                   .exclude(jobs__status__in=OPEN_STATUSES)
+                   .values_list('id', flat=True))
+    for analysis_id in orphans:
+        enqueue_analysis(analysis_id)
+        Analysis.objects.filter(id=analysis_id).update(status='PENDING')
+    return len(orphans)
+
+
+# ---------------------------
+# Execução
+# ---------------------------
+class Heartbeat(threading.Thread):
+    """Atualiza ``heartbeat_at`` da tarefa em segundo plano enquanto ela executa."""
+
+    def __init__(self, job_id, worker_id, interval):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    AnalysisJob.objects.filter(id=self.job_id, locked_by=self.worker_id).update(
+                        heartbeat_at=timezone.now()
+                    )
+                except Exception as e:
+                    print(f"Erro ao registrar heartbeat da tarefa {self.job_id}: {e}")
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job, worker_id):
+    """Executa a análise de uma tarefa já reivindicada e registra o resultado."""
+    from .services import run_analysis
+
+    heartbeat = Heartbeat(job.id, worker_id, job_setting('ANALYSIS_JOB_HEARTBEAT_SECONDS', 10))
+    heartbeat.start()
+    try:
+        run_analysis(job.analysis_id)
+    finally:
+        heartbeat.stop()
+
+    # run_analysis registra falhas na própria análise; erros de dados não são repetidos
+    analysis = Analysis.objects.filter(id=job.analysis_id).values('status', 'error_message').first()
+    if analysis and analysis['status'] == 'COMPLETED':
+        finish_job(job, worker_id, 'DONE')
+    else:
+        finish_job(job, worker_id, 'FAILED', analysis['error_message'] if analysis else 'Análise removida')
+
+
+def worker_loop(worker_id, poll_interval=None, burst=False, stop_event=None):
+    """Consome a fila até ``stop_event`` ser sinalizado (ou a fila esvaziar, em modo burst)."""
+    if poll_interval is None:
+        poll_interval = job_setting('ANALYSIS_WORKER_POLL_SECONDS', 2)
+    stop_event = stop_event or threading.Event()
+    processed = 0
+    while not stop_event.is_set():
+        job = claim_next_job(worker_id)
+        if job is None:
+            if burst:
+                break
+            stop_event.wait(poll_interval)
+            continue
+        print(f"[{worker_id}] Executando tarefa {job.id} (análise {job.analysis_id}, tentativa {job.attempts})")
+        run_job(job, worker_id)
+        processed += 1
+    return processed
+
+
+def _worker_main(worker_id, poll_interval, burst):
+    # Ctrl+C é tratado pelo supervisor; SIGTERM termina após a tarefa atual
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop_event.set())
+    connections.close_all()
+    try:
+        worker_loop(worker_id, poll_interval, burst=burst, stop_event=stop_event)
+    finally:
+        connections.close_all()
+
+
+# ---------------------------
+# Supervisor
+# ---------------------------
+class WorkerPool:
+    """Mantém ``processes`` processos worker vivos, reiniciando os que caírem.
+
+    As tarefas de um worker que morre no meio da execução voltam para a fila
+    (até ``max_attempts``); tarefas sem heartbeat de outras máquinas também
+    são recuperadas periodicamente.
+    """
+
+    def __init__(self, processes=None, poll_interval=None, burst=False, shutdown_timeout=None):
+        self.processes = processes or job_setting('ANALYSIS_WORKER_PROCESSES', os.cpu_count() or 2)
+        self.poll_interval = poll_interval or job_setting('ANALYSIS_WORKER_POLL_SECONDS', 2)
+        self.burst = burst
+        self.shutdown_timeout = shutdown_timeout or job_setting('ANALYSIS_WORKER_SHUTDOWN_SECONDS', 30)
+        self.prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self.children = {}
+        self.stopping = False
+        # fork herda o Django já configurado (conexões são fechadas antes);
+        # sem fork (Windows), run_with_django configura o Django no filho
+        self.context = get_context('fork')
+
+    def worker_id(self, slot):
+        return f"{self.prefix}:{slot}"
+
+    def spawn(self, slot):
+        connections.close_all()
+        proc = self.context.Process(
+            target=run_with_django,
+            args=('analysis.jobs._worker_main', self.worker_id(slot), self.poll_interval, self.burst),
+            name=f"analysis-worker-{slot}",
+        )
+        proc.start()
+        self.children[slot] = proc
+        return proc
+
+    def request_stop(self, *args):
+        self.stopping = True
+
+    def reap(self):
+        """Trata processos encerrados; retorna True se ainda há workers."""
+        for slot, proc in list(self.children.items()):
+            if proc.is_alive():
+                continue
+            proc.join()
+            del self.children[slot]
+            worker_id = self.worker_id(slot)
+            if proc.exitcode != 0:
+                released = release_worker_jobs(worker_id, f"Worker {worker_id} terminou com código {proc.exitcode}")
+                print(f"Worker {worker_id} caiu (código {proc.exitcode}); {released} tarefa(s) recuperada(s)")
+            if not self.stopping and (not self.burst or proc.exitcode != 0):
+                self.spawn(slot)
+        return bool(self.children)
+
+    def shutdown(self):
+        for proc in self.children.values():
+            if proc.is_alive():
+                proc.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        for proc in self.children.values():
+            proc.join(max(0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+        for slot in list(self.children):
+            release_worker_jobs(self.worker_id(slot), "Worker encerrado durante a execução")
+        self.children.clear()
+
+    def run(self):
+        recovered = recover_stale_jobs() + recover_orphan_analyses()
+        if recovered:
+            print(f"{recovered} tarefa(s) recuperada(s) na inicialização")
+
+        previous = {sig: signal.signal(sig, self.request_stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            for slot in range(self.processes):
+                self.spawn(slot)
+            while not self.stopping and self.reap():
+                time.sleep(self.poll_interval)
+                recover_stale_jobs()
+        finally:
+            self.shutdown()
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
@@ -0,0 +1,142 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+from analysis.benchmarks import (write_synthetic_vcf, write_synthetic_gff, synthetic_contig_length, time_call,
+                                 measure_stage, prepare_parse, run_isolated, bench_run_analysis,
+                                 variants_api_requests, STAGES)
+from analysis.models import Analysis
+import platform
+import subprocess
+import tempfile
+import json
+import os
+
+# Etapas que partem de uma leitura já feita do VCF
+RESTORED_STAGES = ('annotate_with_gff', 'calculate_density')
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the analysis pipeline on deterministic synthetic VCF/GFF files and prints '
+            'throughput, latency percentiles and peak memory per stage as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=100000,
+                            help='Records in the synthetic VCF (1k to 10M)')
+        parser.add_argument('--contigs', type=int, default=4, help='Contigs in the synthetic VCF/GFF')
+        parser.add_argument('--genes', type=int, default=10000, help='Genes in the synthetic GFF (1k to 100k)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic files and API queries')
+        parser.add_argument('--vcf', type=str, help='Benchmark this VCF instead of a synthetic one')
+        parser.add_argument('--gff', type=str, help='Benchmark this GFF instead of a synthetic one')
+        parser.add_argument('--window-size', type=int, default=1000, help='Density window size (bp)')
+        parser.add_argument('--workers', type=int, default=1, help='Parser processes for the parse stage')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per stage (each in a fresh process)')
+        parser.add_argument('--api-requests', type=int, default=50, help='Requests in the variants_api stage')
+        parser.add_argument('--stages', type=str, default=','.join(STAGES),
+                            help=f"Comma-separated stages to run (default: {','.join(STAGES)})")
+        parser.add_argument('--output', type=str, help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        stages = [name.strip() for name in options['stages'].split(',') if name.strip()]
+        unknown = [name for name in stages if name not in STAGES]
+        if unknown:
+            raise CommandError(f"Unknown stages: {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+        if options['repeat'] < 1 or options['api_requests'] < 1:
+            raise CommandError('--repeat and --api-requests must be at least 1')
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Uploads da análise no MEDIA_ROOT temporário, com nome único
+            media_root = os.path.join(tmpdir, 'media')
+            run_name = os.path.basename(tmpdir)
+            # VCF real compactado mantém a extensão (.vcf.gz é lido sem divisão em processos)
+            vcf_suffix = '.vcf.gz' if (options['vcf'] or '').endswith('.gz') else '.vcf'
+            vcf_name = f'uploads/vcf/{run_name}{vcf_suffix}'
+            gff_name = f'uploads/gff/{run_name}.gff'
+            scratch = os.path.join(tmpdir, 'scratch')
+            for directory in ('uploads/vcf', 'uploads/gff'):
+                os.makedirs(os.path.join(media_root, directory))
+            os.makedirs(scratch)
+
+            inputs = {
+                'vcf': self.input_file(options['vcf'], os.path.join(media_root, vcf_name),
+                                       write_synthetic_vcf, options['records'], n_contigs=options['contigs'],
+                                       seed=options['seed']),
+                'gff': self.input_file(options['gff'], os.path.join(media_root, gff_name),
+                                       write_synthetic_gff, options['genes'], n_contigs=options['contigs'],
+                                       contig_length=synthetic_contig_length(options['records'], options['contigs']),
+                                       seed=options['seed']),
+            }
+
+            ctx = {
+                'vcf': os.path.join(media_root, vcf_name),
+                'gff': os.path.join(media_root, gff_name),
+                'vcf_name': vcf_name,
+                'gff_name': gff_name,
+                'media_root': media_root,
+                'scratch': scratch,
+                'variants': os.path.join(scratch, 'variants.parquet'),
+                'state': os.path.join(scratch, 'state.npz'),
+                'window_size': options['window_size'],
+                'workers': options['workers'],
+                'api_requests': variants_api_requests(
+                    options['api_requests'], options['contigs'],
+                    synthetic_contig_length(options['records'], options['contigs']), seed=options['seed']),
+            }
+
+            results = []
+            try:
+                if any(name in RESTORED_STAGES for name in stages):
+                    self.stderr.write('Parsing the VCF once for the annotation/density stages...')
+                    run_isolated(prepare_parse, ctx)
+                for name in stages:
+                    if name == 'variants_api' and 'analysis_id' not in ctx:
+                        self.stderr.write('Running an analysis for the variants_api stage...')
+                        ctx['analysis_id'] = run_isolated(bench_run_analysis, ctx)['analysis_id']
+                    self.stderr.write(f'Benchmarking {name}...')
+                    result = measure_stage(name, STAGES[name], ctx, repeat=options['repeat'])
+                    if 'analysis_id' in result:
+                        ctx['analysis_id'] = result.pop('analysis_id')
+                    results.append(result)
+            finally:
+                # Remove as análises criadas (e seus arquivos de resultados)
+                with override_settings(MEDIA_ROOT=media_root):
+                    Analysis.objects.filter(vcf_file=vcf_name).delete()
+
+        report = {
+            'commit': git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'params': {key: options[key] for key in ('records', 'contigs', 'genes', 'seed', 'window_size',
+                                                     'workers', 'repeat', 'api_requests')},
+            'inputs': inputs,
+            'stages': results,
+        }
+        text = json.dumps(report, indent=2)
+        if options.get('output'):
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(text)
+
+    def input_file(self, source, path, generator, count, **kwargs):
+        """Liga ``source`` em ``path`` ou gera o arquivo sintético; retorna a descrição da entrada."""
+        if source:
+            if not os.path.exists(source):
+                raise CommandError(f'File not found: {source}')
+            os.symlink(os.path.abspath(source), path)
+            return {'path': os.path.abspath(source), 'bytes': os.path.getsize(source)}
+        self.stderr.write(f'Generating {os.path.basename(path)} ({count} entries)...')
+        _, seconds = time_call(generator, path, count, **kwargs)
+        return {'synthetic': count, 'seed': kwargs['seed'], 'bytes': os.path.getsize(path),
+                'generate_s': round(seconds, 3)}
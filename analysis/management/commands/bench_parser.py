@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from analysis.benchmarks import write_synthetic_vcf, time_call
+from analysis.vcf_analyzer import VCFAnalyzer
+from analysis.vcf_reader import PARSER_BACKENDS
+import tempfile
+import os
+
+
+class Command(BaseCommand):
+    help = 'Compares VCF parser backends (time and metrics) on a large VCF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--input', type=str, help='VCF to benchmark (default: a synthetic VCF)', required=False)
+        parser.add_argument('--records', type=int, help='Records in the synthetic VCF', default=500000)
+        parser.add_argument('--contigs', type=int, help='Contigs in the synthetic VCF', default=4)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            vcf_path = options.get('input')
+            if not vcf_path:
+                vcf_path = os.path.join(tmpdir, 'synthetic.vcf')
+                self.stdout.write(f"Generating synthetic VCF with {options['records']} records...")
+                write_synthetic_vcf(vcf_path, options['records'], n_contigs=options['contigs'])
+
+            timings = {}
+            metrics = {}
+            for backend in PARSER_BACKENDS:
+                analyzer = VCFAnalyzer(vcf_path, streaming=True, backend=backend)
+                _, seconds = time_call(analyzer.process_and_export, os.path.join(tmpdir, f'{backend}.csv'))
+                timings[backend] = seconds
+                metrics[backend] = analyzer.get_summary()
+                total = metrics[backend]['total_variants']
+                self.stdout.write(f"  {backend:<8} {seconds:8.2f} s  {total / seconds if seconds else 0:12.0f} variants/s")
+
+            if metrics['native'] != metrics['pyvcf']:
+                self.stdout.write(self.style.ERROR('Metrics differ between backends!'))
+                return
+            self.stdout.write(self.style.SUCCESS(
+                f"Metrics identical. Speedup (pyvcf/native): {timings['pyvcf'] / timings['native']:.1f}x"
+            ))
@@ -0,0 +1,46 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from analysis.models import Analysis
+from analysis.reference_store import (
+    SIDECAR_SUFFIXES, collect_unreferenced, content_hash, reference_count, reference_storage,
+)
+
+
+class Command(BaseCommand):
+    help = 'Removes shared FASTA/GFF references no longer used by any analysis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=float, help='Keep files written less than this many seconds ago (default: REFERENCE_STORE_GRACE_SECONDS)', required=False)
+        parser.add_argument('--dedupe', action='store_true', help='First move uploads from before the content-addressed store into it')
+
+    def handle(self, *args, **options):
+        if options['dedupe']:
+            moved = self.dedupe()
+            self.stdout.write(f'Moved {moved} legacy reference file(s) into the content-addressed store.')
+        released = collect_unreferenced(grace=options.get('grace'))
+        for name in released:
+            self.stdout.write(f'  removed {name}')
+        self.stdout.write(self.style.SUCCESS(f'Removed {len(released)} unreferenced reference file(s).'))
+
+    def dedupe(self):
+        moved = 0
+        for field in ('gff_file', 'reference_file'):
+            legacy = (Analysis.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                      .values_list(field, flat=True).distinct())
+            for name in list(legacy):
+                path = reference_storage.path(name)
+                if content_hash(name) or not os.path.exists(path):
+                    continue
+                with open(path, 'rb') as f:
+                    new_name = reference_storage.save(name, File(f))
+                # update() não altera updated_at: os resultados continuam válidos
+                Analysis.objects.filter(**{field: name}).update(**{field: new_name})
+                if not reference_count(name):
+                    for old_path in [path] + [path + suffix for suffix in SIDECAR_SUFFIXES]:
+                        if os.path.exists(old_path):
+                            os.remove(old_path)
+                self.stdout.write(f'  {name} -> {new_name}')
+                moved += 1
+        return moved
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from analysis.jobs import WorkerPool
+
+
+class Command(BaseCommand):
+    help = 'Runs a pool of worker processes consuming the analysis job queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, help='Number of worker processes (default: ANALYSIS_WORKER_PROCESSES)', required=False)
+        parser.add_argument('--poll-interval', type=float, help='Seconds between queue polls when idle', required=False)
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        pool = WorkerPool(
+            processes=options.get('processes'),
+            poll_interval=options.get('poll_interval'),
+            burst=options['burst'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Starting {pool.processes} analysis worker(s) ({pool.prefix})'))
+        pool.run()
+        self.stdout.write('Workers stopped.')
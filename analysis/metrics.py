@@ -0,0 +1,243 @@
+import json
+import math
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Analysis, AnalysisJob, MetricSample
+
+# Formato de exposição em texto do Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+PREFIX = "microgen"
+
+# Limites (segundos) dos histogramas de duração: de etapas curtas a análises de horas
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Limites dos histogramas de vazão da leitura (variantes por segundo)
+THROUGHPUT_BUCKETS = (1e3, 5e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6)
+
+# Campos de upload contados em bytes recebidos
+UPLOAD_FIELDS = ("vcf_file", "gff_file", "reference_file")
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer():
+            return str(int(value)) if abs(value) < 1e15 else repr(value)
+        return repr(value)
+    return str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Histogram:
+    """Histograma cumulativo (``_bucket``/``_sum``/``_count``) por conjunto de rótulos."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self.series.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["buckets"][i] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def samples(self, name):
+        for key, series in sorted(self.series.items()):
+            labels = dict(key)
+            for bound, count in zip(self.buckets, series["buckets"]):
+                yield f"{name}_bucket", dict(labels, le=_format_value(float(bound))), count
+            yield f"{name}_bucket", dict(labels, le="+Inf"), series["count"]
+            yield f"{name}_sum", labels, round(series["sum"], 6)
+            yield f"{name}_count", labels, series["count"]
+
+
+class MetricsRegistry:
+    """Famílias de métricas de uma coleta, escritas no formato de texto do Prometheus."""
+
+    def __init__(self):
+        self.families = []
+
+    def add(self, name, kind, help_text, samples):
+        """``samples``: lista de (rótulos, valor), ou um ``Histogram``."""
+        self.families.append((f"{PREFIX}_{name}", kind, help_text, samples))
+
+    def render(self):
+        lines = []
+        for name, kind, help_text, samples in self.families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if isinstance(samples, Histogram):
+                rows = samples.samples(name)
+            else:
+                rows = ((name, labels, value) for labels, value in samples)
+            for sample_name, labels, value in rows:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# ---------------------------
+# Registro (uma vez por evento)
+# ---------------------------
+def _label_key(labels):
+    return json.dumps(labels, sort_keys=True)
+
+
+def _add(name, labels, amount, les=("",)):
+    """Soma ``amount`` às linhas (``name``, ``labels``, ``le``) de ``MetricSample``, criando-as se preciso."""
+    key = _label_key(labels)
+    MetricSample.objects.bulk_create([MetricSample(name=name, labels=key, le=le) for le in les],
+                                     ignore_conflicts=True)
+    MetricSample.objects.filter(name=name, labels=key, le__in=les).update(value=F('value') + amount)
+
+
+def increment(name, amount=1, **labels):
+    """Soma ``amount`` ao contador ``name``."""
+    if amount:
+        _add(name, labels, amount)
+
+
+def observe(name, value, buckets, **labels):
+    """Registra ``value`` no histograma ``name`` (buckets cumulativos, soma e contagem)."""
+    # O bucket +Inf é a própria contagem
+    bounds = [_format_value(float(bound)) for bound in buckets]
+    hit = [le for bound, le in zip(buckets, bounds) if value <= bound]
+    with transaction.atomic():
+        # Cria todos os buckets da série, mesmo os que esta observação não atinge
+        _add(f"{name}_bucket", labels, 0, les=bounds)
+        _add(f"{name}_bucket", labels, 1, les=hit)
+        _add(f"{name}_sum", labels, value)
+        _add(f"{name}_count", labels, 1)
+
+
+def record_job_started():
+    """Uma tentativa de execução reivindicada por um worker."""
+    increment("analysis_jobs_started_total")
+
+
+def record_job_finished(job, status, finished_at):
+    """Tarefa fechada como 'DONE' ou 'FAILED' (contador e latência fila + execução)."""
+    increment("analysis_jobs_completed_total" if status == 'DONE' else "analysis_jobs_failed_total")
+    observe("analysis_job_latency_seconds", (finished_at - job.created_at).total_seconds(), DURATION_BUCKETS,
+            status=status)
+
+
+def record_analysis_run(status, stage_timings):
+    """Tempos por etapa de uma execução de ``run_analysis`` (ver ``StageTimer``)."""
+    for record in stage_timings or ():
+        observe("analysis_stage_duration_seconds", record['wall_s'], DURATION_BUCKETS, stage=record['stage'])
+        # Leitura reaproveitada (reanálise incremental) não mede a vazão
+        if record['stage'] == 'parse' and record.get('rows') and record['wall_s'] > 0 \
+                and not record.get('reused'):
+            observe("analysis_parse_variants_per_second", record['rows'] / record['wall_s'], THROUGHPUT_BUCKETS)
+    if status == 'COMPLETED' and stage_timings:
+        observe("analysis_duration_seconds", sum(record['wall_s'] for record in stage_timings), DURATION_BUCKETS)
+
+
+def record_uploads(upload_info):
+    """Bytes dos arquivos recebidos, por campo (``upload_info`` de ``upload_handlers``)."""
+    for field, info in (upload_info or {}).items():
+        if field in UPLOAD_FIELDS and isinstance(info, dict):
+            increment("bytes_ingested_total", info.get('size') or 0, field=field)
+
+
+# ---------------------------
+# Coleta
+# ---------------------------
+def _stored_counter(name):
+    """{rótulos (JSON): valor} do contador ``name``."""
+    return dict(MetricSample.objects.filter(name=name).values_list('labels', 'value'))
+
+
+def _stored_histogram(name, buckets):
+    histogram = Histogram(buckets)
+    index = {_format_value(float(bound)): i for i, bound in enumerate(buckets)}
+    rows = MetricSample.objects.filter(name__in=(f"{name}_bucket", f"{name}_sum", f"{name}_count"))
+    for sample_name, labels, le, value in rows.values_list('name', 'labels', 'le', 'value'):
+        key = tuple(sorted(json.loads(labels).items()))
+        series = histogram.series.setdefault(key, {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0})
+        if sample_name.endswith("_sum"):
+            series["sum"] = value
+        elif sample_name.endswith("_count"):
+            series["count"] = int(value)
+        elif le in index:
+            series["buckets"][index[le]] = int(value)
+    return histogram
+
+
+def _by_status(queryset, choices):
+    counts = dict(queryset.values_list('status').annotate(n=Count('id')).order_by())
+    return [({"status": status}, counts.get(status, 0)) for status, _ in choices]
+
+
+def collect_metrics():
+    """Métricas da fila e das análises, lidas do banco a cada coleta.
+
+    As análises rodam nos processos de ``run_worker`` (outros processos ou
+    máquinas), então o estado vem do banco, e não de contadores em memória.
+    Contadores e histogramas são os agregados de ``MetricSample``, somados
+    uma vez por evento (ver ``record_*``); só os medidores de fila e de
+    status são contados na hora, com um GROUP BY por tabela.
+    """
+    registry = MetricsRegistry()
+
+    jobs = AnalysisJob.objects.all()
+    job_counts = _by_status(jobs, AnalysisJob.STATUS_CHOICES)
+    counts = {labels["status"]: n for labels, n in job_counts}
+    counters = {name: _stored_counter(name).get(_label_key({}), 0) for name in (
+        "analysis_jobs_started_total", "analysis_jobs_completed_total", "analysis_jobs_failed_total")}
+    registry.add("analysis_jobs_started_total", "counter",
+                 "Execuções de análise iniciadas por workers (cada tentativa conta).",
+                 [({}, counters["analysis_jobs_started_total"])])
+    registry.add("analysis_jobs_completed_total", "counter",
+                 "Tarefas de análise concluídas.", [({}, counters["analysis_jobs_completed_total"])])
+    registry.add("analysis_jobs_failed_total", "counter",
+                 "Tarefas de análise que falharam (erro nos dados ou tentativas esgotadas).",
+                 [({}, counters["analysis_jobs_failed_total"])])
+    registry.add("analysis_jobs", "gauge", "Tarefas de análise por status.", job_counts)
+    registry.add("analysis_queue_length", "gauge",
+                 "Tarefas na fila aguardando um worker.", [({}, counts.get('QUEUED', 0))])
+
+    oldest = jobs.filter(status='QUEUED').order_by('created_at').values_list('created_at', flat=True).first()
+    wait = (timezone.now() - oldest).total_seconds() if oldest else 0
+    registry.add("analysis_queue_oldest_age_seconds", "gauge",
+                 "Tempo de espera da tarefa mais antiga na fila.", [({}, round(wait, 3))])
+
+    registry.add("analysis_job_latency_seconds", "histogram",
+                 "Da entrada na fila ao fim da tarefa (espera + execução).",
+                 _stored_histogram("analysis_job_latency_seconds", DURATION_BUCKETS))
+
+    registry.add("analyses", "gauge", "Análises por status.",
+                 _by_status(Analysis.objects.all(), Analysis.STATUS_CHOICES))
+
+    registry.add("analysis_stage_duration_seconds", "histogram",
+                 "Tempo de parede de cada etapa de run_analysis.",
+                 _stored_histogram("analysis_stage_duration_seconds", DURATION_BUCKETS))
+    registry.add("analysis_duration_seconds", "histogram",
+                 "Tempo de execução das análises concluídas (soma das etapas).",
+                 _stored_histogram("analysis_duration_seconds", DURATION_BUCKETS))
+    registry.add("analysis_parse_variants_per_second", "histogram",
+                 "Vazão da leitura do VCF (variantes por segundo) por execução.",
+                 _stored_histogram("analysis_parse_variants_per_second", THROUGHPUT_BUCKETS))
+    ingested = _stored_counter("bytes_ingested_total")
+    registry.add("bytes_ingested_total", "counter", "Bytes recebidos em uploads, por campo.",
+                 [({"field": field}, ingested.get(_label_key({"field": field}), 0)) for field in UPLOAD_FIELDS])
+    return registry
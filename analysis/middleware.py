@@ -0,0 +1,16 @@
+from django.middleware.gzip import GZipMiddleware
+
+
+class RangeAwareGZipMiddleware(GZipMiddleware):
+    """``GZipMiddleware`` que não comprime respostas com ``Accept-Ranges``.
+
+    Arquivos servidos por ``file_serving.serve_file`` (VCF/FASTA/índices,
+    PNGs) são lidos por offsets: comprimi-los trocaria o trecho pedido num
+    206 por outro conteúdo, removeria o Content-Length, enfraqueceria o ETag
+    (o If-None-Match do navegador deixaria de casar) e impediria o sendfile.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Accept-Ranges'):
+            return response
+        return super().process_response(request, response)
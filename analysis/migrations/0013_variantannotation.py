@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0012_analysis_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VariantAnnotation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chrom', models.CharField(max_length=100)),
+                ('pos', models.BigIntegerField()),
+                ('ref', models.TextField()),
+                ('alt', models.TextField()),
+                ('genes', models.TextField(db_index=True)),
+                ('analysis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='annotations', to='analysis.analysis')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['analysis', 'chrom', 'pos'], name='analysis_va_analysi_5bdbce_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:05
+
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+
+def move_annotations(apps, schema_editor):
+    """Copia ``metrics['annotations']`` de análises antigas para VariantAnnotation."""
+    Analysis = apps.get_model('analysis', 'Analysis')
+    VariantAnnotation = apps.get_model('analysis', 'VariantAnnotation')
+    for analysis in Analysis.objects.exclude(metrics=None).iterator():
+        metrics = analysis.metrics
+        if not isinstance(metrics, dict) or 'annotations' not in metrics:
+            continue
+        annotations = metrics.pop('annotations') or []
+        for i in range(0, len(annotations), BATCH_SIZE):
+            VariantAnnotation.objects.bulk_create([
+                VariantAnnotation(
+                    analysis_id=analysis.id,
+                    chrom=str(a.get('CHROM', '')),
+                    pos=int(a.get('POS', 0)),
+                    ref=str(a.get('REF', '')),
+                    alt=str(a.get('ALT', '')),
+                    genes=str(a.get('GENES', '') or 'Nenhum'),
+                )
+                for a in annotations[i:i + BATCH_SIZE]
+            ])
+        Analysis.objects.filter(id=analysis.id).update(metrics=metrics)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0013_variantannotation'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_annotations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:03
+
+from django.db import migrations, models
+
+SUMMARY_KEYS = ('total_variants', 'snp_count', 'indel_count', 'mnv_count')
+
+
+def fill_summary(apps, schema_editor):
+    """Preenche o resumo das análises existentes a partir de ``metrics``."""
+    Analysis = apps.get_model('analysis', 'Analysis')
+    for analysis in Analysis.objects.exclude(metrics=None).only('id', 'status', 'updated_at', 'metrics').iterator():
+        metrics = analysis.metrics if isinstance(analysis.metrics, dict) else {}
+        values = {key: metrics.get(key) for key in SUMMARY_KEYS}
+        if analysis.status == 'COMPLETED':
+            values['completed_at'] = analysis.updated_at
+        Analysis.objects.filter(id=analysis.id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0014_move_annotations_out_of_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='analysis',
+            name='indel_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='analysis',
+            name='mnv_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='analysis',
+            name='snp_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='analysis',
+            name='total_variants',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='analysis',
+            index=models.Index(fields=['-created_at'], name='analysis_an_created_84f0d0_idx'),
+        ),
+        migrations.RunPython(fill_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:14
+
+import analysis.reference_store
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0015_analysis_summary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='analysis',
+            name='gff_file',
+            field=models.FileField(blank=True, null=True, storage=analysis.reference_store.get_reference_storage, upload_to='uploads/gff/'),
+        ),
+        migrations.AlterField(
+            model_name='analysis',
+            name='reference_file',
+            field=models.FileField(blank=True, help_text='Arquivo FASTA de referência (opcional)', null=True, storage=analysis.reference_store.get_reference_storage, upload_to='uploads/fasta/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0016_reference_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='upload_info',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
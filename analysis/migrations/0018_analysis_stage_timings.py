@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0017_analysis_upload_info'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='stage_timings',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0018_analysis_stage_timings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('labels', models.CharField(default='{}', max_length=255)),
+                ('le', models.CharField(blank=True, default='', max_length=20)),
+                ('value', models.FloatField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'labels', 'le'), name='unique_metric_sample')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:52
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def close_duplicate_open_jobs(apps, schema_editor):
+    """Mantém só a tarefa aberta mais antiga de cada análise; as demais viram 'FAILED'."""
+    AnalysisJob = apps.get_model('analysis', 'AnalysisJob')
+    seen = set()
+    duplicates = []
+    for job_id, analysis_id in (AnalysisJob.objects.filter(status__in=['QUEUED', 'RUNNING'])
+                                .order_by('created_at', 'id').values_list('id', 'analysis_id')):
+        if analysis_id in seen:
+            duplicates.append(job_id)
+        seen.add(analysis_id)
+    AnalysisJob.objects.filter(id__in=duplicates).update(
+        status='FAILED', finished_at=timezone.now(), locked_by=None,
+        last_error='Tarefa duplicada (outra tarefa aberta para a mesma análise)',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0019_metricsample'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_open_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='analysisjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['QUEUED', 'RUNNING'])), fields=('analysis',), name='unique_open_job_per_analysis'),
+        ),
+    ]
@@ -1,21 +1,52 @@
 from django.db import models
+from .reference_store import get_reference_storage
 import os
 
+class AnalysisQuerySet(models.QuerySet):
+    def with_results(self):
+        """Inclui as colunas JSON pesadas (``metrics`` e ``plot_data``)."""
+        return self.defer(None)
+
+    def summaries(self):
+        """Só as colunas do resumo (lista, admin, acompanhamento de status)."""
+        return self.only(*Analysis.SUMMARY_FIELDS)
+
+
+class AnalysisManager(models.Manager.from_queryset(AnalysisQuerySet)):
+    """Adia por padrão o carregamento de ``metrics``/``plot_data``.
+
+    Elas são lidas sob demanda ao acessar o atributo, ou de uma vez com
+    ``with_results()``.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().defer(*Analysis.HEAVY_FIELDS)
+
+
 class Analysis(models.Model):
     vcf_file = models.FileField(upload_to='uploads/vcf/')
-    gff_file = models.FileField(upload_to='uploads/gff/', blank=True, null=True)
+    # Referências ficam no armazenamento por conteúdo: uploads idênticos
+    # compartilham um arquivo (e seu .fai / cache de GFF)
+    gff_file = models.FileField(upload_to='uploads/gff/', storage=get_reference_storage, blank=True, null=True)
     reference_file = models.FileField(
         upload_to='uploads/fasta/',
+        storage=get_reference_storage,
         blank=True,
         null=True,
         help_text="Arquivo FASTA de referência (opcional)"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Última gravação (versão dos resultados, usada em ETags e cache de imagens)
+    updated_at = models.DateTimeField(auto_now=True)
     window_size = models.IntegerField(
         default=1000,
         help_text="Tamanho da janela para análise de densidade (bp)"
     )
     
+    # Tamanho, SHA-256 e compressão de cada arquivo enviado, por campo
+    # (calculados durante o upload, ver upload_handlers)
+    upload_info = models.JSONField(blank=True, null=True)
+
     # Métricas básicas e avançadas armazenadas como JSON
     metrics = models.JSONField(blank=True, null=True)
     
@@ -29,6 +60,10 @@ class Analysis(models.Model):
     # Caminho para CSV de anotações geradas
     annotation_file = models.CharField(max_length=255, blank=True, null=True)
 
+    # Por etapa de run_analysis: tempo de parede e de CPU, pico de RSS e
+    # linhas processadas (ver profiling.StageTimer)
+    stage_timings = models.JSONField(blank=True, null=True)
+
     # Status e mensagens de erro
     STATUS_CHOICES = [
         ('PENDING', 'Pendente'),
@@ -38,12 +73,125 @@ class Analysis(models.Model):
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     error_message = models.TextField(blank=True, null=True)
-    
+
+    # Resumo copiado de ``metrics`` ao concluir (lido pela lista, admin e status)
+    total_variants = models.IntegerField(blank=True, null=True)
+    snp_count = models.IntegerField(blank=True, null=True)
+    indel_count = models.IntegerField(blank=True, null=True)
+    mnv_count = models.IntegerField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    HEAVY_FIELDS = ('metrics', 'plot_data')
+    SUMMARY_FIELDS = ('id', 'vcf_file', 'created_at', 'updated_at', 'completed_at', 'status', 'error_message',
+                      'total_variants', 'snp_count', 'indel_count', 'mnv_count')
+
+    objects = AnalysisManager()
+
+    class Meta:
+        indexes = [models.Index(fields=['-created_at'])]
+
     def __str__(self):
         return f"Análise {self.id} - {os.path.basename(self.vcf_file.name)}"
+
+    def set_summary(self, metrics):
+        """Atualiza as colunas de resumo a partir de ``metrics``."""
+        for field in ('total_variants', 'snp_count', 'indel_count', 'mnv_count'):
+            setattr(self, field, (metrics or {}).get(field))
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'status_display': self.get_status_display(),
+            'error_message': self.error_message,
+            'total_variants': self.total_variants,
+            'snp_count': self.snp_count,
+            'indel_count': self.indel_count,
+            'mnv_count': self.mnv_count,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'completed_at': self.completed_at,
+        }
     
     # Exemplo de método futuro para contar SNPs ou INDELs
     def count_variant_type(self, variant_type):
         if not self.metrics:
             return 0
         return self.metrics.get(f"{variant_type}_count", 0)
+
+
+class AnalysisJob(models.Model):
+    """Tarefa persistente na fila de análises (consumida por ``manage.py run_worker``)."""
+    STATUS_CHOICES = [
+        ('QUEUED', 'Na fila'),
+        ('RUNNING', 'Executando'),
+        ('DONE', 'Concluída'),
+        ('FAILED', 'Falhou'),
+    ]
+    analysis = models.ForeignKey(Analysis, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+
+    # Trava: worker que reivindicou a tarefa e último sinal de vida
+    locked_by = models.CharField(max_length=100, blank=True, null=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+        # No máximo uma tarefa aberta (na fila ou executando) por análise
+        constraints = [
+            models.UniqueConstraint(fields=['analysis'], condition=models.Q(status__in=['QUEUED', 'RUNNING']),
+                                    name='unique_open_job_per_analysis'),
+        ]
+
+    def __str__(self):
+        return f"Tarefa {self.id} (análise {self.analysis_id}) - {self.status}"
+
+
+class MetricSample(models.Model):
+    """Valor acumulado de uma série do ``/metrics`` (contador, ou bucket/soma/contagem de histograma).
+
+    Atualizado uma vez por evento (tarefa reivindicada ou concluída, análise
+    executada, upload recebido), de modo que a coleta lê só estes agregados,
+    independentemente do histórico, e os contadores não diminuem quando
+    análises são excluídas.
+    """
+    name = models.CharField(max_length=100)
+    # Rótulos da série em JSON com chaves ordenadas ('{}' sem rótulos)
+    labels = models.CharField(max_length=255, default='{}')
+    # Limite do bucket de histograma; vazio nas demais séries
+    le = models.CharField(max_length=20, blank=True, default='')
+    value = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['name', 'labels', 'le'], name='unique_metric_sample')]
+
+    def __str__(self):
+        return f"{self.name}{self.labels}{f' le={self.le}' if self.le else ''} = {self.value}"
+
+
+class VariantAnnotation(models.Model):
+    """Uma linha da tabela de anotações: alelo alternativo x genes sobrepostos."""
+    analysis = models.ForeignKey(Analysis, on_delete=models.CASCADE, related_name='annotations')
+    chrom = models.CharField(max_length=100)
+    pos = models.BigIntegerField()
+    ref = models.TextField()
+    alt = models.TextField()
+    # Genes separados por ',' (join_genes); 'Nenhum' quando a variante é intergênica
+    genes = models.TextField(db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['analysis', 'chrom', 'pos'])]
+
+    def __str__(self):
+        return f"{self.chrom}:{self.pos} {self.ref}>{self.alt} ({self.genes})"
+
+    def as_row(self):
+        """Formato das linhas da tabela de anotações (colunas do VCF em maiúsculas)."""
+        return {'CHROM': self.chrom, 'POS': self.pos, 'REF': self.ref, 'ALT': self.alt, 'GENES': self.genes}
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+
+from .gff_parser import file_sha256
+
+# Versão do estado salvo (mudar força todas as etapas a rodar de novo)
+STATE_VERSION = 1
+
+MANIFEST_NAME = "state.json"
+STATE_NAME = "state.npz"
+
+# Etapas do pipeline, na ordem em que rodam
+STAGES = ("parse", "annotate", "density")
+
+
+def stage_key(*parts):
+    """Hash das entradas de uma etapa; muda quando qualquer entrada muda."""
+    return hashlib.sha256(json.dumps([STATE_VERSION, *parts], default=str).encode()).hexdigest()
+
+
+class PipelineState:
+    """Manifesto das etapas já executadas para uma análise (``results/<id>/state.json``).
+
+    Cada etapa guarda a chave (hash das entradas) com que rodou pela última
+    vez; numa reanálise só rodam as etapas cuja chave mudou. O hash de
+    arquivos grandes é reaproveitado enquanto tamanho e mtime não mudam.
+    """
+
+    def __init__(self, results_dir):
+        self.results_dir = results_dir
+        self.path = os.path.join(results_dir, MANIFEST_NAME)
+        self.state_path = os.path.join(results_dir, STATE_NAME)
+        self.stages = {}
+        self.hashes = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == STATE_VERSION:
+                    self.stages = data.get("stages", {})
+                    self.hashes = data.get("hashes", {})
+            except (OSError, ValueError) as e:
+                print(f"Manifesto de etapas inválido ({self.path}): {e}")
+
+    def file_hash(self, path, known=None):
+        """SHA-256 do conteúdo de ``path`` (lembrado por tamanho + mtime).
+
+        ``known`` (``{"size", "sha256"}`` registrado no upload) evita ler o
+        arquivo na primeira execução, se o tamanho confere.
+        """
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        cached = self.hashes.get(str(path))
+        if cached and cached["signature"] == signature:
+            return cached["sha256"]
+        if known and known.get("size") == stat.st_size:
+            digest = known["sha256"]
+        else:
+            digest = file_sha256(path)
+        self.hashes[str(path)] = {"signature": signature, "sha256": digest}
+        return digest
+
+    def is_current(self, stage, key, *paths):
+        """A etapa já rodou com ``key`` e os arquivos que ela produziu ainda existem."""
+        return self.stages.get(stage) == key and all(os.path.exists(p) for p in paths)
+
+    def invalidate(self, *stages):
+        """Esquece as etapas (antes de refazê-las: uma falha no meio não deixa chave válida)."""
+        for stage in stages:
+            self.stages.pop(stage, None)
+        self.save()
+
+    def mark(self, stage, key):
+        self.stages[stage] = key
+
+    def save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": STATE_VERSION, "stages": self.stages, "hashes": self.hashes}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+from matplotlib.figure import Figure
+
+from .processes import start_method
+
+# Versão do desenho (mudar força todos os gráficos a serem refeitos)
+PLOT_VERSION = 1
+
+# Séries de cada gráfico, gravadas pela análise e desenhadas sob demanda
+SPECS_NAME = "specs.json"
+
+# Ao lado de cada PNG: hash das entradas com que foi desenhado, e trava
+KEY_SUFFIX = ".key"
+LOCK_SUFFIX = ".lock"
+
+# Degraus por cromossomo no gráfico de densidade: janelas vizinhas são somadas
+# até esse limite (uma imagem de 1000 px não mostra mais que isso)
+MAX_DENSITY_STEPS = 2000
+
+# Bins do gráfico de densidade de mutação ao longo do genoma
+MUTATION_DENSITY_BINS = 200
+
+PLOT_FILES = {
+    "qual_plot": "qc_quality_distribution.png",
+    "density_plot": "density_per_chrom.png",
+    "mutation_density_plot": "mutation_density.png",
+}
+PLOT_NAMES = {file_name: name for name, file_name in PLOT_FILES.items()}
+
+# Início dos pools de processos da análise: os workers de run_worker mantêm
+# uma thread de heartbeat, e um fork com threads ativas pode herdar travas
+# presas (spawn onde não há forkserver)
+POOL_START_METHOD = start_method("forkserver")
+
+
+@contextmanager
+def file_lock(path):
+    """Trava exclusiva entre processos sobre o arquivo ``path`` (criado se preciso).
+
+    ``flock`` no POSIX; no Windows, ``msvcrt.locking`` sobre o primeiro byte.
+    O sistema libera a trava se o processo morrer, então não há trava órfã.
+    """
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK desiste após ~10 s; continua esperando
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def plot_key(spec):
+    """Hash das entradas de um gráfico; muda quando qualquer valor desenhado muda."""
+    payload = json.dumps([PLOT_VERSION, spec], sort_keys=True, default=_jsonable)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _jsonable(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def save_plot_specs(output_dir, specs):
+    """Grava as séries dos gráficos (``VCFAnalyzer.plot_specs``) em ``output_dir/specs.json``."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, SPECS_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(specs, f, default=_jsonable)
+    os.replace(tmp_path, path)
+
+
+def load_plot_specs(output_dir):
+    """Séries gravadas por ``save_plot_specs``, ou None se a análise não as gravou."""
+    path = os.path.join(output_dir, SPECS_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def coarsen_steps(starts, counts, window_size, max_steps=MAX_DENSITY_STEPS):
+    """(bordas, var/kb) de janelas contíguas, somando vizinhas até ``max_steps`` degraus."""
+    counts = np.asarray(counts, dtype=np.int64)
+    if counts.size == 0:
+        return np.zeros(1, dtype=np.int64), np.zeros(0)
+    k = max(1, -(-counts.size // max_steps))
+    padded = np.zeros(-(-counts.size // k) * k, dtype=np.int64)
+    padded[:counts.size] = counts
+    grouped = padded.reshape(-1, k).sum(axis=1)
+    first = int(starts[0]) if len(starts) else 0
+    edges = first + np.arange(grouped.size + 1, dtype=np.int64) * k * window_size
+    return edges, grouped / (k * window_size / 1000)
+
+
+# ---------------------------
+# DESENHO (um Figure por gráfico, sem o estado global do pyplot)
+# ---------------------------
+def draw_quality(spec, path):
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
+    ax.stairs(spec["counts"], spec["edges"], fill=True, color='green', alpha=0.7)
+    if spec["median"] is not None:
+        ax.axvline(spec["median"], color='black', linestyle='--', linewidth=1, label=f"Mediana: {spec['median']:.1f}")
+        ax.legend()
+    ax.set_xlabel("QUAL")
+    ax.set_ylabel("Contagem")
+    ax.set_title("Distribuição de Qualidade")
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def draw_density(spec, path):
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    # Um degrau preenchido por cromossomo, em vez de uma barra por janela
+    for chrom, (edges, values) in spec["chroms"].items():
+        if len(values):
+            ax.stairs(values, edges, fill=True, alpha=0.6, label=chrom)
+    ax.set_xlabel("Posição Genômica (bp)")
+    ax.set_ylabel("Densidade de Variantes (var/kb)")
+    ax.set_title("Densidade de Variantes por Cromossomo")
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def draw_mutation_density(spec, path):
+    fig = Figure(figsize=(10, 4))
+    ax = fig.subplots()
+    if len(spec["counts"]):
+        ax.stairs(spec["counts"], spec["edges"], fill=True, alpha=0.7)
+    ax.set_xlabel("Posição Genômica (bp)")
+    ax.set_ylabel("Contagem")
+    ax.set_title("Densidade de Mutação ao Longo do Genoma")
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+DRAWERS = {
+    "qual_plot": draw_quality,
+    "density_plot": draw_density,
+    "mutation_density_plot": draw_mutation_density,
+}
+
+
+def draw_plot(name, spec, path):
+    """Desenha o gráfico ``name`` em ``path`` (gravado num temporário e renomeado)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp.png"
+    try:
+        DRAWERS[name](spec, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+class PlotRenderer:
+    """Desenha os gráficos QC de uma análise em ``output_dir``.
+
+    Cada gráfico é descrito por um ``spec`` pequeno (séries já agregadas); o
+    hash do ``spec`` fica ao lado do PNG (``.key``) e um gráfico cujo arquivo
+    existe com a mesma chave não é redesenhado. ``render`` desenha vários em
+    paralelo, em até ``workers`` processos (``workers=1`` desenha neste
+    processo); ``render_one`` desenha um sob uma trava de arquivo, de modo que
+    pedidos simultâneos do mesmo gráfico (em qualquer processo) resultam num
+    só desenho.
+    """
+
+    def __init__(self, output_dir, workers=1):
+        self.output_dir = output_dir
+        self.workers = workers
+
+    def path(self, name):
+        return os.path.join(self.output_dir, PLOT_FILES[name])
+
+    def stored_key(self, name):
+        try:
+            with open(self.path(name) + KEY_SUFFIX, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def is_current(self, name, key):
+        return self.stored_key(name) == key and os.path.exists(self.path(name))
+
+    def _store_key(self, name, key):
+        path = self.path(name) + KEY_SUFFIX
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(key)
+        os.replace(tmp_path, path)
+
+    def render(self, specs):
+        """Desenha os ``specs`` ({nome: spec}) desatualizados; retorna {nome: caminho}."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        keys = {name: plot_key(spec) for name, spec in specs.items()}
+        pending = [name for name in specs if not self.is_current(name, keys[name])]
+
+        if self.workers > 1 and len(pending) > 1:
+            pool = ProcessPoolExecutor(max_workers=min(self.workers, len(pending)),
+                                       mp_context=multiprocessing.get_context(POOL_START_METHOD))
+            with pool:
+                futures = {name: pool.submit(draw_plot, name, specs[name], self.path(name)) for name in pending}
+                for name, future in futures.items():
+                    future.result()
+                    self._store_key(name, keys[name])
+        else:
+            for name in pending:
+                draw_plot(name, specs[name], self.path(name))
+                self._store_key(name, keys[name])
+        return {name: self.path(name) for name in specs}
+
+    def render_one(self, name, spec):
+        """Caminho do gráfico ``name``, desenhando-o antes se estiver desatualizado."""
+        key = plot_key(spec)
+        if self.is_current(name, key):
+            return self.path(name)
+        os.makedirs(self.output_dir, exist_ok=True)
+        with file_lock(self.path(name) + LOCK_SUFFIX):
+            # Quem esperou a trava encontra o gráfico já desenhado
+            if not self.is_current(name, key):
+                draw_plot(name, spec, self.path(name))
+                self._store_key(name, key)
+        return self.path(name)
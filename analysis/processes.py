@@ -0,0 +1,31 @@
+import importlib
+import multiprocessing
+
+
+def start_method(preferred):
+    """``preferred`` se a plataforma o oferece; senão ``'spawn'``.
+
+    ``fork`` e ``forkserver`` só existem no POSIX; no Windows os processos
+    filhos sempre começam com ``spawn``.
+    """
+    return preferred if preferred in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def get_context(preferred):
+    return multiprocessing.get_context(start_method(preferred))
+
+
+def run_with_django(target, *args):
+    """Entrada de um processo filho que usa o ORM: chama ``target`` ("módulo.função").
+
+    Com ``fork`` o filho herda o Django já configurado; com ``spawn`` ele
+    começa do zero (``DJANGO_SETTINGS_MODULE`` vem do ambiente herdado) e o
+    módulo de ``target`` só é importado depois de ``django.setup()``.
+    """
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    module, _, name = target.rpartition(".")
+    return getattr(importlib.import_module(module), name)(*args)
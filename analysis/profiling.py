@@ -0,0 +1,104 @@
+import cProfile
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: sem getrusage, RSS e CPU ficam como None
+    resource = None
+
+# Linhas por alocação no relatório do tracemalloc
+TRACEMALLOC_TOP = 25
+
+# ru_maxrss vem em KB no Linux e em bytes no macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss_bytes():
+    """Pico de memória residente deste processo e do maior processo filho já encerrado."""
+    if resource is None:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * _RSS_UNIT
+
+
+def cpu_seconds():
+    """Tempo de CPU (usuário + sistema) deste processo e dos filhos já encerrados."""
+    if resource is None:
+        return None
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+class StageTimer:
+    """Mede as etapas de uma execução: tempo de parede e de CPU, pico de RSS e linhas.
+
+    Cada ``stage(nome)`` gera um registro (``as_list``); o código da etapa
+    informa as linhas processadas em ``record["rows"]``. A CPU inclui os
+    processos filhos (leitura paralela, gráficos). O pico de RSS é o do
+    processo até o fim da etapa, pois o sistema não o zera entre etapas.
+
+    Com ``profile_dir``, ``cprofile`` grava ``<etapa>.prof`` (abrir com
+    ``pstats`` ou snakeviz) e ``tracemalloc`` grava ``<etapa>.tracemalloc.txt``
+    com as maiores alocações Python e registra o pico delas na etapa.
+    """
+
+    def __init__(self, profile_dir=None, cprofile=False, tracemalloc=False):
+        self.profile_dir = profile_dir
+        self.cprofile = bool(profile_dir and cprofile)
+        self.tracemalloc = bool(profile_dir and tracemalloc)
+        self.records = []
+        if self.profile_dir and (self.cprofile or self.tracemalloc):
+            os.makedirs(self.profile_dir, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name):
+        record = {"stage": name, "rows": None}
+        profiler = cProfile.Profile() if self.cprofile else None
+        started_tracing = False
+        if self.tracemalloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+
+        wall = time.perf_counter()
+        cpu = cpu_seconds()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record["wall_s"] = round(time.perf_counter() - wall, 4)
+            record["cpu_s"] = None if cpu is None else round(cpu_seconds() - cpu, 4)
+            peak = peak_rss_bytes()
+            record["peak_rss_mb"] = None if peak is None else round(peak / 2 ** 20, 1)
+            if profiler is not None:
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+            if self.tracemalloc:
+                record["py_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+                self._dump_tracemalloc(name)
+                if started_tracing:
+                    tracemalloc.stop()
+            self.records.append(record)
+
+    def _dump_tracemalloc(self, name):
+        stats = tracemalloc.take_snapshot().statistics("lineno")
+        with open(os.path.join(self.profile_dir, f"{name}.tracemalloc.txt"), "w", encoding="utf-8") as f:
+            for stat in stats[:TRACEMALLOC_TOP]:
+                f.write(f"{stat}\n")
+
+    def as_list(self):
+        return list(self.records)
+
+    def total_wall(self):
+        return round(sum(r["wall_s"] for r in self.records), 4)
@@ -0,0 +1,176 @@
+import glob
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+import pyfaidx
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Q
+from django.utils.deconstruct import deconstructible
+
+# Nome de um arquivo no armazenamento por conteúdo: <sha256><extensão>
+CONTENT_NAME = re.compile(r"^([0-9a-f]{64})((?:\.[a-z0-9]+)?(?:\.gz)?)$")
+
+# Índices criados ao lado de um FASTA (pyfaidx / IGV)
+SIDECAR_SUFFIXES = ('.fai', '.gzi')
+
+# Diretórios (em MEDIA_ROOT) das referências enviadas
+REFERENCE_DIRS = ('uploads/gff', 'uploads/fasta')
+
+
+def content_extension(name):
+    """Extensão normalizada (minúscula), mantendo ``.gz`` junto da anterior (ex.: ``.fa.gz``)."""
+    root, ext = os.path.splitext(os.path.basename(name).lower())
+    if ext == '.gz':
+        ext = os.path.splitext(root)[1] + ext
+    return ext if re.fullmatch(r"(?:\.[a-z0-9]+)?(?:\.gz)?", ext) else ''
+
+
+def content_hash(name):
+    """SHA-256 embutido no nome de um arquivo do armazenamento por conteúdo (ou None)."""
+    match = CONTENT_NAME.match(os.path.basename(name or ''))
+    return match.group(1) if match else None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Guarda cada conteúdo uma única vez, com o nome dado pelo seu SHA-256.
+
+    O hash vem do upload (``sha256``, calculado pelo ``InspectingUploadHandler``)
+    ou é calculado enquanto o conteúdo é copiado, bloco a bloco, para um
+    temporário no diretório de destino; se o conteúdo já existe o temporário
+    é descartado e o arquivo existente (com seu ``.fai`` e cache de GFF) é
+    reaproveitado. Arquivos sem análises que os usem são removidos por
+    ``release_reference``.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # O nome final vem do conteúdo (ver _save); não há colisão a evitar
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name)
+        full_dir = self.path(directory)
+        os.makedirs(full_dir, exist_ok=True)
+
+        # Hash já calculado durante o upload (InspectingUploadHandler): o
+        # temporário é só renomeado, sem reler nem copiar o conteúdo
+        sha256 = getattr(content, 'sha256', None)
+        if sha256:
+            final_name = os.path.join(directory, sha256 + content_extension(name))
+            final_path = self.path(final_name)
+            if os.path.exists(final_path):
+                os.utime(final_path)
+                return final_name.replace('\\', '/')
+            if hasattr(content, 'temporary_file_path'):
+                try:
+                    file_move_safe(content.temporary_file_path(), final_path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(final_path, self.file_permissions_mode)
+                except FileExistsError:
+                    os.utime(final_path)
+                return final_name.replace('\\', '/')
+
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=full_dir, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+            final_name = os.path.join(directory, digest.hexdigest() + content_extension(name))
+            final_path = self.path(final_name)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+                # Renova o mtime: protege da limpeza enquanto a nova análise é gravada
+                os.utime(final_path)
+            else:
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return final_name.replace('\\', '/')
+
+
+reference_storage = ContentAddressedStorage()
+
+
+def get_reference_storage():
+    return reference_storage
+
+
+def reference_count(name):
+    """Número de análises que usam o arquivo ``name`` (como GFF ou FASTA)."""
+    from .models import Analysis
+    return Analysis.objects.filter(Q(gff_file=name) | Q(reference_file=name)).count()
+
+
+def release_reference(name, grace=None):
+    """Remove ``name`` (e seus índices e cache de GFF) se nenhuma análise o usa mais.
+
+    Só vale para arquivos do armazenamento por conteúdo; arquivos gravados há
+    menos de ``grace`` segundos (``REFERENCE_STORE_GRACE_SECONDS``) são
+    mantidos, pois podem estar sendo usados por uma análise ainda não salva.
+    """
+    sha256 = content_hash(name)
+    if not sha256:
+        return False
+    path = reference_storage.path(name)
+    if not os.path.exists(path):
+        return False
+    if grace is None:
+        grace = getattr(settings, 'REFERENCE_STORE_GRACE_SECONDS', 3600)
+    if time.time() - os.path.getmtime(path) < grace or reference_count(name):
+        return False
+
+    from .gff_parser import GFF_CACHE_VERSION
+    from .services import gff_cache_dir
+    os.remove(path)
+    for sidecar in [path + suffix for suffix in SIDECAR_SUFFIXES]:
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+    cache_dir = gff_cache_dir()
+    if cache_dir:
+        for cache_path in glob.glob(os.path.join(cache_dir, f"{sha256}.v{GFF_CACHE_VERSION}.npz")):
+            os.remove(cache_path)
+    return True
+
+
+def collect_unreferenced(grace=None):
+    """Remove todas as referências sem análises; retorna os nomes removidos."""
+    released = []
+    for directory in REFERENCE_DIRS:
+        full_dir = reference_storage.path(directory)
+        if not os.path.isdir(full_dir):
+            continue
+        for filename in sorted(os.listdir(full_dir)):
+            name = f"{directory}/{filename}"
+            if release_reference(name, grace=grace):
+                released.append(name)
+    return released
+
+
+def ensure_fasta_index(path):
+    """Cria o ``.fai`` de um FASTA se ainda não existe; retorna True se o criou.
+
+    O índice é gravado num temporário e renomeado, para que análises
+    concorrentes sobre a mesma referência nunca leiam um índice incompleto.
+    """
+    fai_path = path + '.fai'
+    if os.path.exists(fai_path):
+        return False
+    tmp_path = f"{fai_path}.{os.getpid()}.tmp"
+    try:
+        pyfaidx.Faidx(path, indexname=tmp_path).close()
+        os.replace(tmp_path, fai_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
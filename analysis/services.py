@@ -1,27 +1,79 @@
-import concurrent.futures
 import traceback
 import os
 import shutil
 import pandas as pd
 import numpy as np
-from collections import defaultdict, Counter
 from django.conf import settings
-from .models import Analysis
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from .models import Analysis, VariantAnnotation
 from .vcf_analyzer import VCFAnalyzer
-from BCBio import GFF
-import pyfaidx
+from .gff_parser import load_gene_index
+from .gene_index import GeneIndex
+from .pipeline_state import PipelineState, stage_key
+from .aggregates import DENSITY_PYRAMID_NAME
+from .reference_store import content_hash, ensure_fasta_index
+from .tabix import ensure_indexed_vcf
+from .plots import save_plot_specs, PLOT_FILES
+from .profiling import StageTimer
+from .metrics import record_analysis_run
+from .variant_store import STORE_NAME, LEGACY_CSV_NAME
+from .table_cache import variant_tables, density_pyramids
 import time
 
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+# Anotações inseridas por comando INSERT
+ANNOTATION_BATCH_SIZE = 5000
 
-def start_analysis_background(analysis_id):
-    executor.submit(run_analysis, analysis_id)
+# Colunas gravadas por run_analysis: os parâmetros (gff_file, window_size)
+# ficam com a reanálise, mesmo que ela os altere durante a execução
+RESULT_FIELDS = ('status', 'metrics', 'plot_data', 'total_variants', 'snp_count', 'indel_count', 'mnv_count',
+                 'completed_at', 'updated_at')
+
+def gff_cache_dir():
+    return getattr(settings, 'GFF_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'cache', 'gff'))
+
+def start_analysis_background(analysis_id, reuse_open=True):
+    # Enfileira no banco; a execução fica com os processos de `manage.py run_worker`
+    from .jobs import enqueue_analysis
+    return enqueue_analysis(analysis_id, reuse_open=reuse_open)
+
+def store_annotations(analysis, chunks, preview_size=50):
+    """Grava as anotações (uma por alelo alternativo) em ``VariantAnnotation``.
+
+    Substitui as de uma execução anterior; insere bloco a bloco com
+    ``bulk_create`` e retorna as ``preview_size`` primeiras para o relatório.
+    """
+    analysis.annotations.all().delete()
+    preview = []
+    for chunk in chunks:
+        ann_df = chunk[["CHROM", "POS", "REF", "ALT", "GENES"]].copy()
+        ann_df["GENES"] = ann_df["GENES"].replace("", "Nenhum")
+        ann_df["ALT"] = ann_df["ALT"].str.split(",")
+        ann_df = ann_df.explode("ALT")
+        rows = zip(ann_df["CHROM"].tolist(), ann_df["POS"].astype(int).tolist(), ann_df["REF"].tolist(),
+                   ann_df["ALT"].tolist(), ann_df["GENES"].tolist())
+        objs = [VariantAnnotation(analysis=analysis, chrom=chrom, pos=pos, ref=ref, alt=alt, genes=genes)
+                for chrom, pos, ref, alt, genes in rows]
+        with transaction.atomic():
+            VariantAnnotation.objects.bulk_create(objs, batch_size=ANNOTATION_BATCH_SIZE)
+        preview.extend(obj.as_row() for obj in objs[:preview_size - len(preview)])
+    return preview
+
+def analysis_timer(output_dir):
+    """``StageTimer`` de uma execução; dumps de cProfile/tracemalloc (se ligados) em ``results/<id>/profile/``."""
+    return StageTimer(
+        os.path.join(output_dir, 'profile'),
+        cprofile=getattr(settings, 'ANALYSIS_PROFILE_CPROFILE', False),
+        tracemalloc=getattr(settings, 'ANALYSIS_PROFILE_TRACEMALLOC', False),
+    )
 
 def run_analysis(analysis_id):
+    timer = None
     try:
         analysis = Analysis.objects.get(id=analysis_id)
         analysis.status = 'PROCESSING'
-        analysis.save()
+        analysis.save(update_fields=['status', 'updated_at'])
 
         # -----------------------------
         # Preparar diretórios
@@ -29,204 +81,272 @@ def run_analysis(analysis_id):
         vcf_path = analysis.vcf_file.path
         output_dir = os.path.join(settings.MEDIA_ROOT, f'results/{analysis.id}')
         os.makedirs(output_dir, exist_ok=True)
-        variants_csv_path = os.path.join(output_dir, 'variants.csv')
+        variants_path = os.path.join(output_dir, STORE_NAME)
         report_txt_path = os.path.join(output_dir, 'report_summary.txt')
         plots_dir = os.path.join(output_dir, 'plots')
         os.makedirs(plots_dir, exist_ok=True)
+        # Tempo, CPU, memória e linhas de cada etapa (gravados em stage_timings)
+        timer = analysis_timer(output_dir)
 
         # -----------------------------
         # Garantir FASTA de referência para IGV
         # -----------------------------
-        if analysis.reference_file:
-            ref_path = analysis.reference_file.path
-            print(f"Referência do arquivo: {ref_path}")
-            # Check if .fai exists
-            fai_path = ref_path + '.fai'
-            if not os.path.exists(ref_path):
-                print(f"Erro: Arquivo de referência não encontrado: {ref_path}")
-            else:
-                print(f"Arquivo de referência encontrado!")
-                try:
-                    # PyFaidx creates index automatically on instanciation if not present
-                    pyfaidx.Fasta(ref_path)
-                    print(f"Index generated at {fai_path}")
-                except Exception as e:
-                    print(f"Error generating FASTA index: {e}")
-                    # Non-fatal, but IGV might complain
+        with timer.stage('reference_index'):
+            if analysis.reference_file:
+                ref_path = analysis.reference_file.path
+                print(f"Referência do arquivo: {ref_path}")
+                fai_path = ref_path + '.fai'
+                if not os.path.exists(ref_path):
+                    print(f"Erro: Arquivo de referência não encontrado: {ref_path}")
+                else:
+                    print(f"Arquivo de referência encontrado!")
+                    try:
+                        # Referência compartilhada: o .fai só é gerado no primeiro uso
+                        if ensure_fasta_index(ref_path):
+                            print(f"Index generated at {fai_path}")
+                        else:
+                            print(f"Index reused: {fai_path}")
+                    except Exception as e:
+                        print(f"Error generating FASTA index: {e}")
+                        # Non-fatal, but IGV might complain
 
         # -----------------------------
-        # Inicializa VCFAnalyzer
+        # VCF em BGZF + índice tabix (IGV busca só a região visível)
         # -----------------------------
-        analyzer = VCFAnalyzer(vcf_path)
-        analyzer.process_and_export(variants_csv_path)
+        with timer.stage('vcf_index'):
+            try:
+                indexed_vcf = ensure_indexed_vcf(vcf_path, output_dir)
+                print(f"VCF indexado: {indexed_vcf}")
+            except Exception as e:
+                # VCF fora de ordem: o IGV carrega o arquivo inteiro
+                print(f"Erro ao indexar o VCF: {e}")
 
         # -----------------------------
-        # Gerar gráficos QC
+        # Etapas a refazer (reanálise incremental)
         # -----------------------------
-        plot_paths = analyzer.generate_qc_plots(plots_dir)
+        # Cada etapa é identificada pelo hash das suas entradas; só rodam as
+        # que mudaram desde a última execução bem-sucedida
+        state = PipelineState(output_dir)
+        backend = getattr(settings, 'VCF_PARSER_BACKEND', 'native')
+        gff_path = analysis.gff_file.path if analysis.gff_file else None
+        upload_info = analysis.upload_info or {}
+        parse_key = stage_key('parse', state.file_hash(vcf_path, known=upload_info.get('vcf_file')), backend)
+        annotate_key = stage_key('annotate', parse_key, state.file_hash(gff_path) if gff_path else None)
+        density_key = stage_key('density', parse_key, analysis.window_size)
+        reuse_parse = state.is_current('parse', parse_key, variants_path, state.state_path)
+        reuse_annotate = reuse_parse and state.is_current('annotate', annotate_key)
+        pyramid_path = os.path.join(output_dir, DENSITY_PYRAMID_NAME)
+        reuse_density = reuse_parse and state.is_current('density', density_key, pyramid_path)
+        previous_metrics = (analysis.metrics or {}) if reuse_parse else {}
+        state.invalidate(*[stage for stage, reused in (('parse', reuse_parse), ('annotate', reuse_annotate),
+                                                      ('density', reuse_density)) if not reused])
+        print(f"Etapas reaproveitadas: leitura={reuse_parse}, anotação={reuse_annotate}, densidade={reuse_density}")
 
         # -----------------------------
-        # Obter dados de qualidade e densidade
+        # Carregar genes via GFF
         # -----------------------------
-        quality_data = [float(q) for q in analyzer.get_quality_distribution_data()] or []
-        density_data = {
-            chrom: {
-                "x": [int(v) for v in data["x"]],
-                "y": [float(v) for v in data["y"]],
-                "count": [int(v) for v in data["count"]]
-            }
-            for chrom, data in analyzer.get_density_data(window_size=getattr(analysis, 'window_size', 1000)).items()
-        } or {}
+        with timer.stage('gff') as stage:
+            gene_index = None
+            if gff_path and not reuse_annotate:
+                try:
+                    gene_index = load_gene_index(gff_path, cache_dir=gff_cache_dir(),
+                                                 sha256=content_hash(analysis.gff_file.name))
+                except Exception as e:
+                    print(f"Erro ao processar GFF: {e}")
+            stage['rows'] = len(gene_index) if gene_index is not None else None
 
         # -----------------------------
-        # Montar URLs públicas dos gráficos
+        # Inicializa VCFAnalyzer
         # -----------------------------
-        plots_url_base = f"{settings.MEDIA_URL.rstrip('/')}/results/{analysis.id}/plots"
+        # VCFs grandes são processados em blocos, com memória limitada, e
+        # divididos entre vários processos a partir de VCF_PARALLEL_MIN_BYTES
+        with timer.stage('parse') as stage:
+            vcf_size = os.path.getsize(vcf_path)
+            streaming = vcf_size >= getattr(settings, 'VCF_STREAMING_MIN_BYTES', 256 * 1024 * 1024)
+            workers = 1
+            if vcf_size >= getattr(settings, 'VCF_PARALLEL_MIN_BYTES', 64 * 1024 * 1024):
+                workers = getattr(settings, 'VCF_PARALLEL_WORKERS', 1)
+            analyzer = VCFAnalyzer(
+                vcf_path,
+                streaming=streaming,
+                chunk_size=getattr(settings, 'VCF_STREAMING_CHUNK_SIZE', 50000),
+                window_size=analysis.window_size,
+                backend=backend,
+                workers=workers,
+            )
+            if reuse_parse:
+                # VCF inalterado: agregados e tabela da execução anterior
+                analyzer.restore_state(state.state_path, variants_path)
+                if not reuse_annotate:
+                    analyzer.annotate(gene_index or GeneIndex(), weight_by_alleles=True)
+                    variant_tables.invalidate(analysis.id)
+            else:
+                # Genes por variante e contagens por gene (ponderadas por alelo) já na leitura
+                analyzer.process_and_export(variants_path, gene_index=gene_index, weight_by_alleles=True)
+                analyzer.save_state(state.state_path)
+                state.mark('parse', parse_key)
+                # CSV de versões anteriores: o Parquet o substitui (CSV é gerado sob demanda)
+                legacy_csv_path = os.path.join(output_dir, LEGACY_CSV_NAME)
+                if os.path.exists(legacy_csv_path):
+                    os.remove(legacy_csv_path)
+                # Tabela regravada: a cópia em cache (deste processo) fica obsoleta
+                variant_tables.invalidate(analysis.id)
 
-        analysis.plot_data = {
-            "quality": quality_data,
-            "density": density_data,
-            "plots": {
-                "qual_plot": f"{plots_url_base}/qc_quality_distribution.png",
-                "density_plot": f"{plots_url_base}/density_per_chrom.png"
-            }
-        }
+            if reuse_annotate:
+                for key in ('top_genes', 'ti_tv_gene'):
+                    analyzer.metrics[key] = previous_metrics.get(key, analyzer.metrics[key])
+            elif gene_index is not None or not gff_path:
+                # GFF que falhou ao carregar não conta como anotação feita
+                state.mark('annotate', annotate_key)
+            stage['rows'] = analyzer.metrics.get('total_variants')
+            # Leitura reaproveitada: as linhas não foram lidas nesta execução
+            stage['reused'] = reuse_parse
 
         # -----------------------------
-        # Anotar genes via GFF
+        # Gráficos QC e dados de densidade
         # -----------------------------
-        annotations = []
-        gene_index = defaultdict(list)
-        if analysis.gff_file:
-            try:
-                with open(analysis.gff_file.path) as gff_handle:
-                    for rec in GFF.parse(gff_handle):
-                        chrom = rec.id
-                        for feature in rec.features:
-                            if feature.type.lower() in ["gene", "cds"]:
-                                gene_index[chrom].append({
-                                    "start": int(feature.location.start),
-                                    "end": int(feature.location.end),
-                                    "name": feature.qualifiers.get('Name', feature.qualifiers.get('ID', ['Unknown']))[0]
-                                })
-            except Exception as e:
-                print(f"Erro ao processar GFF: {e}")
+        with timer.stage('density') as stage:
+            quality_data = analyzer.get_quality_distribution_data()
+            if reuse_density:
+                density_data = (analysis.plot_data or {}).get('density', {})
+                analyzer.metrics['hotspots'] = previous_metrics.get('hotspots', [])
+                analyzer.metrics['hotspot_count'] = previous_metrics.get(
+                    'hotspot_count', len(analyzer.metrics['hotspots']))
+            else:
+                # Só as séries: os PNGs são desenhados no primeiro acesso (view analysis_plot)
+                save_plot_specs(plots_dir, analyzer.plot_specs())
+                density_data = {
+                    chrom: {
+                        "x": [int(v) for v in data["x"]],
+                        "y": [float(v) for v in data["y"]],
+                        "count": [int(v) for v in data["count"]]
+                    }
+                    for chrom, data in analyzer.get_density_data(window_size=getattr(analysis, 'window_size', 1000)).items()
+                } or {}
+                # Densidade em qualquer janela/zoom (API de densidade) sem reprocessar
+                analyzer.density_pyramid().save(pyramid_path)
+                density_pyramids.invalidate(analysis.id)
+                state.mark('density', density_key)
+            stage['rows'] = sum(len(data['x']) for data in density_data.values())
+
+        # -----------------------------
+        # Montar URLs públicas dos gráficos
+        # -----------------------------
+        version = int(time.time())
+        plot_urls = {
+            name: f"{reverse('analysis_plot', args=[analysis.id, file_name])}?v={version}"
+            for name, file_name in PLOT_FILES.items()
+        }
 
         # -----------------------------
         # Criar tabela de variantes anotadas
         # -----------------------------
-        for _, row in analyzer.df_variants.iterrows():
-            chrom = row["CHROM"]
-            pos = int(row["POS"])
-            ref = row["REF"]
-            alt_list = row["ALT"].split(",")
-            genes = []
-            for gene in gene_index.get(chrom, []):
-                if gene["start"] <= pos <= gene["end"]:
-                    genes.append(gene["name"])
-            for alt in alt_list:
-                annotations.append({
-                    "CHROM": chrom,
-                    "POS": pos,
-                    "REF": ref,
-                    "ALT": alt,
-                    "GENES": ",".join(genes) if genes else "Nenhum"
-                })
+        with timer.stage('annotations') as stage:
+            if reuse_annotate:
+                annotations = [a.as_row() for a in analysis.annotations.order_by('id')[:50]]
+            else:
+                annotations = store_annotations(analysis, analyzer.iter_variant_chunks())
+            stage['rows'] = analyzer.metrics.get('total_variants')
 
         # -----------------------------
         # Criar métricas e salvar
         # -----------------------------
-        metrics = analyzer.get_summary()
-        metrics['annotations'] = annotations
-
-        # Contar top genes
-        gene_counter = Counter()
-        for var in annotations:
-            for g in var["GENES"].split(","):
-                if g != "Nenhum":
-                    gene_counter[g] += 1
-        metrics["top_genes"] = gene_counter.most_common(10)
-
-        analysis.metrics = metrics
-        analysis.plot_data = {
-            "quality": quality_data,
-            "density": density_data,
-            "plots": {
-                "qual_plot": f"{plots_url_base}/qc_quality_distribution.png?v={int(time.time())}",
-                "density_plot": f"{plots_url_base}/density_per_chrom.png?v={int(time.time())}"
+        with timer.stage('save'):
+            metrics = analyzer.get_summary()
+
+            analysis.metrics = metrics
+            analysis.plot_data = {
+                "quality": quality_data,
+                "density": density_data,
+                "plots": plot_urls
             }
-        }
 
-        analysis.status = 'COMPLETED'
-        analysis.save()
+            analysis.set_summary(metrics)
+            analysis.status = 'COMPLETED'
+            analysis.completed_at = timezone.now()
+            analysis.save(update_fields=RESULT_FIELDS)
+            state.save()
 
 
         # -----------------------------
         # Criar TXT de relatório simplificado
         # -----------------------------
-        with open(report_txt_path, 'w') as f:
-            f.write(f"Análise #{analysis.id}\n========================\n\n")
-            f.write("=== Métricas Gerais ===\n")
-            f.write(f"Total de Variantes: {metrics.get('total_variants',0)}\n")
-            f.write(f"SNPs: {metrics.get('snp_count',0)}\n")
-            f.write(f"Indels: {metrics.get('indel_count',0)}\n")
-            f.write(f"MNVs: {metrics.get('mnv_count',0)}\n")
-            f.write(f"Qualidade Média: {metrics.get('mean_quality',0):.2f}\n")
-            f.write(f"Baixa Qualidade (QUAL<20): {metrics.get('low_quality_count',0)}\n")
-            f.write(f"Transições (Ti): {metrics.get('transitions',0)}\n")
-            f.write(f"Transversões (Tv): {metrics.get('transversions',0)}\n")
-            f.write(f"Razão Ti/Tv: {metrics.get('ti_tv_ratio',0):.2f}\n\n")
-
-            f.write("=== Distribuição de Variantes por Tipo ===\n")
-            f.write(f"SNPs: {metrics.get('snp_count', 0)}\n")
-            f.write(f"Indels: {metrics.get('indel_count', 0)}\n")
-            f.write(f"MNVs: {metrics.get('mnv_count', 0)}\n\n")  # Linha em branco após essa seção
-
-            f.write("=== Impacto Funcional das Mutações ===\n")
-            if metrics.get("impact_counts"):
-                for k, v in metrics["impact_counts"].items():
-                    f.write(f"{k}: {v}\n")
-            else:
-                f.write("Dados não disponíveis\n")
-            f.write("\n")  # Linha em branco após esta seção
-
-            # Limitar a 10 hotspots
-            f.write("=== Hotspots de Variantes ===\n")
-            num_hotspots = len(metrics.get("hotspots", []))
-            f.write(f"Hotspots de Variantes: {num_hotspots}\n\n")
-
-            # Escrever cabeçalho
-            f.write("Cromossomo".ljust(20) + "Início da Janela".ljust(25) + "Contagem".rjust(10) + "\n")
-
-            # Escrever dados
-            hotspots = [  # Suponha que esta seja a sua lista de hotspots
-                {"CHROM": "NC_000913.3", "WINDOW_START": 224000, "COUNT": 6},
-                {"CHROM": "NC_000913.3", "WINDOW_START": 226000, "COUNT": 6},
-                {"CHROM": "NC_000913.3", "WINDOW_START": 3423000, "COUNT": 6},
-                {"CHROM": "NC_000913.3", "WINDOW_START": 4208000, "COUNT": 9},
-                {"CHROM": "NC_000913.3", "WINDOW_START": 4209000, "COUNT": 32}
-            ]
-
-            for hotspot in hotspots:
-                f.write(f"{hotspot['CHROM'].ljust(20)} {str(hotspot['WINDOW_START']).ljust(25)} {str(hotspot['COUNT']).rjust(10)}\n")
-            f.write("\n")
-
-            f.write("=== Top Genes Mais Mutados ===\n")
-            if metrics.get("top_genes"):
-                for gene, count in metrics["top_genes"]:
-                    f.write(f"{gene}: {count}\n")
-            else:
-                f.write("Nenhuma variante anotada\n")
-            f.write("\n")
+        with timer.stage('report'):
+            with open(report_txt_path, 'w') as f:
+                f.write(f"Análise #{analysis.id}\n========================\n\n")
+                f.write("=== Métricas Gerais ===\n")
+                f.write(f"Total de Variantes: {metrics.get('total_variants',0)}\n")
+                f.write(f"SNPs: {metrics.get('snp_count',0)}\n")
+                f.write(f"Indels: {metrics.get('indel_count',0)}\n")
+                f.write(f"MNVs: {metrics.get('mnv_count',0)}\n")
+                f.write(f"Qualidade Média: {metrics.get('mean_quality',0):.2f}\n")
+                if metrics.get('median_quality') is not None:
+                    f.write(f"Qualidade Mediana: {metrics['median_quality']:.2f}\n")
+                f.write(f"Baixa Qualidade (QUAL<20): {metrics.get('low_quality_count',0)}\n")
+                f.write(f"Transições (Ti): {metrics.get('transitions',0)}\n")
+                f.write(f"Transversões (Tv): {metrics.get('transversions',0)}\n")
+                f.write(f"Razão Ti/Tv: {metrics.get('ti_tv_ratio',0):.2f}\n\n")
+
+                f.write("=== Distribuição de Qualidade (QUAL) ===\n")
+                for name, value in (metrics.get('quality_quantiles') or {}).items():
+                    if value is not None:
+                        f.write(f"Percentil {name[1:]}: {value:.2f}\n")
+                f.write(f"Mínimo: {quality_data['min']}  Máximo: {quality_data['max']}\n\n")
+
+                f.write("=== Distribuição de Variantes por Tipo ===\n")
+                f.write(f"SNPs: {metrics.get('snp_count', 0)}\n")
+                f.write(f"Indels: {metrics.get('indel_count', 0)}\n")
+                f.write(f"MNVs: {metrics.get('mnv_count', 0)}\n\n")  # Linha em branco após essa seção
+
+                f.write("=== Impacto Funcional das Mutações ===\n")
+                if metrics.get("impact_counts"):
+                    for k, v in metrics["impact_counts"].items():
+                        f.write(f"{k}: {v}\n")
+                else:
+                    f.write("Dados não disponíveis\n")
+                f.write("\n")  # Linha em branco após esta seção
+
+                # Limitar a 10 hotspots
+                f.write("=== Hotspots de Variantes ===\n")
+                num_hotspots = metrics.get("hotspot_count", len(metrics.get("hotspots", [])))
+                f.write(f"Hotspots de Variantes: {num_hotspots}\n\n")
+
+                # Escrever cabeçalho
+                f.write("Cromossomo".ljust(20) + "Início da Janela".ljust(25) + "Contagem".rjust(10) + "\n")
+
+                # Escrever dados
+                hotspots = [  # Suponha que esta seja a sua lista de hotspots
+                    {"CHROM": "NC_000913.3", "WINDOW_START": 224000, "COUNT": 6},
+                    {"CHROM": "NC_000913.3", "WINDOW_START": 226000, "COUNT": 6},
+                    {"CHROM": "NC_000913.3", "WINDOW_START": 3423000, "COUNT": 6},
+                    {"CHROM": "NC_000913.3", "WINDOW_START": 4208000, "COUNT": 9},
+                    {"CHROM": "NC_000913.3", "WINDOW_START": 4209000, "COUNT": 32}
+                ]
+
+                for hotspot in hotspots:
+                    f.write(f"{hotspot['CHROM'].ljust(20)} {str(hotspot['WINDOW_START']).ljust(25)} {str(hotspot['COUNT']).rjust(10)}\n")
+                f.write("\n")
 
-            f.write("=== Anotações de Variantes (top 50) ===\n")
-            f.write(f"{'CHROM':<10}{'POS':<10}{'REF':<10}{'ALT':<15}{'GENES':<20}\n")  # Títulos das colunas
+                f.write("=== Top Genes Mais Mutados ===\n")
+                if metrics.get("top_genes"):
+                    for gene, count in metrics["top_genes"]:
+                        f.write(f"{gene}: {count}\n")
+                else:
+                    f.write("Nenhuma variante anotada\n")
+                f.write("\n")
 
-            # Adicionando as anotações de variantes
-            for var in annotations[:50]:
-                f.write(f"{var['CHROM']:<10}{var['POS']:<10}{var['REF']:<10}{var['ALT']:<15}{var['GENES']:<20}\n")
+                f.write("=== Anotações de Variantes (top 50) ===\n")
+                f.write(f"{'CHROM':<10}{'POS':<10}{'REF':<10}{'ALT':<15}{'GENES':<20}\n")  # Títulos das colunas
 
+                # Adicionando as anotações de variantes
+                for var in annotations[:50]:
+                    f.write(f"{var['CHROM']:<10}{var['POS']:<10}{var['REF']:<10}{var['ALT']:<15}{var['GENES']:<20}\n")
 
+        # update(): registrar os tempos não muda updated_at (versão dos resultados)
+        Analysis.objects.filter(id=analysis.id).update(stage_timings=timer.as_list())
+        record_analysis_run('COMPLETED', timer.as_list())
+        print(f"Análise {analysis.id} em {timer.total_wall():.2f}s: "
+              + ", ".join(f"{r['stage']}={r['wall_s']:.2f}s" for r in timer.records))
 
     except Exception as e:
         print(f"Erro na análise {analysis_id}: {e}")
@@ -235,6 +355,9 @@ def run_analysis(analysis_id):
             analysis = Analysis.objects.get(id=analysis_id)
             analysis.status = 'FAILED'
             analysis.error_message = str(e)
-            analysis.save()
+            # Etapas executadas até a falha
+            analysis.stage_timings = timer.as_list() if timer else None
+            analysis.save(update_fields=['status', 'error_message', 'stage_timings', 'updated_at'])
+            record_analysis_run('FAILED', analysis.stage_timings)
         except:
             pass
@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import Analysis
+from .table_cache import variant_tables, density_pyramids
+from .reference_store import release_reference
+
+
+@receiver(post_delete, sender=Analysis)
+def drop_cached_variant_table(sender, instance, **kwargs):
+    """Remove do cache a tabela e a pirâmide de densidade de uma análise excluída."""
+    variant_tables.invalidate(instance.id)
+    density_pyramids.invalidate(instance.id)
+
+
+@receiver(post_delete, sender=Analysis)
+def release_references(sender, instance, **kwargs):
+    """Apaga FASTA/GFF compartilhados que deixaram de ser usados (após o commit)."""
+    names = [f.name for f in (instance.gff_file, instance.reference_file) if f]
+    if names:
+        transaction.on_commit(lambda: [release_reference(name) for name in names])
@@ -0,0 +1,262 @@
+import gzip
+import os
+import struct
+
+from .bgzf import BgzfReader, BgzfWriter, is_bgzf
+from .variant_store import parse_region
+
+# Janela do índice linear (2**14 bp) e maior posição aceita pelo formato .tbi
+# (2**29 bp); contigs maiores exigiriam um índice CSI
+MIN_SHIFT = 14
+MAX_POSITION = 1 << 29
+
+INDEX_SUFFIX = ".tbi"
+
+# Cópia em BGZF (com .tbi) de um VCF enviado sem bgzip, em results/<id>/
+INDEXED_VCF_NAME = "variants.vcf.gz"
+
+# Campos do cabeçalho .tbi para VCF: formato, colunas CHROM/POS/(fim) e comentário
+_VCF_CONF = (2, 1, 2, 0, ord("#"), 0)
+
+
+class UnsortedVCF(ValueError):
+    """VCF fora de ordem (cromossomos em blocos e posições crescentes): não indexável."""
+
+
+def reg2bin(beg, end):
+    """Bin (esquema UCSC/tabix) do intervalo [beg, end), 0-based."""
+    end -= 1
+    for shift, offset in ((14, 4681), (17, 585), (20, 73), (23, 9), (26, 1)):
+        if beg >> shift == end >> shift:
+            return offset + (beg >> shift)
+    return 0
+
+
+def reg2bins(beg, end):
+    """Todos os bins que podem conter registros sobrepostos a [beg, end)."""
+    end -= 1
+    bins = [0]
+    for shift, offset in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+        bins.extend(range(offset + (beg >> shift), offset + (end >> shift) + 1))
+    return bins
+
+
+def record_span(line):
+    """(CHROM, início 0-based, fim exclusivo) de uma linha de dados do VCF (bytes)."""
+    fields = line.split(b"\t", 4)
+    if len(fields) < 4:
+        raise ValueError("Linha de VCF sem colunas separadas por TAB")
+    beg = int(fields[1]) - 1
+    return fields[0].decode(), beg, beg + max(len(fields[3]), 1)
+
+
+class TabixIndex:
+    """Índice tabix: bins com os trechos (offsets virtuais BGZF) de cada região e
+    índice linear (menor offset por janela de 16 kb), por cromossomo."""
+
+    def __init__(self):
+        self.names = []
+        self.bins = {}
+        self.linear = {}
+        self._last = None
+
+    def add(self, chrom, beg, end, voffset_beg, voffset_end):
+        if end > MAX_POSITION:
+            raise ValueError(f"Posição {end} além do limite do índice .tbi")
+        if chrom not in self.bins:
+            self.names.append(chrom)
+            self.bins[chrom] = {}
+            self.linear[chrom] = []
+        elif self._last is not None and (self._last[0] != chrom or self._last[1] > beg):
+            raise UnsortedVCF(f"VCF fora de ordem em {chrom}:{beg + 1}")
+        self._last = (chrom, beg)
+
+        chunks = self.bins[chrom].setdefault(reg2bin(beg, end), [])
+        if chunks and chunks[-1][1] == voffset_beg:
+            chunks[-1][1] = voffset_end
+        else:
+            chunks.append([voffset_beg, voffset_end])
+
+        linear = self.linear[chrom]
+        last_window = (end - 1) >> MIN_SHIFT
+        if len(linear) <= last_window:
+            linear.extend([None] * (last_window + 1 - len(linear)))
+        for window in range(beg >> MIN_SHIFT, last_window + 1):
+            if linear[window] is None:
+                linear[window] = voffset_beg
+
+    def chunks(self, chrom, beg, end):
+        """Trechos (offset virtual inicial, final) a ler para a região [beg, end)."""
+        if chrom not in self.bins or end <= beg:
+            return []
+        linear = self.linear[chrom]
+        window = beg >> MIN_SHIFT
+        min_offset = (linear[window] or 0) if window < len(linear) else 0
+        found = sorted(
+            (c_beg, c_end)
+            for b in reg2bins(beg, min(end, MAX_POSITION))
+            for c_beg, c_end in self.bins[chrom].get(b, ())
+            if c_end > min_offset
+        )
+        merged = []
+        for c_beg, c_end in found:
+            c_beg = max(c_beg, min_offset)
+            if merged and c_beg <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], c_end)
+            else:
+                merged.append([c_beg, c_end])
+        return [tuple(c) for c in merged]
+
+    def save(self, path):
+        names = b"".join(name.encode() + b"\0" for name in self.names)
+        data = bytearray(b"TBI\1")
+        data += struct.pack("<8i", len(self.names), *_VCF_CONF, len(names))
+        data += names
+        for name in self.names:
+            bins = self.bins[name]
+            data += struct.pack("<i", len(bins))
+            for b in sorted(bins):
+                data += struct.pack("<Ii", b, len(bins[b]))
+                for c_beg, c_end in bins[b]:
+                    data += struct.pack("<QQ", c_beg, c_end)
+            # Janelas vazias herdam o offset da próxima janela com registros
+            linear = list(self.linear[name])
+            for i in range(len(linear) - 2, -1, -1):
+                if linear[i] is None:
+                    linear[i] = linear[i + 1]
+            data += struct.pack(f"<i{len(linear)}Q", len(linear), *linear)
+        data += struct.pack("<Q", 0)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with BgzfWriter(tmp_path) as out:
+            out.write(data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = gzip.decompress(f.read())
+        if data[:4] != b"TBI\1":
+            raise ValueError(f"Índice tabix inválido: {path}")
+        n_ref, *_conf, l_nm = struct.unpack_from("<8i", data, 4)
+        offset = 36
+        index = cls()
+        index.names = [n.decode() for n in data[offset:offset + l_nm].split(b"\0")[:n_ref]]
+        offset += l_nm
+        for name in index.names:
+            (n_bin,) = struct.unpack_from("<i", data, offset)
+            offset += 4
+            bins = {}
+            for _ in range(n_bin):
+                b, n_chunk = struct.unpack_from("<Ii", data, offset)
+                offset += 8
+                values = struct.unpack_from(f"<{2 * n_chunk}Q", data, offset)
+                offset += 16 * n_chunk
+                bins[b] = [[values[i], values[i + 1]] for i in range(0, len(values), 2)]
+            (n_intv,) = struct.unpack_from("<i", data, offset)
+            offset += 4
+            index.bins[name] = bins
+            index.linear[name] = list(struct.unpack_from(f"<{n_intv}Q", data, offset))
+            offset += 8 * n_intv
+        return index
+
+
+def bgzip_and_index(source, path):
+    """Grava ``source`` (texto, gzip ou BGZF) em ``path`` como BGZF e cria ``path.tbi``.
+
+    Compactação e índice saem numa só passada pelo arquivo; os dois são
+    gravados em temporários e renomeados no fim. Levanta ``UnsortedVCF`` se o
+    VCF não estiver ordenado.
+    """
+    index = TabixIndex()
+    opener = gzip.open if _is_gzip(source) else open
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with opener(source, "rb") as src, BgzfWriter(tmp_path) as out:
+            for line in src:
+                if not line.endswith(b"\n"):
+                    line += b"\n"
+                if line.startswith(b"#") or not line.strip():
+                    out.write(line)
+                    continue
+                start = out.tell()
+                out.write(line)
+                index.add(*record_span(line), start, out.tell())
+        index.save(path + INDEX_SUFFIX)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return index
+
+
+def index_bgzf(path):
+    """Cria ``path.tbi`` para um VCF que já está em BGZF."""
+    index = TabixIndex()
+    with BgzfReader(path) as reader:
+        while True:
+            start = reader.tell()
+            line = reader.readline()
+            if not line:
+                break
+            if line.startswith(b"#") or not line.strip():
+                continue
+            index.add(*record_span(line), start, reader.tell())
+    index.save(path + INDEX_SUFFIX)
+    return index
+
+
+def fetch(path, chrom, beg=0, end=MAX_POSITION, index=None):
+    """Linhas (texto) do VCF BGZF ``path`` sobrepostas a ``chrom``:[beg, end), 0-based.
+
+    Usa o índice ``path.tbi`` para ler só os blocos da região.
+    """
+    index = index or TabixIndex.load(path + INDEX_SUFFIX)
+    with BgzfReader(path) as reader:
+        for c_beg, c_end in index.chunks(chrom, beg, end):
+            reader.seek(c_beg)
+            while reader.tell() < c_end:
+                line = reader.readline()
+                if not line:
+                    break
+                name, r_beg, r_end = record_span(line)
+                if r_beg >= end:
+                    break
+                if name == chrom and r_end > beg:
+                    yield line.decode()
+
+
+def fetch_region(path, region):
+    """``fetch`` para uma região em texto (``chrom``, ``chrom:pos`` ou ``chrom:início-fim``, 1-based)."""
+    chrom, start, end = parse_region(region)
+    beg = start - 1 if start else 0
+    return fetch(path, chrom, beg, end if end is not None else MAX_POSITION)
+
+
+def is_indexed(path):
+    return os.path.exists(path + INDEX_SUFFIX) and is_bgzf(path)
+
+
+def ensure_indexed_vcf(vcf_path, output_dir):
+    """Caminho de um VCF em BGZF, com índice tabix, equivalente a ``vcf_path``.
+
+    Um upload já em BGZF é indexado no lugar; os demais (texto ou gzip comum)
+    são copiados para ``output_dir/INDEXED_VCF_NAME``. Índice e cópia só são
+    refeitos se forem mais antigos que ``vcf_path``.
+    """
+    if is_bgzf(vcf_path):
+        path = vcf_path
+    else:
+        path = os.path.join(output_dir, INDEXED_VCF_NAME)
+    index_path = path + INDEX_SUFFIX
+    if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(vcf_path):
+        return path
+    if path == vcf_path:
+        index_bgzf(path)
+    else:
+        bgzip_and_index(vcf_path, path)
+    return path
+
+
+def _is_gzip(path):
+    with open(path, "rb") as f:
+        return f.read(2) == b"\x1f\x8b"
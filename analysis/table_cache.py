@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+# Limite padrão da memória ocupada pelas tabelas carregadas
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class TableCache:
+    """Cache LRU, limitado em bytes, das tabelas de variantes carregadas em memória.
+
+    Cada análise ocupa uma entrada, válida enquanto o arquivo da tabela tiver
+    o mesmo caminho, mtime e tamanho; uma reanálise (que regrava o arquivo)
+    invalida a entrada mesmo em outro processo. O tamanho de cada tabela é
+    relido a cada acesso, pois ela cresce com as ordenações e índices que
+    guarda. Tabelas maiores que o limite são usadas sem entrar no cache.
+    """
+
+    def __init__(self, max_bytes=None, setting='VARIANT_TABLE_CACHE_BYTES', default=DEFAULT_MAX_BYTES):
+        self._max_bytes = max_bytes
+        self.setting = setting
+        self.default = default
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return getattr(settings, self.setting, self.default)
+
+    @staticmethod
+    def signature(path):
+        stat = os.stat(path)
+        return (str(path), stat.st_mtime_ns, stat.st_size)
+
+    def peek(self, key, path):
+        """Tabela em cache de ``key`` se ainda válida para ``path`` (sem carregar)."""
+        signature = self.signature(path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != signature:
+                del self.entries[key]
+                self.invalidations += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get(self, key, path, loader):
+        """Tabela de ``key``; carrega com ``loader(path)`` se ausente ou desatualizada."""
+        table = self.peek(key, path)
+        if table is not None:
+            self._enforce_limit()
+            return table
+
+        signature = self.signature(path)
+        table = loader(path)
+        with self.lock:
+            self.misses += 1
+            if table.nbytes <= self.max_bytes:
+                self.entries[key] = (signature, table)
+                self.entries.move_to_end(key)
+        self._enforce_limit()
+        return table
+
+    def _enforce_limit(self):
+        with self.lock:
+            limit = self.max_bytes
+            while self.entries and self._total_bytes() > limit:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def _total_bytes(self):
+        return sum(table.nbytes for _, table in self.entries.values())
+
+    def invalidate(self, key):
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self.entries),
+                'bytes': self._total_bytes(),
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Caches do processo (cada processo do servidor web tem o seu)
+variant_tables = TableCache()
+density_pyramids = TableCache(setting='DENSITY_PYRAMID_CACHE_BYTES', default=64 * 1024 * 1024)
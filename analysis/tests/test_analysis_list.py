@@ -0,0 +1,56 @@
+from django.test import TestCase, Client
+from django.urls import reverse
+from analysis.models import Analysis
+from analysis.views import ANALYSES_PER_PAGE
+import json
+
+
+class AnalysisSummaryTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        heavy = {"quality": [30.0] * 1000}
+        Analysis.objects.bulk_create([
+            Analysis(vcf_file=f"uploads/vcf/run{i}.vcf", status="COMPLETED", total_variants=i,
+                     metrics={"total_variants": i}, plot_data=heavy)
+            for i in range(ANALYSES_PER_PAGE + 5)
+        ])
+
+    def test_heavy_columns_are_deferred(self):
+        analysis = Analysis.objects.first()
+        self.assertEqual(analysis.get_deferred_fields(), {"metrics", "plot_data"})
+        self.assertEqual(Analysis.objects.with_results().first().get_deferred_fields(), set())
+        # Continuam acessíveis sob demanda
+        self.assertEqual(len(analysis.plot_data["quality"]), 1000)
+
+    def test_list_is_paginated(self):
+        """Test if the list renders one page with a fixed number of queries."""
+        url = reverse('analysis_list')
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["analyses"]), ANALYSES_PER_PAGE)
+        self.assertEqual(response.context["page_obj"].paginator.num_pages, 2)
+
+        response = self.client.get(url, {"page": 2})
+        self.assertEqual(len(response.context["analyses"]), 5)
+        self.assertContains(response, "run0.vcf")
+
+    def test_status_endpoint(self):
+        analysis = Analysis.objects.create(vcf_file="uploads/vcf/new.vcf", status="PROCESSING")
+        data = json.loads(self.client.get(reverse('analysis_status', args=[analysis.pk])).content)
+        self.assertEqual((data["status"], data["total_variants"], data["completed_at"]), ("PROCESSING", None, None))
+
+    def test_set_summary(self):
+        analysis = Analysis(vcf_file="uploads/vcf/x.vcf")
+        analysis.set_summary({"total_variants": 10, "snp_count": 7, "indel_count": 2, "mnv_count": 1, "hotspots": []})
+        self.assertEqual((analysis.total_variants, analysis.snp_count, analysis.indel_count, analysis.mnv_count),
+                         (10, 7, 2, 1))
+
+    def test_admin_changelist_reads_summary(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        response = self.client.get(reverse('admin:analysis_analysis_changelist'))
+        self.assertEqual(response.status_code, 200)
+        analysis = response.context["cl"].result_list[0]
+        self.assertIn("metrics", analysis.get_deferred_fields())
+        response = self.client.get(reverse('admin:analysis_analysis_change', args=[analysis.pk]))
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,40 @@
+from django.test import TestCase
+from analysis.annotation import assign_genes, join_genes, GeneTally
+from analysis.gene_index import GeneIndex
+import pandas as pd
+
+
+class ColumnarAnnotationTest(TestCase):
+    def setUp(self):
+        self.index = GeneIndex([
+            ("chr1", 100, 200, "geneA"),
+            ("chr1", 150, 400, "geneB"),
+            ("chr2", 10, 20, "geneC"),
+        ])
+        self.df = pd.DataFrame({
+            "CHROM": ["chr1", "chr2", "chr1", "chr1", "chr3"],
+            "POS": [160, 15, 300, 50, 100],
+            "REF": ["A", "C", "G", "T", "A"],
+            "ALT": ["G", "A", "A", "C", "G"],
+            "IMPACT": ["synonymous", "", "nonsynonymous", "synonymous", ""],
+        })
+
+    def test_assign_and_join_genes(self):
+        pairs = assign_genes(self.df, self.index)
+        genes = join_genes(pairs, len(self.df), empty="Nenhum")
+        self.assertEqual(list(genes), ["geneA,geneB", "geneC", "geneB", "Nenhum", "Nenhum"])
+
+    def test_gene_metrics(self):
+        pairs = assign_genes(self.df, self.index)
+        tally = GeneTally().update(self.df, pairs)
+        self.assertEqual(tally.top(), [("geneB", 2), ("geneA", 1), ("geneC", 1)])
+        weighted = GeneTally().update(self.df, pairs, weights=[1, 1, 3, 1, 1])
+        self.assertEqual(weighted.top(), [("geneB", 4), ("geneA", 1), ("geneC", 1)])
+        # geneB: A>G (Ti) + G>A (Ti); geneC: C>A (Tv)
+        self.assertEqual(tally.ratios(), {"geneA": 0, "geneB": 0, "geneC": 0.0})
+
+    def test_empty_frame(self):
+        empty = self.df.iloc[0:0]
+        pairs = assign_genes(empty, self.index)
+        self.assertEqual(len(join_genes(pairs, 0)), 0)
+        self.assertEqual(GeneTally().update(empty, pairs).top(), [])
@@ -0,0 +1,44 @@
+from django.test import TestCase, override_settings
+from analysis.models import Analysis, VariantAnnotation
+from analysis.services import run_analysis, store_annotations
+import pandas as pd
+import tempfile
+import os
+
+
+class AnnotationStoreTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name, GFF_CACHE_DIR=None)
+        self.override.enable()
+        os.makedirs(os.path.join(self.tmpdir.name, "uploads/vcf"))
+        os.makedirs(os.path.join(self.tmpdir.name, "uploads/gff"))
+        with open(os.path.join(self.tmpdir.name, "uploads/vcf/test.vcf"), "w") as f:
+            f.write("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+            f.write("chr1\t150\t.\tA\tG,T\t30\t.\t.\n")
+            f.write("chr1\t900\t.\tC\tT\t40\t.\t.\n")
+        with open(os.path.join(self.tmpdir.name, "uploads/gff/test.gff"), "w") as f:
+            f.write("chr1\tsrc\tgene\t100\t200\t.\t+\t.\tID=gene1;Name=dnaA\n")
+        self.analysis = Analysis.objects.create(vcf_file="uploads/vcf/test.vcf", gff_file="uploads/gff/test.gff")
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def test_store_replaces_previous_rows(self):
+        chunk = pd.DataFrame({"CHROM": ["chr1"], "POS": [5], "REF": ["A"], "ALT": ["G,C"], "GENES": [""]})
+        store_annotations(self.analysis, [chunk])
+        preview = store_annotations(self.analysis, [chunk, chunk], preview_size=3)
+        self.assertEqual(self.analysis.annotations.count(), 4)
+        self.assertEqual(len(preview), 3)
+        self.assertEqual(preview[0], {"CHROM": "chr1", "POS": 5, "REF": "A", "ALT": "G", "GENES": "Nenhum"})
+
+    def test_metrics_keep_only_summary(self):
+        """Test if run_analysis stores annotations as rows and keeps them out of metrics."""
+        run_analysis(self.analysis.id)
+        self.analysis.refresh_from_db()
+        self.assertEqual(self.analysis.status, "COMPLETED", self.analysis.error_message)
+        self.assertNotIn("annotations", self.analysis.metrics)
+        rows = list(VariantAnnotation.objects.filter(analysis=self.analysis)
+                    .order_by("id").values_list("pos", "alt", "genes"))
+        self.assertEqual(rows, [(150, "G", "dnaA"), (150, "T", "dnaA"), (900, "T", "Nenhum")])
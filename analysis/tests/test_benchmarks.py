@@ -0,0 +1,74 @@
+from django.core.management import call_command
+from django.test import TestCase
+from analysis.benchmarks import (write_synthetic_vcf, write_synthetic_gff, synthetic_contig_length, percentiles,
+                                 variants_api_requests)
+from analysis.gff_parser import load_gene_index
+from analysis.vcf_reader import iter_records
+from io import StringIO
+import tempfile
+import json
+import os
+
+
+class SyntheticInputsTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def read(self, name):
+        with open(self.path(name), "rb") as f:
+            return f.read()
+
+    def test_generators_are_deterministic(self):
+        """Test if the same seed reproduces the same files byte for byte."""
+        for name, seed in (("a", 1), ("b", 1), ("c", 2)):
+            write_synthetic_vcf(self.path(f"{name}.vcf"), 3000, n_contigs=3, seed=seed)
+            write_synthetic_gff(self.path(f"{name}.gff"), 200, n_contigs=3, seed=seed)
+        self.assertEqual(self.read("a.vcf"), self.read("b.vcf"))
+        self.assertEqual(self.read("a.gff"), self.read("b.gff"))
+        self.assertNotEqual(self.read("a.vcf"), self.read("c.vcf"))
+        self.assertNotEqual(self.read("a.gff"), self.read("c.gff"))
+        self.assertEqual(variants_api_requests(10, 3, 1000, seed=1), variants_api_requests(10, 3, 1000, seed=1))
+
+    def test_gff_matches_vcf_contigs(self):
+        records = list(iter_records(write_synthetic_vcf(self.path("calls.vcf"), 3000, n_contigs=3)))
+        length = synthetic_contig_length(3000, 3)
+        gene_index = load_gene_index(write_synthetic_gff(self.path("genes.gff"), 200, n_contigs=3,
+                                                         contig_length=length))
+        self.assertEqual(len(records), 3000)
+        self.assertTrue(any("ANN=" in line for line in self.read("calls.vcf").decode().splitlines()))
+        # Só os genes entram no índice (os CDS são filhos)
+        self.assertEqual(len(gene_index), 200)
+        self.assertEqual(set(gene_index.chromosomes()), {r[0] for r in records})
+
+    def test_percentiles(self):
+        result = percentiles([4, 1, 3, 2, 5])
+        self.assertEqual(result["p50"], 3)
+        self.assertAlmostEqual(result["p90"], 4.6)
+        self.assertAlmostEqual(result["p99"], 4.96)
+        self.assertEqual(percentiles([]), {"p50": None, "p90": None, "p99": None})
+
+
+class BenchCommandTest(TestCase):
+    def test_reports_each_stage_as_json(self):
+        out = StringIO()
+        call_command("bench", records=2000, contigs=2, genes=100, repeat=2,
+                     stages="parse,gff,annotate_with_gff,calculate_density", stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["params"]["records"], 2000)
+        self.assertEqual(report["inputs"]["vcf"]["synthetic"], 2000)
+        self.assertEqual([s["stage"] for s in report["stages"]],
+                         ["parse", "gff", "annotate_with_gff", "calculate_density"])
+        parse, gff = report["stages"][:2]
+        self.assertEqual((parse["rows"], parse["runs"], parse["samples"]), (2000, 2, 2))
+        self.assertEqual(gff["rows"], 100)
+        for stage in report["stages"]:
+            self.assertGreater(stage["throughput_rows_s"], 0)
+            self.assertLessEqual(stage["latency_s"]["min"], stage["latency_s"]["p50"])
+            self.assertLessEqual(stage["latency_s"]["p50"], stage["latency_s"]["p99"])
+            self.assertGreater(stage["peak_rss_mb"], 0)
@@ -0,0 +1,115 @@
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from analysis.models import Analysis, VariantAnnotation
+from analysis.aggregates import DensityCounter, DensityPyramid
+from analysis.table_cache import density_pyramids
+import tempfile
+import gzip
+import json
+import os
+
+
+class DetailJSONEndpointsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.analysis = Analysis.objects.create(
+            vcf_file="uploads/vcf/test.vcf",
+            status="COMPLETED",
+            metrics={"total_variants": 100},
+            plot_data={
+                "quality": [30.0, 40.0],
+                "density": {"chr1": {"x": [0], "y": [2.0], "count": [2]},
+                            "chr2": {"x": [0], "y": [1.0], "count": [1]}},
+            },
+        )
+        VariantAnnotation.objects.bulk_create([
+            VariantAnnotation(analysis=self.analysis, chrom="chr1", pos=p, ref="A", alt="G",
+                              genes="dnaA" if p < 50 else "Nenhum")
+            for p in range(1, 101)
+        ])
+
+    def test_detail_page_does_not_embed_annotations(self):
+        response = self.client.get(reverse('analysis_detail', args=[self.analysis.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "dnaA")
+        self.assertContains(response, reverse('analysis_annotations_api', args=[self.analysis.pk]))
+
+    def test_annotations_are_paginated(self):
+        url = reverse('analysis_annotations_api', args=[self.analysis.pk])
+        data = json.loads(self.client.get(url, {"start": 95, "length": 10}).content)
+        self.assertEqual((data["recordsTotal"], data["recordsFiltered"]), (100, 100))
+        self.assertEqual([a["POS"] for a in data["data"]], [96, 97, 98, 99, 100])
+
+        data = json.loads(self.client.get(url, {"search[value]": "DNAA", "length": 5}).content)
+        self.assertEqual(data["recordsFiltered"], 49)
+
+    def test_plot_series_by_chunk(self):
+        url = reverse('analysis_plot_data', args=[self.analysis.pk])
+        index = json.loads(self.client.get(url).content)
+        self.assertEqual((index["series"], index["chroms"]), (["quality", "density"], ["chr1", "chr2"]))
+
+        data = json.loads(self.client.get(url, {"series": "density", "chrom": "chr2"}).content)
+        self.assertEqual(data["data"], {"chr2": {"x": [0], "y": [1.0], "count": [1]}})
+        self.assertEqual(self.client.get(url, {"series": "other"}).status_code, 400)
+
+    def test_conditional_get(self):
+        """Test if an unchanged analysis answers 304 and a saved one gets a new ETag."""
+        url = reverse('analysis_plot_data', args=[self.analysis.pk])
+        first = self.client.get(url, {"series": "quality"})
+        etag = first["ETag"]
+        cached = self.client.get(url, {"series": "quality"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+
+        self.analysis.save()
+        fresh = self.client.get(url, {"series": "quality"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+
+    def test_responses_are_compressed(self):
+        url = reverse('analysis_annotations_api', args=[self.analysis.pk])
+        response = self.client.get(url, {"length": 100}, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))["data"]), 100)
+
+
+class DensityAPITest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        self.override.enable()
+        self.analysis = Analysis.objects.create(vcf_file="uploads/vcf/test.vcf", status="COMPLETED")
+        results_dir = os.path.join(self.tmpdir.name, f"results/{self.analysis.id}")
+        os.makedirs(results_dir)
+        counter = DensityCounter(base_window=100)
+        counter.add("chr1", list(range(50, 100000, 50)))
+        counter.add("chr2", [150, 250])
+        DensityPyramid.from_counter(counter).save(os.path.join(results_dir, "density.npz"))
+        self.url = reverse('analysis_density_api', args=[self.analysis.pk])
+        density_pyramids.clear()
+
+    def tearDown(self):
+        density_pyramids.clear()
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def test_any_window_and_region(self):
+        data = json.loads(self.client.get(self.url, {"chrom": "chr1", "window_size": 2500,
+                                                     "start": 5000, "end": 9000}).content)
+        self.assertEqual(data["window_size"], 2500)
+        self.assertEqual(data["data"]["chr1"]["x"], [5000, 7500])
+        self.assertEqual(data["data"]["chr1"]["count"], [50, 50])
+        self.assertEqual(data["data"]["chr1"]["y"], [20.0, 20.0])
+
+        self.assertEqual(self.client.get(self.url, {"window_size": 150}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"chrom": "chr9"}).status_code, 404)
+
+    def test_zoom_picks_window_from_bins(self):
+        """Test if, without a window size, the finest pyramid level within `bins` windows is used."""
+        whole = json.loads(self.client.get(self.url, {"chrom": "chr1", "bins": 100}).content)
+        self.assertEqual(whole["window_size"], 1600)
+        self.assertEqual(sum(whole["data"]["chr1"]["count"]), 1999)
+
+        zoomed = json.loads(self.client.get(self.url, {"chrom": "chr1", "bins": 100,
+                                                       "start": 1000, "end": 6000}).content)
+        self.assertEqual(zoomed["window_size"], 100)
+        self.assertEqual(len(zoomed["data"]["chr1"]["x"]), 50)
+        self.assertEqual(density_pyramids.stats()["misses"], 1)
@@ -0,0 +1,115 @@
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from analysis.models import Analysis
+from analysis.tabix import bgzip_and_index, INDEXED_VCF_NAME, INDEX_SUFFIX
+import tempfile
+import os
+
+VCF = ("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+       + "".join(f"chr1\t{p}\t.\tA\tG\t30\t.\t.\n" for p in range(1, 200)))
+
+
+class AnalysisFileViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        self.override.enable()
+        for directory in ("uploads/vcf", "uploads/fasta"):
+            os.makedirs(os.path.join(self.tmpdir.name, directory))
+        with open(os.path.join(self.tmpdir.name, "uploads/vcf/calls.vcf"), "w") as f:
+            f.write(VCF)
+        self.fasta = b">chr1\n" + b"ACGT" * 500 + b"\n"
+        with open(os.path.join(self.tmpdir.name, "uploads/fasta/ref.fa"), "wb") as f:
+            f.write(self.fasta)
+        with open(os.path.join(self.tmpdir.name, "uploads/fasta/ref.fa.fai"), "w") as f:
+            f.write("chr1\t2000\t6\t2000\t2001\n")
+        self.analysis = Analysis.objects.create(vcf_file="uploads/vcf/calls.vcf", reference_file="uploads/fasta/ref.fa",
+                                                status="COMPLETED")
+        self.output_dir = os.path.join(self.tmpdir.name, f"results/{self.analysis.id}")
+        os.makedirs(os.path.join(self.output_dir, "plots"))
+        with open(os.path.join(self.output_dir, "report_summary.txt"), "w") as f:
+            f.write("Análise\n")
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def url(self, name):
+        return reverse('analysis_file', args=[self.analysis.pk, name])
+
+    def test_range_request(self):
+        """Test if a Range request returns only that slice as 206 Partial Content."""
+        response = self.client.get(self.url("reference/ref.fa"), HTTP_RANGE="bytes=6-15")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.fasta[6:16])
+        self.assertEqual(response["Content-Range"], f"bytes 6-15/{len(self.fasta)}")
+        self.assertEqual(response["Content-Length"], "10")
+
+        response = self.client.get(self.url("reference/ref.fa"), HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.fasta[-5:])
+        response = self.client.get(self.url("reference/ref.fa"), HTTP_RANGE="bytes=2000-")
+        self.assertEqual(b"".join(response.streaming_content), self.fasta[2000:])
+
+        response = self.client.get(self.url("reference/ref.fa"), HTTP_RANGE=f"bytes={len(self.fasta)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.fasta)}")
+
+    def test_range_not_gzipped(self):
+        """Test if file responses skip GZip even when the client accepts it."""
+        response = self.client.get(self.url("reference/ref.fa"), HTTP_RANGE="bytes=6-1005",
+                                   HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 206)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["Content-Length"], "1000")
+        self.assertEqual(b"".join(response.streaming_content), self.fasta[6:1006])
+
+        etag = response["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+        self.assertEqual(self.client.get(self.url("reference/ref.fa"), HTTP_IF_NONE_MATCH=etag,
+                                         HTTP_ACCEPT_ENCODING="gzip").status_code, 304)
+
+        response = self.client.get(self.url("reference/ref.fa"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content), self.fasta)
+
+    def test_whole_file_and_conditional_get(self):
+        response = self.client.get(self.url("reference/ref.fa"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.fasta)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        self.assertEqual(self.client.get(self.url("reference/ref.fa"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url("reference/ref.fa"),
+                                         HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        # If-Range de outra versão: o arquivo inteiro, não o trecho
+        response = self.client.get(self.url("reference/ref.fa"), HTTP_RANGE="bytes=0-3", HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_files_scoped_to_analysis(self):
+        self.assertEqual(self.client.get(self.url("reference/ref.fa.fai")).status_code, 200)
+        self.assertEqual(self.client.get(self.url("vcf/calls.vcf")).status_code, 200)
+        response = self.client.get(self.url("results/report_summary.txt"))
+        self.assertEqual((response.status_code, response["Content-Type"]), (200, "text/plain"))
+
+        other = Analysis.objects.create(vcf_file="uploads/vcf/other.vcf")
+        for name in ("vcf/other.vcf", "reference/other.fa", "results/../../uploads/vcf/calls.vcf",
+                     f"results/../{other.id}/report_summary.txt", "results/missing.png", INDEXED_VCF_NAME):
+            self.assertEqual(self.client.get(self.url(name)).status_code, 404, name)
+        self.assertEqual(self.client.get(reverse('analysis_file', args=[other.pk, "reference/ref.fa"])).status_code,
+                         404)
+
+    def test_indexed_vcf_served_as_binary(self):
+        bgzip_and_index(self.analysis.vcf_file.path, os.path.join(self.output_dir, INDEXED_VCF_NAME))
+        response = self.client.get(self.url(INDEXED_VCF_NAME), HTTP_RANGE="bytes=0-17")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Type"], "application/octet-stream")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content)[:4], b"\x1f\x8b\x08\x04")
+        self.assertEqual(self.client.get(self.url(INDEXED_VCF_NAME + INDEX_SUFFIX)).status_code, 200)
+
+        detail = self.client.get(reverse('analysis_detail', args=[self.analysis.pk]))
+        self.assertContains(detail, self.url("reference/ref.fa.fai"))
+        self.assertContains(detail, self.url(INDEXED_VCF_NAME))
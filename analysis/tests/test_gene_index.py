@@ -0,0 +1,60 @@
+from django.test import TestCase
+from analysis.gene_index import GeneIndex
+from unittest import mock
+import random
+
+
+class GeneIndexTest(TestCase):
+    def setUp(self):
+        self.intervals = [
+            ("chr1", 100, 200, "geneA"),
+            ("chr1", 150, 400, "geneB"),
+            ("chr1", 50, 120, "geneC"),
+            ("chr1", 1000, 1500, "geneD"),
+            ("chr2", 10, 20, "geneE"),
+        ]
+        self.index = GeneIndex(self.intervals)
+
+    def linear_scan(self, chrom, pos):
+        return [name for c, start, end, name in self.intervals
+                if c == chrom and start <= pos <= end]
+
+    def test_overlapping_matches_linear_scan(self):
+        """Test if bisect lookups return the same genes, in file order, as a linear scan."""
+        for chrom in ("chr1", "chr2", "chr3"):
+            for pos in range(0, 1600, 5):
+                self.assertEqual(self.index.overlapping(chrom, pos), self.linear_scan(chrom, pos))
+
+    def test_interval_bounds_are_inclusive(self):
+        self.assertEqual(self.index.overlapping("chr1", 200), ["geneA", "geneB"])
+        self.assertEqual(self.index.overlapping("chr1", 201), ["geneB"])
+        self.assertEqual(self.index.overlapping("chr1", 50), ["geneC"])
+
+    def pair_lists(self, chrom, positions):
+        var_idx, names, order = self.index.overlap_pairs(chrom, positions)
+        result = [[] for _ in positions]
+        for i, name, _ in sorted(zip(var_idx.tolist(), names.tolist(), order.tolist()), key=lambda p: (p[0], p[2])):
+            result[i].append(name)
+        return result
+
+    def test_overlap_pairs_match_point_queries(self):
+        """Test if the vectorized join returns, per unsorted position, the genes of a linear scan."""
+        rng = random.Random(42)
+        positions = [rng.randint(0, 1600) for _ in range(500)]
+        result = self.pair_lists("chr1", positions)
+        for pos, genes in zip(positions, result):
+            self.assertEqual(genes, self.linear_scan("chr1", pos))
+
+    def test_unknown_chromosome(self):
+        self.assertEqual(self.pair_lists("chrX", [1, 2]), [[], []])
+
+    def test_overlap_pairs_in_slices(self):
+        """Test if splitting the candidate expansion into small slices gives the same pairs."""
+        index = GeneIndex([("chr1", 1, 100000, "long")] + [("chr1", p, p + 10, f"g{p}") for p in range(0, 5000, 7)])
+        positions = list(range(3, 6000, 3))
+        expected = index.overlap_pairs("chr1", positions)
+        with mock.patch("analysis.gene_index.OVERLAP_CANDIDATES_PER_SLICE", 50):
+            sliced = index.overlap_pairs("chr1", positions)
+        for a, b in zip(expected, sliced):
+            self.assertEqual(a.tolist(), b.tolist())
+        self.assertEqual(int((expected[1] == "long").sum()), len(positions))
@@ -0,0 +1,48 @@
+from django.test import TestCase
+from unittest import mock
+from analysis.gff_parser import GFFParser, load_gene_index
+import tempfile
+import os
+
+
+class GeneModelCacheTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.gff_path = os.path.join(self.tmpdir.name, "test.gff")
+        with open(self.gff_path, "w") as f:
+            f.write(
+                "##gff-version 3\n"
+                "chr1\tsrc\tgene\t100\t200\t.\t+\t.\tID=gene1;Name=dnaA\n"
+                "chr1\tsrc\tCDS\t100\t200\t.\t+\t0\tID=cds1;Parent=gene1;Name=NP_1\n"
+                "chr1\tsrc\tCDS\t300\t400\t.\t+\t0\tID=cds2;Name=orf%2C2\n"
+                "chr1\tsrc\tregion\t1\t5000\t.\t+\t.\tID=chr1\n"
+            )
+        self.cache_dir = os.path.join(self.tmpdir.name, "cache")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_gene_model_intervals(self):
+        """Test if only top-level gene/CDS features are indexed, 1-based and inclusive."""
+        index = load_gene_index(self.gff_path)
+        self.assertEqual(index.overlapping("chr1", 100), ["dnaA"])
+        self.assertEqual(index.overlapping("chr1", 99), [])
+        self.assertEqual(index.overlapping("chr1", 400), ["orf,2"])
+        self.assertEqual(len(index), 2)
+
+    def test_second_load_skips_parsing(self):
+        first = load_gene_index(self.gff_path, cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        with mock.patch.object(GFFParser, "parse") as parse:
+            second = load_gene_index(self.gff_path, cache_dir=self.cache_dir)
+            parse.assert_not_called()
+        self.assertEqual(second.overlapping("chr1", 150), first.overlapping("chr1", 150))
+
+    def test_changed_content_invalidates_cache(self):
+        load_gene_index(self.gff_path, cache_dir=self.cache_dir)
+        with open(self.gff_path, "a") as f:
+            f.write("chr2\tsrc\tgene\t1\t50\t.\t+\t.\tID=gene3\n")
+        index = load_gene_index(self.gff_path, cache_dir=self.cache_dir)
+        self.assertEqual(index.overlapping("chr2", 10), ["gene3"])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
@@ -19,7 +19,7 @@ class IGVIntegrationTest(TestCase):
         self.assertEqual(response.status_code, 200)
         
         # Check if the VCF URL is present in the rendered HTML (since we'll put it in JS)
-        vcf_url = self.analysis.vcf_file.url
+        vcf_url = reverse('analysis_file', args=[self.analysis.pk, f"vcf/{os.path.basename(self.analysis.vcf_file.name)}"])
         self.assertContains(response, vcf_url)
         
         # Also check for IGV container div
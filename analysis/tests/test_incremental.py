@@ -0,0 +1,87 @@
+from django.test import TestCase, override_settings
+from unittest import mock
+from analysis.models import Analysis
+from analysis.pipeline_state import PipelineState
+from analysis.services import run_analysis
+from analysis.vcf_analyzer import VCFAnalyzer
+import numpy as np
+import tempfile
+import json
+import os
+
+
+class IncrementalRerunTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name, GFF_CACHE_DIR=None)
+        self.override.enable()
+        os.makedirs(os.path.join(self.tmpdir.name, "uploads/vcf"))
+        os.makedirs(os.path.join(self.tmpdir.name, "uploads/gff"))
+        with open(os.path.join(self.tmpdir.name, "uploads/vcf/test.vcf"), "w") as f:
+            f.write("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+            for pos in range(100, 5000, 70):
+                f.write(f"chr1\t{pos}\t.\tA\tG\t{pos % 60}\t.\t.\n")
+            f.write("chr2\t300\t.\tC\tT,G\t40\t.\t.\n")
+        self.write_gff("a.gff", "dnaA")
+        self.write_gff("b.gff", "rpoB")
+        self.analysis = Analysis.objects.create(vcf_file="uploads/vcf/test.vcf", gff_file="uploads/gff/a.gff",
+                                                window_size=1000)
+        self.results_dir = os.path.join(self.tmpdir.name, f"results/{self.analysis.id}")
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def write_gff(self, name, gene):
+        with open(os.path.join(self.tmpdir.name, "uploads/gff", name), "w") as f:
+            f.write(f"chr1\tsrc\tgene\t100\t1000\t.\t+\t.\tID=gene1;Name={gene}\n")
+
+    def rerun(self, **changes):
+        Analysis.objects.filter(pk=self.analysis.pk).update(**changes)
+        with mock.patch.object(VCFAnalyzer, "process_and_export", autospec=True,
+                               side_effect=VCFAnalyzer.process_and_export) as parse:
+            run_analysis(self.analysis.id)
+        analysis = Analysis.objects.with_results().get(pk=self.analysis.pk)
+        self.assertEqual(analysis.status, "COMPLETED", analysis.error_message)
+        return analysis, parse.called
+
+    def test_window_change_skips_parsing(self):
+        """Test if a new window size reuses the parsed state and matches a fresh run."""
+        first, parsed = self.rerun()
+        self.assertTrue(parsed)
+        self.assertEqual(set(PipelineState(self.results_dir).stages), {"parse", "annotate", "density"})
+        with np.load(os.path.join(self.results_dir, "state.npz")) as data:
+            self.assertNotIn("counts", json.loads(str(data["stats"]))["quality"])
+            self.assertEqual(int(data["qual_counts"].sum()), first.metrics["total_variants"])
+
+        incremental, parsed = self.rerun(window_size=500)
+        self.assertFalse(parsed)
+        self.assertNotEqual(incremental.plot_data["density"], first.plot_data["density"])
+
+        os.remove(os.path.join(self.results_dir, "state.json"))
+        fresh, parsed = self.rerun()
+        self.assertTrue(parsed)
+        self.assertEqual(incremental.plot_data["density"], fresh.plot_data["density"])
+        self.assertEqual(incremental.metrics, fresh.metrics)
+        self.assertEqual(incremental.plot_data["quality"], fresh.plot_data["quality"])
+
+    def test_gff_change_only_reannotates(self):
+        self.rerun()
+        analysis, parsed = self.rerun(gff_file="uploads/gff/b.gff")
+        self.assertFalse(parsed)
+        self.assertEqual(set(analysis.annotations.values_list("genes", flat=True)), {"rpoB", "Nenhum"})
+        self.assertEqual(analysis.metrics["top_genes"][0][0], "rpoB")
+
+        # Nada mudou: anotações e densidade reaproveitadas
+        again, parsed = self.rerun()
+        self.assertFalse(parsed)
+        self.assertEqual(again.metrics, analysis.metrics)
+        self.assertEqual(again.annotations.count(), analysis.annotations.count())
+
+    def test_changed_vcf_is_parsed_again(self):
+        self.rerun()
+        with open(os.path.join(self.tmpdir.name, "uploads/vcf/test.vcf"), "a") as f:
+            f.write("chr2\t900\t.\tG\tA\t50\t.\t.\n")
+        analysis, parsed = self.rerun()
+        self.assertTrue(parsed)
+        self.assertEqual(analysis.total_variants, 72)
@@ -0,0 +1,130 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from unittest import mock
+from datetime import timedelta
+from analysis.models import Analysis, AnalysisJob
+from analysis import jobs
+from analysis.processes import start_method, run_with_django
+from concurrent.futures import ProcessPoolExecutor
+from django.db import IntegrityError, transaction
+from django.db.models import QuerySet
+import multiprocessing
+
+
+@override_settings(ANALYSIS_JOB_HEARTBEAT_SECONDS=3600)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        self.analysis = Analysis.objects.create(vcf_file="uploads/vcf/test.vcf")
+
+    def test_enqueue_reuses_open_job(self):
+        first = jobs.enqueue_analysis(self.analysis.id)
+        second = jobs.enqueue_analysis(self.analysis.id)
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+
+    def test_enqueue_race_keeps_one_open_job(self):
+        """Test if a submit that loses the race to another one reuses its job instead of queueing a duplicate."""
+        existing = AnalysisJob.objects.create(analysis=self.analysis)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AnalysisJob.objects.create(analysis=self.analysis)
+        # A consulta não viu a tarefa (criada por outra requisição logo depois)
+        with mock.patch.object(QuerySet, "first", side_effect=[None, existing]):
+            job = jobs.enqueue_analysis(self.analysis.id)
+        self.assertEqual(job.id, existing.id)
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+
+    def test_claim_locks_job(self):
+        """Test if a claimed job is locked to one worker and not handed out again."""
+        jobs.enqueue_analysis(self.analysis.id)
+        job = jobs.claim_next_job("host:1:0")
+        self.assertEqual(job.status, "RUNNING")
+        self.assertEqual(job.locked_by, "host:1:0")
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNone(jobs.claim_next_job("host:1:1"))
+
+    def test_crashed_worker_job_is_retried_then_failed(self):
+        jobs.enqueue_analysis(self.analysis.id)
+        for attempt in range(1, 4):
+            job = jobs.claim_next_job("host:1:0")
+            self.assertEqual(job.attempts, attempt)
+            jobs.release_worker_jobs("host:1:0", "crash")
+
+        job = AnalysisJob.objects.get()
+        self.assertEqual(job.status, "FAILED")
+        self.analysis.refresh_from_db()
+        self.assertEqual(self.analysis.status, "FAILED")
+        self.assertIsNone(jobs.claim_next_job("host:1:0"))
+
+    def test_stale_jobs_are_requeued(self):
+        jobs.enqueue_analysis(self.analysis.id)
+        job = jobs.claim_next_job("other-host:9:0")
+        AnalysisJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(minutes=10))
+
+        self.assertEqual(jobs.recover_stale_jobs(stale_seconds=60), 1)
+        self.assertEqual(AnalysisJob.objects.get().status, "QUEUED")
+
+    def test_orphan_processing_analysis_is_enqueued(self):
+        """Test if an analysis left in PROCESSING without a job is queued at startup."""
+        Analysis.objects.filter(id=self.analysis.id).update(status="PROCESSING")
+        self.assertEqual(jobs.recover_orphan_analyses(), 1)
+        self.assertEqual(AnalysisJob.objects.get().analysis_id, self.analysis.id)
+        self.analysis.refresh_from_db()
+        self.assertEqual(self.analysis.status, "PENDING")
+
+    def test_worker_loop_runs_queue(self):
+        other = Analysis.objects.create(vcf_file="uploads/vcf/other.vcf")
+        jobs.enqueue_analysis(self.analysis.id)
+        jobs.enqueue_analysis(other.id)
+
+        def fake_run(analysis_id):
+            status = "COMPLETED" if analysis_id == self.analysis.id else "FAILED"
+            Analysis.objects.filter(id=analysis_id).update(status=status, error_message="bad VCF")
+
+        with mock.patch("analysis.services.run_analysis", side_effect=fake_run):
+            self.assertEqual(jobs.worker_loop("host:1:0", burst=True), 2)
+
+        self.assertEqual(AnalysisJob.objects.get(analysis=self.analysis).status, "DONE")
+        failed = AnalysisJob.objects.get(analysis=other)
+        self.assertEqual((failed.status, failed.attempts, failed.last_error), ("FAILED", 1, "bad VCF"))
+
+    def test_rerun_blocked_while_job_open(self):
+        """Test if a rerun is refused (and nothing changes) while the analysis has an open job."""
+        jobs.enqueue_analysis(self.analysis.id)
+        jobs.claim_next_job("host:1:0")
+        response = self.client.post(reverse('analysis_rerun', args=[self.analysis.pk]), {"window_size": 500})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].non_field_errors())
+        self.analysis.refresh_from_db()
+        self.assertNotEqual(self.analysis.window_size, 500)
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+
+        # Tarefa criada por um envio simultâneo, depois da consulta deste
+        job = AnalysisJob.objects.get()
+        with mock.patch.object(QuerySet, "first", side_effect=[None, job]):
+            response = self.client.post(reverse('analysis_rerun', args=[self.analysis.pk]), {"window_size": 500})
+        self.assertTrue(response.context["form"].non_field_errors())
+        self.analysis.refresh_from_db()
+        self.assertNotEqual(self.analysis.window_size, 500)
+
+        jobs.finish_job(job, "host:1:0", "DONE")
+        response = self.client.post(reverse('analysis_rerun', args=[self.analysis.pk]), {"window_size": 500})
+        self.assertRedirects(response, reverse('analysis_detail', args=[self.analysis.pk]),
+                             fetch_redirect_response=False)
+        self.analysis.refresh_from_db()
+        self.assertEqual(self.analysis.window_size, 500)
+        self.assertEqual(AnalysisJob.objects.filter(status="QUEUED").count(), 1)
+
+
+class StartMethodTest(TestCase):
+    def test_falls_back_to_spawn(self):
+        with mock.patch("multiprocessing.get_all_start_methods", return_value=["spawn"]):
+            self.assertEqual(start_method("fork"), "spawn")
+            self.assertEqual(start_method("forkserver"), "spawn")
+        self.assertIn(start_method("fork"), multiprocessing.get_all_start_methods())
+
+    def test_spawned_child_sets_up_django(self):
+        """Test if a spawn child (the only start method on Windows) can import modules that use the ORM."""
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            future = pool.submit(run_with_django, "analysis.jobs.job_setting", "ROOT_URLCONF", None)
+            self.assertEqual(future.result(timeout=60), "microgen_explorer.urls")
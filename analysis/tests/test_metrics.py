@@ -0,0 +1,105 @@
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from analysis.models import Analysis, AnalysisJob
+from analysis.metrics import Histogram, MetricsRegistry, record_analysis_run, record_uploads
+from analysis import jobs
+
+
+def parse_samples(text):
+    """{'nome{rótulos}': valor} das linhas de amostra do formato de texto."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+class HistogramTest(TestCase):
+    def test_cumulative_buckets(self):
+        histogram = Histogram((1, 5))
+        for value in (0.5, 2, 2, 10):
+            histogram.observe(value, stage="parse")
+        registry = MetricsRegistry()
+        registry.add("stage_seconds", "histogram", "Duração.", histogram)
+        text = registry.render()
+        self.assertIn("# TYPE microgen_stage_seconds histogram", text)
+        samples = parse_samples(text)
+        self.assertEqual(samples['microgen_stage_seconds_bucket{stage="parse",le="1"}'], 1)
+        self.assertEqual(samples['microgen_stage_seconds_bucket{stage="parse",le="5"}'], 3)
+        self.assertEqual(samples['microgen_stage_seconds_bucket{stage="parse",le="+Inf"}'], 4)
+        self.assertEqual(samples['microgen_stage_seconds_sum{stage="parse"}'], 14.5)
+        self.assertEqual(samples['microgen_stage_seconds_count{stage="parse"}'], 4)
+
+
+class MetricsViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        timings = [
+            {"stage": "parse", "rows": 100000, "reused": False, "wall_s": 0.5, "cpu_s": 0.5, "peak_rss_mb": 80.0},
+            {"stage": "density", "rows": 300, "wall_s": 0.02, "cpu_s": 0.02, "peak_rss_mb": 80.0},
+        ]
+        done = Analysis.objects.create(vcf_file="uploads/vcf/a.vcf", status="COMPLETED")
+        record_uploads({"vcf_file": {"size": 1000, "sha256": "x", "compression": "plain"},
+                        "gff_file": {"size": 250, "sha256": "y", "compression": "plain"}})
+        record_analysis_run("COMPLETED", timings)
+        # Reanálise com a leitura reaproveitada: não entra na vazão
+        failed = Analysis.objects.create(vcf_file="uploads/vcf/b.vcf", status="FAILED")
+        record_uploads({"vcf_file": {"size": 500, "sha256": "z", "compression": "gzip"}})
+        record_analysis_run("FAILED", [dict(timings[0], reused=True, wall_s=0.001)])
+        queued = Analysis.objects.create(vcf_file="uploads/vcf/c.vcf")
+
+        for analysis, status in ((done, "DONE"), (failed, "FAILED")):
+            jobs.enqueue_analysis(analysis.id)
+            jobs.finish_job(jobs.claim_next_job("host:1:0"), "host:1:0", status)
+        jobs.enqueue_analysis(queued.id)
+        AnalysisJob.objects.filter(analysis=queued).update(created_at=timezone.now() - timedelta(seconds=30))
+
+    def test_metrics_exposition(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = response.content.decode()
+        self.assertIn("# TYPE microgen_analysis_jobs_started_total counter", text)
+        samples = parse_samples(text)
+
+        self.assertEqual(samples["microgen_analysis_jobs_started_total"], 2)
+        self.assertEqual(samples["microgen_analysis_jobs_completed_total"], 1)
+        self.assertEqual(samples["microgen_analysis_jobs_failed_total"], 1)
+        self.assertEqual(samples["microgen_analysis_queue_length"], 1)
+        self.assertEqual(samples['microgen_analysis_jobs{status="RUNNING"}'], 0)
+        self.assertGreaterEqual(samples["microgen_analysis_queue_oldest_age_seconds"], 30)
+        self.assertEqual(samples['microgen_analyses{status="COMPLETED"}'], 1)
+        self.assertEqual(samples['microgen_analysis_job_latency_seconds_count{status="DONE"}'], 1)
+        self.assertEqual(samples['microgen_analysis_job_latency_seconds_bucket{status="DONE",le="0.05"}'], 1)
+
+        self.assertEqual(samples['microgen_analysis_stage_duration_seconds_count{stage="parse"}'], 2)
+        self.assertEqual(samples['microgen_analysis_stage_duration_seconds_bucket{stage="density",le="0.05"}'], 1)
+        self.assertEqual(samples['microgen_analysis_stage_duration_seconds_bucket{stage="parse",le="0.25"}'], 1)
+        self.assertEqual(samples['microgen_analysis_stage_duration_seconds_bucket{stage="parse",le="+Inf"}'], 2)
+        self.assertEqual(samples['microgen_analysis_duration_seconds_sum'], 0.52)
+        self.assertEqual(samples['microgen_analysis_parse_variants_per_second_count'], 1)
+        self.assertEqual(samples['microgen_analysis_parse_variants_per_second_sum'], 200000)
+
+        self.assertEqual(samples['microgen_bytes_ingested_total{field="vcf_file"}'], 1500)
+        self.assertEqual(samples['microgen_bytes_ingested_total{field="gff_file"}'], 250)
+        self.assertEqual(samples['microgen_bytes_ingested_total{field="reference_file"}'], 0)
+
+    def test_counters_survive_deletion(self):
+        """Test if deleting analyses does not make counters go down."""
+        Analysis.objects.all().delete()
+        samples = parse_samples(self.client.get(reverse('metrics')).content.decode())
+        self.assertEqual(samples["microgen_analysis_jobs_completed_total"], 1)
+        self.assertEqual(samples['microgen_bytes_ingested_total{field="vcf_file"}'], 1500)
+        self.assertEqual(samples["microgen_analysis_queue_length"], 0)
+
+    def test_scrape_reads_only_aggregates(self):
+        """Test if the scrape cost does not grow with the analysis history."""
+        with self.assertNumQueries(11):
+            self.client.get(reverse('metrics'))
+        for i in range(20):
+            Analysis.objects.create(vcf_file=f"uploads/vcf/{i}.vcf", status="COMPLETED", stage_timings=[])
+        with self.assertNumQueries(11):
+            self.client.get(reverse('metrics'))
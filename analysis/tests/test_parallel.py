@@ -0,0 +1,57 @@
+from django.test import TestCase
+from analysis.vcf_analyzer import VCFAnalyzer
+from analysis.vcf_reader import shard_byte_ranges, iter_range_lines, iter_native, iter_records
+from analysis.gene_index import GeneIndex
+import numpy as np
+import tempfile
+import filecmp
+import os
+
+
+class ParallelAnalyzerTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(11)
+        lines = ["##fileformat=VCFv4.2", "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO"]
+        for chrom in ("chr1", "chr2", "chr3"):
+            pos = 0
+            for _ in range(300):
+                pos += int(rng.integers(1, 80))
+                ref, alt = rng.choice(list("ACGT"), 2, replace=False)
+                if rng.random() < 0.1:
+                    alt += ",T" if ref != "T" else ",A"
+                qual = str(int(rng.integers(0, 60))) if rng.random() < 0.5 else f"{rng.random() * 60:.2f}"
+                info = "ANN=A|stop_gained|x" if rng.random() < 0.3 else "."
+                lines.append(f"{chrom}\t{pos}\t.\t{ref}\t{alt}\t{qual}\tPASS\t{info}")
+        self.vcf_path = os.path.join(self.tmpdir.name, "test.vcf")
+        with open(self.vcf_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+        self.gene_index = GeneIndex()
+        for chrom in ("chr1", "chr2"):
+            for start in range(1, 12000, 700):
+                self.gene_index.add(chrom, start, start + 900, f"{chrom}_g{start}")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_shards_cover_every_record_once(self):
+        ranges = shard_byte_ranges(self.vcf_path, 7)
+        self.assertEqual(len(ranges), 7)
+        sharded = [r for start, end in ranges for r in iter_native(iter_range_lines(self.vcf_path, start, end))]
+        self.assertEqual(sharded, list(iter_records(self.vcf_path)))
+
+    def test_parallel_matches_serial(self):
+        """Test if merged shard aggregates equal a serial run, including gene tallies."""
+        serial = VCFAnalyzer(self.vcf_path, streaming=True, chunk_size=100)
+        serial.process_and_export(os.path.join(self.tmpdir.name, "serial.csv"),
+                                  gene_index=self.gene_index, weight_by_alleles=True)
+        parallel = VCFAnalyzer(self.vcf_path, chunk_size=50, workers=3)
+        self.assertIsNone(parallel.process_and_export(os.path.join(self.tmpdir.name, "parallel.csv"),
+                                                      gene_index=self.gene_index, weight_by_alleles=True))
+
+        self.assertEqual(parallel.get_summary(), serial.get_summary())
+        self.assertTrue(serial.metrics["top_genes"])
+        self.assertEqual(parallel.get_density_data(500), serial.get_density_data(500))
+        self.assertTrue(filecmp.cmp(os.path.join(self.tmpdir.name, "serial.csv"),
+                                    os.path.join(self.tmpdir.name, "parallel.csv"), shallow=False))
@@ -0,0 +1,110 @@
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from unittest import mock
+from analysis.models import Analysis
+from analysis.vcf_analyzer import VCFAnalyzer
+from analysis.plots import PlotRenderer, coarsen_steps, draw_plot, save_plot_specs, load_plot_specs, KEY_SUFFIX
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import tempfile
+import time
+import os
+
+
+class PlotRendererTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.vcf_path = os.path.join(self.tmpdir.name, "plots.vcf")
+        with open(self.vcf_path, "w") as f:
+            f.write("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+            for pos in range(1, 300001, 97):
+                f.write(f"chr1\t{pos}\t.\tA\tG\t{pos % 90}\t.\t.\n")
+            f.write("chr2\t500\t.\tC\tT\t40\t.\t.\n")
+        self.plots_dir = os.path.join(self.tmpdir.name, "plots")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def analyzer(self, window_size=1000):
+        analyzer = VCFAnalyzer(self.vcf_path, window_size=window_size)
+        analyzer.process_and_export(os.path.join(self.tmpdir.name, "variants.csv"))
+        return analyzer
+
+    def test_coarsen_steps_keeps_totals(self):
+        starts = np.arange(5000) * 1000
+        counts = np.arange(5000) % 7
+        edges, values = coarsen_steps(starts, counts, 1000, max_steps=2000)
+        self.assertEqual(values.size, 1667)
+        self.assertEqual(edges.size, values.size + 1)
+        self.assertEqual(edges[1] - edges[0], 3000)
+        self.assertAlmostEqual(float((values * 3).sum()), float(counts.sum()))
+
+    def test_renders_all_plots(self):
+        paths = self.analyzer().generate_qc_plots(self.plots_dir)
+        self.assertEqual(set(paths), {"qual_plot", "density_plot", "mutation_density_plot"})
+        for path in paths.values():
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(8), b"\x89PNG\r\n\x1a\n")
+            self.assertTrue(os.path.exists(path + KEY_SUFFIX))
+
+    def test_unchanged_plots_are_not_redrawn(self):
+        """Test if only plots whose inputs changed are rendered again."""
+        self.analyzer().generate_qc_plots(self.plots_dir)
+        with mock.patch("analysis.plots.draw_plot", side_effect=draw_plot) as draw:
+            self.analyzer().generate_qc_plots(self.plots_dir)
+            self.assertEqual(draw.call_count, 0)
+            self.analyzer(window_size=5000).generate_qc_plots(self.plots_dir)
+            self.assertEqual([c.args[0] for c in draw.call_args_list], ["density_plot"])
+
+    def test_parallel_matches_serial(self):
+        specs = self.analyzer().plot_specs()
+        serial = PlotRenderer(os.path.join(self.tmpdir.name, "serial")).render(specs)
+        parallel = PlotRenderer(os.path.join(self.tmpdir.name, "parallel"), workers=3).render(specs)
+        for name in specs:
+            with open(serial[name], "rb") as a, open(parallel[name], "rb") as b:
+                self.assertEqual(a.read(), b.read(), name)
+
+    def test_concurrent_requests_render_once(self):
+        """Test if simultaneous requests for the same plot collapse into a single render."""
+        save_plot_specs(self.plots_dir, self.analyzer().plot_specs())
+        spec = load_plot_specs(self.plots_dir)["qual_plot"]
+
+        def slow_draw(*args):
+            time.sleep(0.2)
+            return draw_plot(*args)
+
+        with mock.patch("analysis.plots.draw_plot", side_effect=slow_draw) as draw:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                paths = list(pool.map(lambda _: PlotRenderer(self.plots_dir).render_one("qual_plot", spec), range(4)))
+        self.assertEqual(draw.call_count, 1)
+        self.assertEqual(len(set(paths)), 1)
+
+
+class LazyPlotViewTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        self.override.enable()
+        self.analysis = Analysis.objects.create(vcf_file="uploads/vcf/test.vcf", status="COMPLETED")
+        self.plots_dir = os.path.join(self.tmpdir.name, f"results/{self.analysis.id}/plots")
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def test_plot_rendered_on_first_request(self):
+        url = reverse('analysis_plot', args=[self.analysis.pk, "qc_quality_distribution.png"])
+        self.assertEqual(Client().get(url).status_code, 404)
+
+        save_plot_specs(self.plots_dir, {"qual_plot": {"edges": [0, 10, 20], "counts": [3, 1], "median": 8.0}})
+        path = os.path.join(self.plots_dir, "qc_quality_distribution.png")
+        self.assertFalse(os.path.exists(path))
+        response = Client().get(url)
+        self.assertEqual((response.status_code, response["Content-Type"]), (200, "image/png"))
+        self.assertTrue(os.path.exists(path))
+
+        with mock.patch("analysis.plots.draw_plot") as draw:
+            self.assertEqual(Client().get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+            draw.assert_not_called()
+        self.assertEqual(Client().get(reverse('analysis_plot', args=[self.analysis.pk, "other.png"])).status_code,
+                         404)
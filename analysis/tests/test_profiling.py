@@ -0,0 +1,89 @@
+from django.test import TestCase, override_settings
+from analysis.models import Analysis
+from analysis.profiling import StageTimer, peak_rss_bytes
+from unittest import mock
+from analysis.services import run_analysis
+import pstats
+import tempfile
+import os
+
+
+class StageTimerTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_records_each_stage(self):
+        timer = StageTimer()
+        with timer.stage("parse") as stage:
+            sum(range(200000))
+            stage["rows"] = 42
+        with self.assertRaises(ValueError):
+            with timer.stage("fails"):
+                raise ValueError("erro")
+        parse, fails = timer.as_list()
+        self.assertEqual((parse["stage"], parse["rows"], fails["stage"]), ("parse", 42, "fails"))
+        for key in ("wall_s", "cpu_s", "peak_rss_mb"):
+            self.assertGreaterEqual(parse[key], 0)
+        self.assertGreater(parse["peak_rss_mb"], 0)
+        self.assertNotIn("py_peak_mb", parse)
+        self.assertEqual(timer.total_wall(), round(parse["wall_s"] + fails["wall_s"], 4))
+
+    def test_without_resource_module(self):
+        """Test if platforms without ``resource`` (Windows) record RSS and CPU as None."""
+        with mock.patch("analysis.profiling.resource", None):
+            self.assertIsNone(peak_rss_bytes())
+            timer = StageTimer()
+            with timer.stage("parse"):
+                pass
+        record = timer.records[0]
+        self.assertEqual((record["cpu_s"], record["peak_rss_mb"]), (None, None))
+        self.assertGreaterEqual(record["wall_s"], 0)
+
+    def test_profile_dumps(self):
+        profile_dir = os.path.join(self.tmpdir.name, "profile")
+        timer = StageTimer(profile_dir, cprofile=True, tracemalloc=True)
+        with timer.stage("density"):
+            data = [bytes(1000) for _ in range(1000)]
+        self.assertGreater(timer.records[0]["py_peak_mb"], 0.5)
+        stats = pstats.Stats(os.path.join(profile_dir, "density.prof"))
+        self.assertTrue(stats.total_calls >= 0)
+        with open(os.path.join(profile_dir, "density.tracemalloc.txt")) as f:
+            self.assertIn("test_profiling.py", f.read())
+        del data
+
+
+class RunAnalysisTimingsTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name, GFF_CACHE_DIR=None)
+        self.override.enable()
+        os.makedirs(os.path.join(self.tmpdir.name, "uploads/vcf"))
+        with open(os.path.join(self.tmpdir.name, "uploads/vcf/test.vcf"), "w") as f:
+            f.write("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+            for pos in range(100, 5000, 70):
+                f.write(f"chr1\t{pos}\t.\tA\tG\t{pos % 60}\t.\t.\n")
+        self.analysis = Analysis.objects.create(vcf_file="uploads/vcf/test.vcf")
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def test_stage_timings_stored(self):
+        run_analysis(self.analysis.id)
+        analysis = Analysis.objects.get(pk=self.analysis.pk)
+        self.assertEqual(analysis.status, "COMPLETED", analysis.error_message)
+        stages = {s["stage"]: s for s in analysis.stage_timings}
+        self.assertEqual(list(stages), ["reference_index", "vcf_index", "gff", "parse", "density",
+                                        "annotations", "save", "report"])
+        self.assertEqual(stages["parse"]["rows"], 70)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, f"results/{self.analysis.id}/profile")))
+
+    def test_failed_run_keeps_partial_timings(self):
+        os.remove(os.path.join(self.tmpdir.name, "uploads/vcf/test.vcf"))
+        run_analysis(self.analysis.id)
+        analysis = Analysis.objects.get(pk=self.analysis.pk)
+        self.assertEqual(analysis.status, "FAILED")
+        self.assertEqual(analysis.stage_timings[-1]["stage"], "vcf_index")
@@ -21,7 +21,8 @@ class ReferenceGenomeTest(TestCase):
         self.assertEqual(response.status_code, 200)
         
         # Check if the reference URL is in the response
-        ref_url = self.analysis.reference_file.url
+        ref_url = reverse('analysis_file', args=[self.analysis.pk,
+                                                 f"reference/{os.path.basename(self.analysis.reference_file.name)}"])
         self.assertContains(response, ref_url)
         
         # Check if 'genome: "hg19"' is NOT present (or handled logic)
@@ -0,0 +1,81 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from analysis.models import Analysis
+from analysis.reference_store import content_hash, ensure_fasta_index, reference_count
+from analysis.services import run_analysis
+import hashlib
+import tempfile
+import io
+import os
+
+FASTA = b">chr1\nACGTACGTAC\nGTACGT\n"
+GFF = b"chr1\tsrc\tgene\t1\t10\t.\t+\t.\tID=gene1;Name=dnaA\n"
+
+
+class ReferenceStoreTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmpdir.name, "cache/gff")
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name, GFF_CACHE_DIR=self.cache_dir,
+                                          REFERENCE_STORE_GRACE_SECONDS=0)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def create(self, fasta_name="ref.fa", gff_name="genes.gff"):
+        return Analysis.objects.create(
+            vcf_file=SimpleUploadedFile("test.vcf", b"##fileformat=VCFv4.2\n"
+                                        b"#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+                                        b"chr1\t5\t.\tA\tG\t30\t.\t.\n"),
+            reference_file=SimpleUploadedFile(fasta_name, FASTA),
+            gff_file=SimpleUploadedFile(gff_name, GFF),
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        """Test if identical references resolve to one stored file, index and GFF cache."""
+        first, second = self.create(), self.create(fasta_name="other_name.FA")
+        sha = hashlib.sha256(FASTA).hexdigest()
+        self.assertEqual(first.reference_file.name, f"uploads/fasta/{sha}.fa")
+        self.assertEqual(second.reference_file.name, first.reference_file.name)
+        self.assertEqual(second.gff_file.name, first.gff_file.name)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmpdir.name, "uploads/fasta"))), [f"{sha}.fa"])
+        self.assertEqual(reference_count(first.reference_file.name), 2)
+
+        run_analysis(first.id)
+        run_analysis(second.id)
+        self.assertTrue(os.path.exists(first.reference_file.path + ".fai"))
+        self.assertFalse(ensure_fasta_index(first.reference_file.path))
+        self.assertEqual(os.listdir(self.cache_dir), [f"{content_hash(first.gff_file.name)}.v1.npz"])
+
+    def test_last_delete_removes_shared_files(self):
+        first, second = self.create(), self.create()
+        ensure_fasta_index(first.reference_file.path)
+        fasta_path = first.reference_file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(fasta_path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(fasta_path))
+        self.assertFalse(os.path.exists(fasta_path + ".fai"))
+        self.assertEqual(os.listdir(os.path.join(self.tmpdir.name, "uploads/gff")), [])
+
+    def test_gc_command_dedupes_legacy_uploads(self):
+        os.makedirs(os.path.join(self.tmpdir.name, "uploads/gff"))
+        for name in ("a.gff", "b.gff"):
+            with open(os.path.join(self.tmpdir.name, "uploads/gff", name), "wb") as f:
+                f.write(GFF)
+        a = Analysis.objects.create(vcf_file="uploads/vcf/a.vcf", gff_file="uploads/gff/a.gff")
+        b = Analysis.objects.create(vcf_file="uploads/vcf/b.vcf", gff_file="uploads/gff/b.gff")
+
+        call_command("gc_references", "--dedupe", stdout=io.StringIO())
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual(a.gff_file.name, f"uploads/gff/{hashlib.sha256(GFF).hexdigest()}.gff")
+        self.assertEqual(b.gff_file.name, a.gff_file.name)
+        self.assertEqual(os.listdir(os.path.join(self.tmpdir.name, "uploads/gff")), [os.path.basename(a.gff_file.name)])
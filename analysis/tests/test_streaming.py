@@ -0,0 +1,150 @@
+from django.test import TestCase
+from analysis.vcf_analyzer import VCFAnalyzer
+from analysis.aggregates import DensityCounter, DensityPyramid, ExactSum, QualHistogram, QUAL_SUMMARY_BINS
+from unittest import mock
+import numpy as np
+import tempfile
+import math
+import os
+
+
+class StreamingAnalyzerTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(7)
+        lines = ["##fileformat=VCFv4.2", "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO"]
+        for chrom in ("chr1", "chr2"):
+            pos = 0
+            for _ in range(400):
+                pos += int(rng.integers(1, 60))
+                ref, alt = rng.choice(list("ACGT"), 2, replace=False)
+                qual = "." if rng.random() < 0.1 else f"{rng.random() * 60:.2f}"
+                info = "ANN=A|missense_variant|x" if rng.random() < 0.3 else "."
+                lines.append(f"{chrom}\t{pos}\t.\t{ref}\t{alt}\t{qual}\tPASS\t{info}")
+        self.vcf_path = os.path.join(self.tmpdir.name, "test.vcf")
+        with open(self.vcf_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hotspot_count_is_not_capped(self):
+        """Test if the stored hotspot list is capped but hotspot_count keeps the real total."""
+        analyzer = VCFAnalyzer(self.vcf_path)
+        analyzer.process_and_export(os.path.join(self.tmpdir.name, "a.csv"))
+        df = analyzer.calculate_density(window_size=1000)
+        total = int((df["DENSITY_NORM"] > 5).sum())
+        with mock.patch("analysis.vcf_analyzer.MAX_HOTSPOTS", 3):
+            analyzer.calculate_density(window_size=1000)
+        self.assertGreater(total, 3)
+        self.assertEqual(len(analyzer.metrics["hotspots"]), 3)
+        self.assertEqual(analyzer.metrics["hotspot_count"], total)
+
+    def test_streaming_matches_in_memory(self):
+        """Test if chunked processing yields the same metrics, CSV and density."""
+        in_memory = VCFAnalyzer(self.vcf_path)
+        in_memory.process_and_export(os.path.join(self.tmpdir.name, "a.csv"))
+        streamed = VCFAnalyzer(self.vcf_path, streaming=True, chunk_size=64)
+        self.assertIsNone(streamed.process_and_export(os.path.join(self.tmpdir.name, "b.csv")))
+
+        for key in ("total_variants", "snp_count", "low_quality_count", "transitions",
+                    "transversions", "mean_quality", "chrom_distribution", "impact_counts",
+                    "quality_quantiles"):
+            self.assertEqual(in_memory.metrics[key], streamed.metrics[key], key)
+
+        with open(os.path.join(self.tmpdir.name, "a.csv")) as a, open(os.path.join(self.tmpdir.name, "b.csv")) as b:
+            self.assertEqual(a.read(), b.read())
+
+        for window in (100, 1000, 3000):
+            self.assertTrue(in_memory.calculate_density(window).equals(streamed.calculate_density(window)))
+
+
+class AggregatesTest(TestCase):
+    def test_density_windows_match_histogram(self):
+        positions = np.array([0, 5, 999, 1000, 1001, 2500, 3000])
+        counter = DensityCounter(base_window=100)
+        counter.add("chr1", positions[:3])
+        counter.add("chr1", positions[3:])
+        starts, counts = counter.windows("chr1", 1000)
+        expected, edges = np.histogram(positions, bins=range(0, positions.max() + 1000, 1000))
+        self.assertEqual(counts.tolist(), expected.tolist())
+        self.assertEqual(starts.tolist(), edges[:-1].tolist())
+
+    def test_density_pyramid_matches_histogram(self):
+        """Test if any window (and any region) summed from the pyramid equals np.histogram."""
+        positions = np.random.default_rng(3).integers(1, 123457, 5000)
+        positions[-1] = 123400  # máximo sobre a borda de uma janela
+        counter = DensityCounter(base_window=100)
+        counter.add("chr1", positions)
+        pyramid = DensityPyramid.from_counter(counter)
+        for window in (100, 300, 1000, 1600, 12800, 200000):
+            expected, edges = np.histogram(positions, bins=range(0, positions.max() + window, window))
+            starts, counts = pyramid.windows("chr1", window)
+            self.assertEqual(counts.tolist(), expected.tolist(), window)
+            self.assertEqual(starts.tolist(), edges[:-1].tolist(), window)
+
+            starts, counts = pyramid.windows("chr1", window, start=40000, end=90000)
+            inside = (edges[:-1] >= 40000 // window * window) & (edges[:-1] < 90000)
+            self.assertEqual(counts.tolist(), expected[inside].tolist(), window)
+
+        self.assertEqual(pyramid.auto_window(0, 123457, 100), 1600)
+        with self.assertRaises(ValueError):
+            pyramid.windows("chr1", 150)
+
+    def test_density_pyramid_round_trip(self):
+        counter = DensityCounter(base_window=50)
+        counter.add("chr1", [10, 75, 900])
+        counter.add("chr2", [5000])
+        pyramid = DensityPyramid.from_counter(counter)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "density.npz")
+            pyramid.save(path)
+            loaded = DensityPyramid.load(path)
+        self.assertEqual((loaded.base_window, loaded.chroms, loaded.max_pos), (50, ["chr1", "chr2"], pyramid.max_pos))
+        self.assertEqual(loaded.windows("chr2", 1000)[1].tolist(), [0, 0, 0, 0, 1])
+
+    def test_exact_sum_is_order_independent(self):
+        values = np.random.default_rng(1).random(10000) * 100
+        total = ExactSum()
+        for part in np.array_split(values[::-1], 7):
+            partial = ExactSum()
+            partial.add_many(part)
+            total.merge(partial)
+        self.assertEqual(total.value, math.fsum(values))
+
+    def test_qual_histogram_quantiles(self):
+        """Test if histogram quantiles stay within one bin of the exact percentiles."""
+        values = np.random.default_rng(3).gamma(3, 15, 20000)
+        histogram = QualHistogram(bin_width=1.0)
+        for part in np.array_split(values, 5):
+            histogram.add(part)
+        for q in (0.05, 0.5, 0.95):
+            self.assertAlmostEqual(histogram.quantile(q), np.quantile(values, q), delta=1.0)
+
+        data = histogram.to_dict()
+        self.assertLessEqual(len(data["counts"]), QUAL_SUMMARY_BINS)
+        self.assertEqual(sum(data["counts"]), values.size)
+        self.assertEqual(data["start"], np.floor(values.min()))
+        self.assertEqual(data["quantiles"]["p50"], histogram.quantile(0.5))
+        edges, counts = histogram.rebinned(30)
+        self.assertLessEqual(counts.size, 30)
+        self.assertEqual(counts.sum(), values.size)
+        self.assertEqual(edges.size, counts.size + 1)
+
+    def test_qual_histogram_bins_are_bounded(self):
+        """Test if a huge QUAL widens the bins instead of allocating one bin per unit."""
+        values = np.random.default_rng(4).gamma(3, 15, 5000)
+        histogram = QualHistogram(bin_width=1.0, max_bins=256)
+        histogram.add(values)
+        histogram.add([1e8])
+        self.assertLessEqual(histogram.counts.size, 256)
+        self.assertEqual(histogram.counts.sum(), values.size + 1)
+        self.assertGreaterEqual(histogram.bin_width * 256, 1e8)
+
+        # Shards com larguras diferentes se combinam na mais larga
+        shard = QualHistogram(bin_width=1.0, max_bins=256)
+        shard.add(values)
+        shard.merge(histogram)
+        self.assertEqual(shard.bin_width, histogram.bin_width)
+        self.assertEqual(shard.counts.sum(), 2 * values.size + 1)
+        self.assertAlmostEqual(shard.quantile(0.5), np.quantile(values, 0.5), delta=shard.bin_width)
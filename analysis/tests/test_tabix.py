@@ -0,0 +1,244 @@
+from django.test import TestCase, Client, override_settings
+from unittest import skipUnless
+from django.urls import reverse
+from analysis.models import Analysis
+from analysis.tabix import (bgzip_and_index, ensure_indexed_vcf, fetch, fetch_region, is_indexed, TabixIndex,
+                            UnsortedVCF, INDEXED_VCF_NAME, INDEX_SUFFIX)
+from analysis.bgzf import BLOCK_SIZE
+from analysis.vcf_reader import iter_records
+from analysis.vcf_analyzer import VCFAnalyzer
+import tempfile
+import struct
+import zlib
+import gzip
+import os
+
+try:
+    import pysam
+except ImportError:
+    pysam = None
+
+HEADER = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+
+
+def synthetic_vcf(path, chroms=("chr1", "chr2"), count=20000, step=37):
+    lines = [HEADER]
+    for chrom in chroms:
+        for i in range(1, count + 1):
+            ref = "ACGT" if i % 50 == 0 else "A"
+            lines.append(f"{chrom}\t{i * step}\t.\t{ref}\tG\t{i % 60}\t.\tDP={i}\n")
+    with open(path, "w") as f:
+        f.writelines(lines)
+    return lines
+
+
+class TabixIndexTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, "calls.vcf")
+        self.lines = synthetic_vcf(self.source)
+        self.path = os.path.join(self.tmpdir.name, "calls.vcf.gz")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def expected(self, chrom, beg, end):
+        """Linhas sobrepostas a [beg, end), 0-based, por varredura completa."""
+        found = []
+        for line in self.lines[1:]:
+            fields = line.split("\t")
+            start = int(fields[1]) - 1
+            if fields[0] == chrom and start < end and start + len(fields[3]) > beg:
+                found.append(line)
+        return found
+
+    def test_bgzip_round_trip(self):
+        """Test if the BGZF copy decompresses to the original text and spans many blocks."""
+        bgzip_and_index(self.source, self.path)
+        with gzip.open(self.path, "rt") as f:
+            self.assertEqual(f.read(), "".join(self.lines))
+        self.assertGreater(os.path.getsize(self.source), 2 * BLOCK_SIZE)
+        self.assertTrue(is_indexed(self.path))
+
+    def test_fetch_matches_full_scan(self):
+        bgzip_and_index(self.source, self.path)
+        index = TabixIndex.load(self.path + INDEX_SUFFIX)
+        for chrom, beg, end in [("chr1", 0, 100), ("chr1", 36, 37), ("chr1", 1849, 1850),
+                                ("chr2", 100000, 400000), ("chr2", 739000, 10 ** 6), ("chr3", 0, 1000)]:
+            self.assertEqual(list(fetch(self.path, chrom, beg, end, index=index)), self.expected(chrom, beg, end))
+
+    def test_region_restricted_analysis(self):
+        """Test if a region analysis reads only that region and matches the filtered records."""
+        bgzip_and_index(self.source, self.path)
+        records = list(iter_records(self.path, region="chr2:1000-2000"))
+        full = [r for r in iter_records(self.path) if r[0] == "chr2" and 1000 <= r[1] <= 2000]
+        self.assertEqual(records, full)
+        self.assertEqual(len(list(fetch_region(self.path, "chr1"))), 20000)
+
+        analyzer = VCFAnalyzer(self.path, region="chr2:1000-2000")
+        analyzer.process_and_export(os.path.join(self.tmpdir.name, "region.csv"))
+        self.assertEqual(analyzer.get_summary()["total_variants"], len(full))
+
+    def test_gzip_vcf_is_read_natively(self):
+        with open(self.source, "rb") as src, gzip.open(self.path, "wb") as out:
+            out.write(src.read())
+        self.assertEqual(list(iter_records(self.path)), list(iter_records(self.source)))
+
+        # gzip comum não permite acesso aleatório: é recompactado em BGZF
+        output_dir = os.path.join(self.tmpdir.name, "results")
+        os.makedirs(output_dir)
+        indexed = ensure_indexed_vcf(self.path, output_dir)
+        self.assertEqual(indexed, os.path.join(output_dir, INDEXED_VCF_NAME))
+        self.assertEqual(list(fetch(indexed, "chr1", 0, 100)), self.expected("chr1", 0, 100))
+
+    def test_bgzf_upload_indexed_in_place(self):
+        bgzip_and_index(self.source, self.path)
+        os.remove(self.path + INDEX_SUFFIX)
+        self.assertEqual(ensure_indexed_vcf(self.path, self.tmpdir.name), self.path)
+        self.assertTrue(is_indexed(self.path))
+
+    def test_unsorted_vcf_rejected(self):
+        with open(self.source, "w") as f:
+            f.write(HEADER + "chr1\t200\t.\tA\tG\t.\t.\t.\nchr1\t100\t.\tA\tG\t.\t.\t.\n")
+        with self.assertRaises(UnsortedVCF):
+            bgzip_and_index(self.source, self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+
+def read_bgzf_blocks(path):
+    """Blocos de um arquivo BGZF lidos conforme a especificação (SAMv1, seção 4.1): [(offset, dados)]."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    blocks, offset = [], 0
+    while offset < len(raw):
+        ident, cm, flg, xlen = struct.unpack_from("<HBB6xH", raw, offset)
+        si1, si2, slen, bsize = struct.unpack_from("<BBHH", raw, offset + 12)
+        assert (ident, cm, flg, xlen, si1, si2, slen) == (0x8b1f, 8, 4, 6, 66, 67, 2)
+        body = raw[offset + 18:offset + bsize - 7]
+        crc, isize = struct.unpack_from("<II", raw, offset + bsize - 7)
+        data = zlib.decompress(body, -15)
+        assert (zlib.crc32(data), len(data)) == (crc, isize)
+        blocks.append((offset, data))
+        offset += bsize + 1
+    return blocks
+
+
+def parse_tbi(path):
+    """Campos de um .tbi lidos conforme a especificação do tabix, sem usar ``TabixIndex``."""
+    data = b"".join(block for _, block in read_bgzf_blocks(path))
+    magic = data[:4]
+    n_ref, fmt, col_seq, col_beg, col_end, meta, skip, l_nm = struct.unpack_from("<8i", data, 4)
+    offset = 36
+    names = data[offset:offset + l_nm]
+    offset += l_nm
+    refs = []
+    for _ in range(n_ref):
+        (n_bin,) = struct.unpack_from("<i", data, offset)
+        offset += 4
+        bins = {}
+        for _ in range(n_bin):
+            b, n_chunk = struct.unpack_from("<Ii", data, offset)
+            offset += 8
+            bins[b] = [struct.unpack_from("<QQ", data, offset + 16 * i) for i in range(n_chunk)]
+            offset += 16 * n_chunk
+        (n_intv,) = struct.unpack_from("<i", data, offset)
+        offset += 4
+        refs.append((bins, list(struct.unpack_from(f"<{n_intv}Q", data, offset))))
+        offset += 8 * n_intv
+    (n_no_coor,) = struct.unpack_from("<Q", data, offset)
+    return {"magic": magic, "conf": (fmt, col_seq, col_beg, col_end, meta, skip), "names": names,
+            "refs": refs, "n_no_coor": n_no_coor, "trailing": data[offset + 8:]}
+
+
+class TabixSpecTest(TestCase):
+    """Layout binário do BGZF e do .tbi conferido contra a especificação (htslib/igv.js leem esses campos)."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, "calls.vcf")
+        self.path = os.path.join(self.tmpdir.name, "calls.vcf.gz")
+        self.records = [
+            "chr1\t1\t.\tA\tG\t50\t.\t.\n",                 # [0, 1): bin 4681, janela 0
+            "chr1\t20000\t.\tA\tG\t50\t.\t.\n",             # [19999, 20000): bin 4682, janela 1
+            f"chr1\t40000\t.\t{'A' * 30000}\tG\t50\t.\t.\n",  # [39999, 69999): bin 585, janelas 2-4
+            "chr2\t100\t.\tC\tT\t50\t.\t.\n",               # bin 4681
+        ]
+        with open(self.source, "w") as f:
+            f.write(HEADER + "".join(self.records))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_bgzf_blocks_follow_spec(self):
+        bgzip_and_index(self.source, self.path)
+        blocks = read_bgzf_blocks(self.path)
+        self.assertEqual(b"".join(data for _, data in blocks).decode(), HEADER + "".join(self.records))
+        # Marcador de fim: bloco vazio de 28 bytes
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read()[-28:], bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000"))
+        self.assertEqual(blocks[-1][1], b"")
+        self.assertTrue(all(len(data) <= 0x10000 for _, data in blocks))
+
+    def test_tbi_layout_follows_spec(self):
+        bgzip_and_index(self.source, self.path)
+        tbi = parse_tbi(self.path + INDEX_SUFFIX)
+        self.assertEqual(tbi["magic"], b"TBI\x01")
+        # formato VCF (2), CHROM na coluna 1, POS na 2, sem coluna de fim, comentários com '#', nada pulado
+        self.assertEqual(tbi["conf"], (2, 1, 2, 0, ord("#"), 0))
+        self.assertEqual(tbi["names"], b"chr1\0chr2\0")
+        self.assertEqual((tbi["n_no_coor"], tbi["trailing"]), (0, b""))
+
+        # Offsets virtuais: arquivo pequeno, tudo no bloco 0 (offset = byte no texto)
+        starts = [len(HEADER) + sum(len(r) for r in self.records[:i]) for i in range(len(self.records) + 1)]
+        (chr1_bins, chr1_linear), (chr2_bins, chr2_linear) = tbi["refs"]
+        self.assertEqual(chr1_bins, {4681: [(starts[0], starts[1])], 4682: [(starts[1], starts[2])],
+                                     585: [(starts[2], starts[3])]})
+        self.assertEqual(chr1_linear, [starts[0], starts[1], starts[2], starts[2], starts[2]])
+        self.assertEqual(chr2_bins, {4681: [(starts[3], starts[4])]})
+        self.assertEqual(chr2_linear, [starts[3]])
+
+    @skipUnless(pysam, "pysam (htslib) não instalado")
+    def test_htslib_reads_index(self):
+        """Test if htslib accepts the index and returns the same regions as ``fetch``."""
+        bgzip_and_index(self.source, self.path)
+        with pysam.TabixFile(self.path, index=self.path + INDEX_SUFFIX) as tabix:
+            for chrom, beg, end in (("chr1", 0, 10), ("chr1", 19000, 45000), ("chr1", 60000, 70000),
+                                    ("chr2", 0, 1000)):
+                self.assertEqual([line + "\n" for line in tabix.fetch(chrom, beg, end)],
+                                 list(fetch(self.path, chrom, beg, end)))
+
+        # Muitos blocos BGZF: offsets virtuais fora do bloco 0
+        synthetic_vcf(self.source)
+        bgzip_and_index(self.source, self.path)
+        with pysam.TabixFile(self.path, index=self.path + INDEX_SUFFIX) as tabix:
+            for chrom, beg, end in (("chr1", 100000, 400000), ("chr2", 739000, 10 ** 6)):
+                self.assertEqual([line + "\n" for line in tabix.fetch(chrom, beg, end)],
+                                 list(fetch(self.path, chrom, beg, end)))
+
+
+class IndexedVCFViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        self.override.enable()
+        os.makedirs(os.path.join(self.tmpdir.name, "uploads/vcf"))
+        synthetic_vcf(os.path.join(self.tmpdir.name, "uploads/vcf/calls.vcf"), count=100)
+        self.analysis = Analysis.objects.create(vcf_file="uploads/vcf/calls.vcf", status="COMPLETED")
+        self.output_dir = os.path.join(self.tmpdir.name, f"results/{self.analysis.id}")
+        os.makedirs(self.output_dir)
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def test_igv_uses_index_when_available(self):
+        detail = reverse('analysis_detail', args=[self.analysis.pk])
+        self.assertContains(self.client.get(detail), "indexed: false")
+        self.assertEqual(self.client.get(reverse('analysis_file', args=[self.analysis.pk, INDEXED_VCF_NAME])).status_code,
+                         404)
+
+        ensure_indexed_vcf(self.analysis.vcf_file.path, self.output_dir)
+        response = self.client.get(detail)
+        self.assertContains(response, "indexed: true")
+        self.assertContains(response, reverse('analysis_file', args=[self.analysis.pk, INDEXED_VCF_NAME + INDEX_SUFFIX]))
@@ -0,0 +1,105 @@
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from analysis.models import Analysis
+from analysis.table_cache import TableCache, variant_tables
+from analysis.tests.test_variant_query import ROWS, write_store
+import tempfile
+import json
+import os
+
+
+class FakeTable:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+class TableCacheTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.loads = []
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def path(self, name, content="x"):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def loader(self, nbytes):
+        def load(path):
+            self.loads.append(path)
+            return FakeTable(nbytes)
+        return load
+
+    def test_hits_and_misses(self):
+        cache = TableCache(max_bytes=100)
+        path = self.path("a")
+        first = cache.get(1, path, self.loader(10))
+        second = cache.get(1, path, self.loader(10))
+        self.assertIs(first, second)
+        self.assertEqual(len(self.loads), 1)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"], stats["bytes"]), (1, 1, 1, 10))
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        """Test if entries are evicted in LRU order once the byte limit is exceeded."""
+        cache = TableCache(max_bytes=100)
+        paths = [self.path(name) for name in "abc"]
+        cache.get("a", paths[0], self.loader(40))
+        cache.get("b", paths[1], self.loader(40))
+        cache.get("a", paths[0], self.loader(40))
+        cache.get("c", paths[2], self.loader(40))
+        self.assertEqual(list(cache.entries), ["a", "c"])
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        # Maior que o limite: usada, mas não guardada
+        big = cache.get("d", self.path("d"), self.loader(500))
+        self.assertEqual(big.nbytes, 500)
+        self.assertNotIn("d", cache.entries)
+
+    def test_rewritten_file_is_reloaded(self):
+        cache = TableCache(max_bytes=100)
+        path = self.path("a")
+        cache.get(1, path, self.loader(10))
+        self.path("a", content="rewritten")
+        cache.get(1, path, self.loader(10))
+        self.assertEqual(len(self.loads), 2)
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+
+class VariantTableCacheAPITest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        self.override.enable()
+        self.analysis = Analysis.objects.create(vcf_file="uploads/vcf/test.vcf", status="COMPLETED")
+        results_dir = os.path.join(self.tmpdir.name, f"results/{self.analysis.id}")
+        os.makedirs(results_dir)
+        write_store(os.path.join(results_dir, "variants.parquet"), ROWS)
+        self.url = reverse('analysis_variants_api', args=[self.analysis.pk])
+        variant_tables.clear()
+
+    def tearDown(self):
+        variant_tables.clear()
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def test_repeat_paging_uses_cache(self):
+        client = Client()
+        params = {"columns[0][data]": "POS", "order[0][column]": "0", "order[0][dir]": "desc", "length": 2}
+        client.get(self.url, params)
+        client.get(self.url, dict(params, start=2))
+        # Página simples também aproveita a tabela já carregada
+        data = json.loads(client.get(self.url, {"columns[0][data]": "POS", "length": 1}).content)
+        self.assertEqual(data["data"], [{"POS": "10"}])
+
+        stats = json.loads(client.get(reverse('variant_cache_stats')).content)
+        self.assertEqual((stats["misses"], stats["hits"], stats["entries"]), (1, 2, 1))
+
+    def test_delete_invalidates_entry(self):
+        Client().get(self.url, {"gene": "rpo"})
+        self.assertIn(self.analysis.id, variant_tables.entries)
+        self.analysis.delete()
+        self.assertNotIn(self.analysis.id, variant_tables.entries)
@@ -0,0 +1,101 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from analysis.models import Analysis
+from analysis.upload_handlers import UploadInspector, UploadRejected, VCFValidator, FastaValidator
+import hashlib
+import tempfile
+import struct
+import gzip
+import zlib
+import os
+
+VCF = (b"##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+       + b"".join(b"chr1\t%d\t.\tA\tG\t30\t.\t.\n" % pos for pos in range(1, 300)))
+FASTA = b">chr1\n" + b"ACGT" * 50 + b"\n"
+
+
+def bgzf_block(data):
+    """Um bloco BGZF (gzip com subcampo extra "BC")."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    body = compressor.compress(data) + compressor.flush()
+    header = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff" + struct.pack("<H", 6) + b"BC" + struct.pack("<HH", 2, 25 + len(body))
+    return header + body + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+def inspect(validator, name, content, chunk_size=7):
+    inspector = UploadInspector(validator(), name)
+    for i in range(0, len(content), chunk_size):
+        inspector.feed(content[i:i + chunk_size])
+    return inspector.finish()
+
+
+class UploadInspectorTest(TestCase):
+    def test_sniffs_and_hashes_while_streaming(self):
+        """Test if plain, gzip and multi-block bgzip uploads are detected, validated and hashed."""
+        bgzipped = bgzf_block(VCF[:1000]) + bgzf_block(VCF[1000:]) + bgzf_block(b"")
+        for name, content, compression in (("a.vcf", VCF, "plain"),
+                                           ("a.vcf.gz", gzip.compress(VCF), "gzip"),
+                                           ("a.vcf.gz", bgzipped, "bgzip")):
+            info = inspect(VCFValidator, name, content)
+            self.assertEqual(info, {"size": len(content), "sha256": hashlib.sha256(content).hexdigest(),
+                                    "compression": compression})
+
+    def test_rejects_malformed_files(self):
+        cases = [
+            (VCFValidator, "a.vcf", b"\x00\x01BAM binary" * 10),
+            (VCFValidator, "a.vcf", b"##fileformat=VCFv4.2\nchr1\t5\t.\tA\tG\t30\t.\t.\n"),
+            (VCFValidator, "a.vcf", VCF.replace(b"chr1\t50\t", b"chr1\tXX\t")),
+            (VCFValidator, "a.vcf", gzip.compress(VCF)),
+            (VCFValidator, "a.vcf.gz", VCF),
+            (FastaValidator, "ref.fa.gz", gzip.compress(FASTA)),
+            (FastaValidator, "ref.fa", b"ACGT\n"),
+        ]
+        for validator, name, content in cases:
+            with self.assertRaises(UploadRejected, msg=(name, content[:30])):
+                inspect(validator, name, content)
+        self.assertEqual(inspect(FastaValidator, "ref.fa.gz", bgzf_block(FASTA))["compression"], "bgzip")
+
+
+class UploadFormTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def post(self, **files):
+        return self.client.post(reverse('analysis_create'), dict(window_size=1000, **files))
+
+    def test_valid_upload_records_metadata(self):
+        response = self.post(vcf_file=SimpleUploadedFile("sample.vcf.gz", gzip.compress(VCF)))
+        analysis = Analysis.objects.get()
+        self.assertRedirects(response, reverse('analysis_detail', args=[analysis.pk]), fetch_redirect_response=False)
+        info = analysis.upload_info["vcf_file"]
+        self.assertEqual((info["name"], info["compression"]), ("sample.vcf.gz", "gzip"))
+        with open(analysis.vcf_file.path, "rb") as f:
+            self.assertEqual(info["sha256"], hashlib.sha256(f.read()).hexdigest())
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_large_reference_is_moved_into_store(self):
+        """Test if a disk-buffered upload lands in the content-addressed store under its streamed hash."""
+        self.post(vcf_file=SimpleUploadedFile("sample.vcf", VCF),
+                  reference_file=SimpleUploadedFile("ref.fa", FASTA))
+        analysis = Analysis.objects.get()
+        sha = hashlib.sha256(FASTA).hexdigest()
+        self.assertEqual(analysis.reference_file.name, f"uploads/fasta/{sha}.fa")
+        self.assertEqual(analysis.upload_info["reference_file"]["sha256"], sha)
+
+    def test_malformed_upload_is_rejected_before_saving(self):
+        response = self.post(vcf_file=SimpleUploadedFile("sample.vcf", b"not a vcf\n" * 100),
+                             gff_file=SimpleUploadedFile("genes.gff", b"chr1\tsrc\tgene\t1\n"))
+        self.assertEqual(response.status_code, 200)
+        form = response.context["form"]
+        self.assertIn("Não é um VCF", form.errors["vcf_file"][0])
+        self.assertIn("9 colunas", form.errors["gff_file"][0])
+        self.assertEqual(len(form.errors["vcf_file"]), 1)
+        self.assertFalse(Analysis.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, "uploads")))
@@ -0,0 +1,127 @@
+from django.test import TestCase, Client, override_settings
+from django.http import QueryDict
+from django.urls import reverse
+from analysis.models import Analysis
+from analysis import variant_store
+from analysis.variant_query import VariantQuery, VariantTable, parse_range, run_query
+import pandas as pd
+import tempfile
+import json
+import os
+
+
+def write_store(path, rows):
+    df = pd.DataFrame(rows, columns=variant_store.VARIANT_COLUMNS)
+    writer = variant_store.open_writer(path, row_group_size=4)
+    writer.write(df)
+    writer.close()
+
+
+ROWS = [
+    ("chr1", 10, "A", "G", 30.0, "SNP", "missense", "dnaA"),
+    ("chr1", 20, "AT", "A", 5.0, "INDEL", "frameshift", "dnaA"),
+    ("chr1", 30, "C", "T", 60.0, "SNP", "synonymous", ""),
+    ("chr1", 40, "G", "GA", 45.0, "INDEL", "frameshift", "gyrB"),
+    ("chr2", 5, "T", "C", 99.0, "SNP", "stop_gained", "rpoB"),
+    ("chr2", 15, "A", "C", 12.5, "SNP", "", ""),
+    ("chr2", 25, "CG", "TT", 60.0, "MNP", "missense", "rpoB;rpoC"),
+]
+
+
+class VariantQueryTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "variants.parquet")
+        write_store(self.path, ROWS)
+        self.table = VariantTable.from_path(self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def positions(self, query):
+        filtered, records = query.execute(self.table)
+        return filtered, [(r["CHROM"], r["POS"]) for r in records]
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("10-20"), (10.0, 20.0))
+        self.assertEqual(parse_range("30-"), (30.0, None))
+        self.assertEqual(parse_range("..5"), (None, 5.0))
+        self.assertEqual(parse_range("-5"), (-5.0, -5.0))
+        with self.assertRaises(ValueError):
+            parse_range("abc")
+
+    def test_region_rows(self):
+        query = VariantQuery(region=("chr2", 10, 30), length=10)
+        self.assertEqual(self.positions(query), (2, [("chr2", 15), ("chr2", 25)]))
+        query = VariantQuery(region=("chr3", None, None), length=10)
+        self.assertEqual(self.positions(query), (0, []))
+
+    def test_typed_filters(self):
+        """Test if QUAL ranges, TYPE lists and gene substrings are combined with AND."""
+        query = VariantQuery(filters={"QUAL": (20, 60), "TYPE": ["snp", "MNP"]}, length=10)
+        self.assertEqual(self.positions(query), (3, [("chr1", 10), ("chr1", 30), ("chr2", 25)]))
+        query = VariantQuery(filters={"GENES": "RPO"}, length=10)
+        self.assertEqual(self.positions(query), (2, [("chr2", 5), ("chr2", 25)]))
+
+    def test_global_search(self):
+        query = VariantQuery(search="frameshift", length=10)
+        self.assertEqual(self.positions(query), (2, [("chr1", 20), ("chr1", 40)]))
+        query = VariantQuery(search="99", length=10)
+        self.assertEqual(self.positions(query), (1, [("chr2", 5)]))
+
+    def test_sorting_and_pagination(self):
+        query = VariantQuery(order=[("QUAL", True)], start=1, length=2)
+        self.assertEqual(self.positions(query), (7, [("chr1", 30), ("chr2", 25)]))
+        # Empate em QUAL resolvido pela segunda chave
+        query = VariantQuery(order=[("QUAL", True), ("POS", False)], start=1, length=2)
+        self.assertEqual(self.positions(query), (7, [("chr2", 25), ("chr1", 30)]))
+        query = VariantQuery(filters={"TYPE": ["INDEL"]}, order=[("POS", True)], length=10)
+        self.assertEqual(self.positions(query), (2, [("chr1", 40), ("chr1", 20)]))
+
+    def test_from_params(self):
+        params = QueryDict(
+            "start=0&length=5000&columns[0][data]=CHROM&columns[1][data]=QUAL"
+            "&columns[0][search][value]=chr1&order[0][column]=1&order[0][dir]=desc"
+            "&qual_min=10&type=SNP,INDEL&gene=dna&region=chr1:1-35"
+        )
+        query = VariantQuery.from_params(params, max_length=100)
+        self.assertEqual(query.length, 100)
+        self.assertEqual(query.columns, ["CHROM", "QUAL"])
+        self.assertEqual(query.order, [("QUAL", True)])
+        self.assertEqual(query.region, ("chr1", 1, 35))
+        self.assertEqual(query.filters["QUAL"], (10.0, None))
+        self.assertEqual(query.filters["TYPE"], ["SNP", "INDEL"])
+        total, filtered, records = run_query(self.path, query)
+        self.assertEqual((total, filtered), (7, 1))
+        self.assertEqual(records, [{"CHROM": "chr1", "QUAL": "30.0"}])
+
+
+class VariantQueryAPITest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        self.override.enable()
+        self.analysis = Analysis.objects.create(vcf_file="uploads/vcf/test.vcf", status="COMPLETED")
+        results_dir = os.path.join(self.tmpdir.name, f"results/{self.analysis.id}")
+        os.makedirs(results_dir)
+        write_store(os.path.join(results_dir, "variants.parquet"), ROWS)
+        self.url = reverse('analysis_variants_api', args=[self.analysis.pk])
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def test_sorted_filtered_page(self):
+        response = Client().get(self.url, {
+            "columns[0][data]": "POS", "columns[1][data]": "GENES",
+            "order[0][column]": "0", "order[0][dir]": "desc",
+            "gene": "rpo", "length": 1,
+        })
+        data = json.loads(response.content)
+        self.assertEqual((data["recordsTotal"], data["recordsFiltered"]), (7, 2))
+        self.assertEqual(data["data"], [{"POS": "25", "GENES": "rpoB;rpoC"}])
+
+    def test_invalid_filter_returns_400(self):
+        response = Client().get(self.url, {"qual_min": "abc"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", json.loads(response.content))
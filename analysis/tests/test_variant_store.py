@@ -0,0 +1,178 @@
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from analysis.models import Analysis
+from analysis.vcf_analyzer import VCFAnalyzer
+from analysis import variant_store
+from analysis.variant_query import VariantQuery, run_query
+from unittest import mock
+import numpy as np
+import pyarrow.parquet as pq
+import pandas as pd
+import tempfile
+import json
+import os
+
+
+def make_vcf(path, records):
+    with open(path, "w") as f:
+        f.write("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for chrom, pos in records:
+            f.write(f"{chrom}\t{pos}\t.\tA\tG\t{pos % 50}\t.\t.\n")
+
+
+class VariantStoreTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.vcf_path = os.path.join(self.tmpdir.name, "test.vcf")
+        self.store_path = os.path.join(self.tmpdir.name, "variants.parquet")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def export(self, records, **kwargs):
+        make_vcf(self.vcf_path, records)
+        analyzer = VCFAnalyzer(self.vcf_path, streaming=True, chunk_size=7, **kwargs)
+        analyzer.process_and_export(self.store_path)
+        return analyzer
+
+    def test_row_groups_have_statistics(self):
+        """Test if the store is typed, split into row groups and keeps min/max stats."""
+        records = [("chr1", p) for p in range(10, 510, 10)] + [("chr2", p) for p in range(5, 105, 5)]
+        writer = variant_store.open_writer(self.store_path, row_group_size=16)
+        df = pd.DataFrame({"CHROM": [c for c, _ in records], "POS": [p for _, p in records],
+                           "REF": "A", "ALT": "G", "QUAL": 1.0, "TYPE": "SNP", "IMPACT": "", "GENES": ""})
+        for i in range(0, len(df), 7):
+            writer.write(df.iloc[i:i + 7])
+        writer.close()
+
+        metadata = pq.ParquetFile(self.store_path).metadata
+        self.assertEqual(metadata.num_rows, 70)
+        self.assertEqual([metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)], [16, 16, 16, 16, 6])
+        pos_stats = metadata.row_group(0).column(1).statistics
+        self.assertEqual((pos_stats.min, pos_stats.max), (10, 160))
+        self.assertEqual(str(metadata.schema.to_arrow_schema().field("POS").type), "int64")
+
+    def test_unsorted_input_is_sorted_by_chrom_and_pos(self):
+        records = [("chr2", 50), ("chr1", 30), ("chr2", 10), ("chr1", 20), ("chr3", 5), ("chr1", 25)]
+        self.export(records)
+        df = pd.read_parquet(self.store_path)
+        self.assertEqual(list(zip(df["CHROM"], df["POS"])),
+                         [("chr2", 10), ("chr2", 50), ("chr1", 20), ("chr1", 25), ("chr1", 30), ("chr3", 5)])
+        self.assertFalse(os.path.exists(self.store_path + ".tmp"))
+
+    def test_unsorted_rows_are_regrouped(self):
+        """Test if unsorted rows spread over several row groups come back sorted in full row groups."""
+        writer = variant_store.open_writer(self.store_path, row_group_size=4)
+        rows = [("chr2", 9), ("chr1", 3), ("chr2", 1), ("chr1", 1), ("chr3", 2), ("chr2", 5), ("chr1", 2)]
+        df = pd.DataFrame({"CHROM": [c for c, _ in rows], "POS": [p for _, p in rows], "REF": "A", "ALT": "G",
+                           "QUAL": 1.0, "TYPE": "SNP", "IMPACT": "", "GENES": ""})
+        for i in range(0, len(df), 2):
+            writer.write(df.iloc[i:i + 2])
+        writer.close()
+
+        metadata = pq.ParquetFile(self.store_path).metadata
+        self.assertEqual([metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)], [4, 3])
+        df = pd.read_parquet(self.store_path)
+        self.assertEqual(list(zip(df["CHROM"], df["POS"])),
+                         [("chr2", 1), ("chr2", 5), ("chr2", 9), ("chr1", 1), ("chr1", 2), ("chr1", 3), ("chr3", 2)])
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ["variants.parquet"])
+
+    def test_external_sort_matches_in_memory_sort(self):
+        """Test if the k-way merge of sorted row groups equals a stable full sort, ties in file order."""
+        rng = np.random.default_rng(3)
+        n = 5000
+        df = pd.DataFrame({"CHROM": rng.choice(["chrB", "chrA", "chrC"], n), "POS": rng.integers(1, 300, n),
+                           "REF": "A", "ALT": [str(i) for i in range(n)], "QUAL": 1.0, "TYPE": "SNP",
+                           "IMPACT": "", "GENES": ""})
+        with mock.patch.object(variant_store, "MERGE_BATCH_ROWS", 64):
+            writer = variant_store.open_writer(self.store_path, row_group_size=700)
+            for i in range(0, n, 333):
+                writer.write(df.iloc[i:i + 333])
+            writer.close()
+
+        order = {chrom: i for i, chrom in enumerate(pd.unique(df["CHROM"]))}
+        expected = df.assign(RANK=df["CHROM"].map(order)).sort_values(["RANK", "POS"], kind="stable")
+        stored = pd.read_parquet(self.store_path)
+        self.assertEqual(stored["ALT"].tolist(), expected["ALT"].tolist())
+        metadata = pq.ParquetFile(self.store_path).metadata
+        self.assertEqual([metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)],
+                         [700] * 7 + [100])
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ["variants.parquet"])
+
+    def test_page_and_region_reads(self):
+        records = [("chr1", p) for p in range(1, 301)] + [("chr2", p) for p in range(1, 101)]
+        self.export(records)
+
+        page = variant_store.read_rows(self.store_path, 295, 10, columns=["CHROM", "POS"])
+        self.assertEqual(list(page.columns), ["CHROM", "POS"])
+        self.assertEqual(list(zip(page["CHROM"], page["POS"])),
+                         [("chr1", p) for p in range(296, 301)] + [("chr2", p) for p in range(1, 6)])
+
+        query = VariantQuery(region=variant_store.parse_region("chr2:10-12"), length=10)
+        total, filtered, rows = run_query(self.store_path, query)
+        self.assertEqual((total, filtered), (400, 3))
+        self.assertEqual([row["POS"] for row in rows], ["10", "11", "12"])
+        self.assertEqual(variant_store.count_rows(self.store_path), 400)
+
+    def test_parallel_parts_are_concatenated(self):
+        records = [("chr1", p) for p in range(1, 200)]
+        serial = self.export(records)
+        expected = pd.read_parquet(self.store_path)
+        parallel = self.export(records, workers=2)
+        pd.testing.assert_frame_equal(pd.read_parquet(self.store_path), expected)
+        self.assertEqual(parallel.get_summary(), serial.get_summary())
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ["test.vcf", "variants.parquet"])
+
+    def test_parse_region(self):
+        self.assertEqual(variant_store.parse_region("chr1:1,000-2,000"), ("chr1", 1000, 2000))
+        self.assertEqual(variant_store.parse_region("chr1:15"), ("chr1", 15, 15))
+        self.assertEqual(variant_store.parse_region("chrX"), ("chrX", None, None))
+        self.assertEqual(variant_store.parse_region("HLA-A*01:01:100-200"), ("HLA-A*01:01", 100, 200))
+        with self.assertRaises(ValueError):
+            variant_store.parse_region("chr1:20-10")
+
+
+class VariantStoreAPITest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.tmpdir.name)
+        self.override.enable()
+        self.analysis = Analysis.objects.create(vcf_file="uploads/vcf/test.vcf", status="COMPLETED")
+        results_dir = os.path.join(self.tmpdir.name, f"results/{self.analysis.id}")
+        os.makedirs(results_dir)
+        vcf_path = os.path.join(self.tmpdir.name, "test.vcf")
+        make_vcf(vcf_path, [("chr1", p) for p in range(1, 51)] + [("chr2", p) for p in range(1, 51)])
+        VCFAnalyzer(vcf_path, streaming=True).process_and_export(os.path.join(results_dir, "variants.parquet"))
+        self.client = Client()
+
+    def tearDown(self):
+        self.override.disable()
+        self.tmpdir.cleanup()
+
+    def get(self, **params):
+        response = self.client.get(reverse('analysis_variants_api', args=[self.analysis.pk]), params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_page(self):
+        data = self.get(start=48, length=4, draw=3, **{"columns[0][data]": "CHROM", "columns[1][data]": "POS"})
+        self.assertEqual((data["draw"], data["recordsTotal"], data["recordsFiltered"]), (3, 100, 100))
+        self.assertEqual(data["data"], [{"CHROM": "chr1", "POS": "49"}, {"CHROM": "chr1", "POS": "50"},
+                                        {"CHROM": "chr2", "POS": "1"}, {"CHROM": "chr2", "POS": "2"}])
+
+    def test_region_and_search(self):
+        data = self.get(region="chr2:10-19", length=5)
+        self.assertEqual(data["recordsFiltered"], 10)
+        self.assertEqual([row["POS"] for row in data["data"]], ["10", "11", "12", "13", "14"])
+
+        data = self.get(**{"search[value]": "chr2", "start": 45, "length": 10})
+        self.assertEqual(data["recordsFiltered"], 50)
+        self.assertEqual([row["POS"] for row in data["data"]], ["46", "47", "48", "49", "50"])
+
+    def test_csv_download(self):
+        response = self.client.get(reverse('analysis_variants_csv', args=[self.analysis.pk]))
+        content = b"".join(response.streaming_content).decode()
+        lines = content.splitlines()
+        self.assertEqual(lines[0], "CHROM,POS,REF,ALT,QUAL,TYPE,IMPACT,GENES")
+        self.assertEqual(len(lines), 101)
+        self.assertEqual(lines[1], "chr1,1,A,G,1.0,SNP,,")
@@ -0,0 +1,53 @@
+from django.test import TestCase
+from analysis.vcf_reader import iter_records
+from analysis.vcf_analyzer import VCFAnalyzer
+import tempfile
+import os
+
+
+class ParserBackendTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.vcf_content = (
+            "##fileformat=VCFv4.2\n"
+            "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+            "chr1\t100\t.\tA\tT\t30\t.\tANN=A|missense_variant|x,B|synonymous_variant\n"
+            "chr1\t101\t.\tAT\tA\t.\t.\t.\n"
+            "chr1\t102\t.\tA\t.\t5\t.\t.\n"
+            "chr1\t103\t.\tAC\tGT\t5.5\t.\t.\n"
+            "chr1\t104\t.\tA\t<DEL>\t5\t.\tSVTYPE=DEL\n"
+            "chr1\t105\t.\tA\tG,T\t7\t.\tDP=3;ANN=T|stop_lost\n"
+            "chr1\t106\t.\tA\tG[2:300[\t7\t.\tSVTYPE=BND\n"
+            "chr1\t108\t.\tA\tt\t7\t.\t.\n"
+            "chr1\t109\t.\tA\tAT,C\t7\t.\t.\n"
+            "chr1\t110\t.\tATG\tACG\t1e3\t.\tSVTYPE=INV\n"
+            "chr2\t5\t.\tC\tNA\t12\t.\tANN=T|frameshift_variant\n"
+            "chr2 6 . C T 12 . .\n"
+            "\n"
+            "chr2\t7\t.\tC\t*\t12\t.\t.\n"
+        )
+        self.vcf_path = os.path.join(self.tmpdir.name, "edge.vcf")
+        with open(self.vcf_path, "w") as f:
+            f.write(self.vcf_content)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_native_matches_pyvcf_records(self):
+        """Test if the native tokenizer reproduces PyVCF values and types."""
+        pyvcf = list(iter_records(self.vcf_path, "pyvcf"))
+        native = list(iter_records(self.vcf_path, "native"))
+        self.assertEqual(len(native), 13)
+        self.assertEqual(repr(native), repr(pyvcf))
+
+    def test_native_matches_pyvcf_metrics(self):
+        metrics = {}
+        for backend in ("pyvcf", "native"):
+            analyzer = VCFAnalyzer(self.vcf_path, backend=backend)
+            analyzer.process_and_export(os.path.join(self.tmpdir.name, f"{backend}.csv"))
+            metrics[backend] = analyzer.get_summary()
+        self.assertEqual(metrics["native"], metrics["pyvcf"])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            list(iter_records(self.vcf_path, "bcf"))
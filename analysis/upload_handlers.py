@@ -0,0 +1,305 @@
+import hashlib
+import re
+import zlib
+
+from django.core.files.uploadhandler import (
+    FileUploadHandler, MemoryFileUploadHandler, SkipFile, StopFutureHandlers, TemporaryFileUploadHandler,
+)
+
+from .vcf_reader import parse_line
+
+# Linhas de dados validadas no início de cada arquivo (o restante só é hasheado)
+VALIDATE_DATA_LINES = 100
+
+# Maior linha aceita durante a inspeção (bytes descompactados)
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+VCF_COLUMNS = ["CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO"]
+
+_FASTA_SEQUENCE = re.compile(r"^[A-Za-z*.\-]*$")
+
+
+class UploadRejected(ValueError):
+    """Arquivo enviado que não é do formato esperado (mensagem mostrada no formulário)."""
+
+
+def sniff_compression(head):
+    """``bgzip``, ``gzip`` ou ``plain``, a partir dos primeiros bytes do arquivo."""
+    if head[:2] != b"\x1f\x8b":
+        return "plain"
+    # bgzip: gzip com campo extra (FLG.FEXTRA) cujo subcampo é "BC"
+    if len(head) >= 14 and head[3] & 4 and head[12:14] == b"BC":
+        return "bgzip"
+    return "gzip"
+
+
+class VCFValidator:
+    """Cabeçalho (``##fileformat``/``#CHROM``) e primeiras linhas de dados de um VCF."""
+    compressions = ("plain", "gzip", "bgzip")
+
+    def __init__(self):
+        self.lines = 0
+        self.header = False
+        self.records = 0
+
+    def line(self, line):
+        self.lines += 1
+        if self.lines == 1 and not line.startswith(("##fileformat=VCF", "#CHROM")):
+            raise UploadRejected("Não é um VCF: a primeira linha deve ser '##fileformat=VCF...'.")
+        if line.startswith("#"):
+            if line.startswith("#CHROM"):
+                if re.split(r"\t| +", line[1:].strip())[:8] != VCF_COLUMNS:
+                    raise UploadRejected("Cabeçalho #CHROM inválido: esperadas as colunas " + ", ".join(VCF_COLUMNS) + ".")
+                self.header = True
+            return False
+        if not line.strip():
+            return False
+        if not self.header:
+            raise UploadRejected(f"Linha {self.lines}: dados antes do cabeçalho #CHROM.")
+        try:
+            record = parse_line(line.strip())
+        except ValueError:
+            record = None
+        if record is None:
+            raise UploadRejected(f"Linha {self.lines}: esperadas 8 colunas (CHROM a INFO) com POS inteiro.")
+        self.records += 1
+        return self.records >= VALIDATE_DATA_LINES
+
+    def finish(self):
+        if not self.header:
+            raise UploadRejected("VCF sem a linha de cabeçalho #CHROM.")
+
+
+class GFFValidator:
+    """Primeiras features de um GFF: 9 colunas separadas por TAB e coordenadas inteiras."""
+    compressions = ("plain",)
+
+    def __init__(self):
+        self.lines = 0
+        self.features = 0
+
+    def line(self, line):
+        self.lines += 1
+        if line.startswith("##FASTA"):
+            return True
+        if not line.strip() or line.startswith("#"):
+            return False
+        fields = line.rstrip("\r\n").split("\t")
+        if len(fields) < 9:
+            raise UploadRejected(f"Linha {self.lines}: esperadas 9 colunas separadas por TAB.")
+        try:
+            start, end = int(fields[3]), int(fields[4])
+        except ValueError:
+            raise UploadRejected(f"Linha {self.lines}: início/fim devem ser inteiros.")
+        if start > end:
+            raise UploadRejected(f"Linha {self.lines}: início maior que o fim.")
+        self.features += 1
+        return self.features >= VALIDATE_DATA_LINES
+
+    def finish(self):
+        if not self.features:
+            raise UploadRejected("GFF sem nenhuma feature.")
+
+
+class FastaValidator:
+    """Cabeçalho ``>`` e primeiras linhas de sequência de um FASTA."""
+    # pyfaidx (e o IGV) só indexam FASTA compactado com bgzip
+    compressions = ("plain", "bgzip")
+
+    def __init__(self):
+        self.lines = 0
+        self.sequences = 0
+
+    def line(self, line):
+        self.lines += 1
+        line = line.strip()
+        if not line:
+            return False
+        if line.startswith(">"):
+            self.sequences += 1
+            return False
+        if not self.sequences:
+            raise UploadRejected("Não é um FASTA: a primeira linha deve começar com '>'.")
+        if not _FASTA_SEQUENCE.match(line):
+            raise UploadRejected(f"Linha {self.lines}: caracteres inválidos na sequência.")
+        return self.lines >= VALIDATE_DATA_LINES
+
+    def finish(self):
+        if not self.sequences:
+            raise UploadRejected("FASTA sem nenhuma sequência.")
+
+
+# Validador de cada campo de upload dos formulários de análise
+VALIDATORS = {
+    "vcf_file": VCFValidator,
+    "gff_file": GFFValidator,
+    "reference_file": FastaValidator,
+}
+
+
+class UploadInspector:
+    """Hash, tamanho, compressão e validação de um arquivo, bloco a bloco.
+
+    A compressão é detectada nos primeiros bytes; arquivos compactados são
+    descompactados só até o validador terminar (cabeçalho e primeiras
+    linhas), depois o restante é apenas hasheado.
+    """
+
+    def __init__(self, validator, file_name):
+        self.validator = validator
+        self.file_name = file_name or ""
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.compression = None
+        self.head = b""
+        self.decompressor = None
+        self.buffer = b""
+        self.done = False
+
+    def feed(self, chunk):
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        if self.done:
+            return
+        if self.compression is None:
+            self.head += chunk
+            if len(self.head) < 18:
+                return
+            chunk, self.head = self.head, b""
+            self._start(chunk)
+        self._lines(self._decompress(chunk))
+
+    def finish(self):
+        """Conclui a inspeção; retorna os metadados ou levanta ``UploadRejected``."""
+        if self.compression is None:
+            chunk, self.head = self.head, b""
+            self._start(chunk)
+            self._lines(self._decompress(chunk))
+        if not self.done:
+            if self.decompressor is not None:
+                self._lines(self.decompressor.flush())
+            if self.buffer:
+                self._line(self.buffer)
+                self.buffer = b""
+        if not self.done:
+            self.validator.finish()
+        return {"size": self.size, "sha256": self.sha256.hexdigest(), "compression": self.compression}
+
+    def _start(self, head):
+        self.compression = sniff_compression(head)
+        if self.compression not in self.validator.compressions:
+            allowed = " ou ".join(self.validator.compressions)
+            raise UploadRejected(f"Compressão {self.compression} não suportada para este arquivo (aceito: {allowed}).")
+        if (self.compression != "plain") != self.file_name.lower().endswith(".gz"):
+            raise UploadRejected("A extensão .gz deve ser usada somente (e sempre) em arquivos compactados.")
+        if self.compression != "plain":
+            self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+    def _decompress(self, data):
+        if self.decompressor is None:
+            return data
+        output = []
+        while data:
+            try:
+                output.append(self.decompressor.decompress(data))
+            except zlib.error:
+                raise UploadRejected("Arquivo compactado corrompido.")
+            data = self.decompressor.unused_data
+            if self.decompressor.eof:
+                # bgzip (e gzip concatenado): um membro gzip após o outro
+                self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        return b"".join(output)
+
+    def _lines(self, data):
+        if self.done or not data:
+            return
+        data = self.buffer + data
+        lines = data.split(b"\n")
+        self.buffer = lines.pop()
+        if len(self.buffer) > MAX_LINE_BYTES:
+            raise UploadRejected("Linha longa demais: o arquivo não parece ser texto.")
+        for line in lines:
+            if self._line(line):
+                self.done = True
+                self.buffer = b""
+                return
+
+    def _line(self, raw):
+        try:
+            line = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            raise UploadRejected("Arquivo binário ou com codificação inválida (esperado texto UTF-8).")
+        return self.validator.line(line.rstrip("\r"))
+
+
+class InspectingUploadHandler(FileUploadHandler):
+    """Inspeciona os uploads de VCF/GFF/FASTA enquanto os bytes chegam.
+
+    Cada bloco é hasheado e validado (``UploadInspector``) e repassado ao
+    armazenamento padrão do Django (memória para arquivos pequenos, arquivo
+    temporário para os demais), escrito uma única vez. Um arquivo inválido
+    deixa de ser gravado no primeiro erro; o motivo fica em
+    ``request.upload_errors`` para o formulário. Os arquivos aceitos ganham
+    os atributos ``sha256``, ``compression`` e ``upload_info``.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.memory = MemoryFileUploadHandler(request)
+        self.temporary = TemporaryFileUploadHandler(request)
+        self.delegate = None
+        self.inspector = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.memory.handle_raw_input(input_data, META, content_length, boundary, encoding)
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        validator = VALIDATORS.get(field_name)
+        self.inspector = UploadInspector(validator(), file_name) if validator else None
+        self.delegate = self.memory if self.memory.activated else self.temporary
+        try:
+            self.delegate.new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        except StopFutureHandlers:
+            pass
+        # Fechado pelo parser do Django se o arquivo for descartado (SkipFile)
+        self.file = self.delegate.file
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.inspector is not None:
+            try:
+                self.inspector.feed(raw_data)
+            except UploadRejected as e:
+                self.reject(e)
+                raise SkipFile()
+        self.delegate.receive_data_chunk(raw_data, start)
+        return None
+
+    def file_complete(self, file_size):
+        info = None
+        if self.inspector is not None:
+            try:
+                info = self.inspector.finish()
+            except UploadRejected as e:
+                self.reject(e)
+                self.file.close()
+                return None
+        uploaded = self.delegate.file_complete(file_size)
+        if uploaded is not None and info is not None:
+            uploaded.sha256 = info["sha256"]
+            uploaded.compression = info["compression"]
+            uploaded.upload_info = dict(info, name=self.file_name)
+        return uploaded
+
+    def reject(self, error):
+        if self.request is not None:
+            if not hasattr(self.request, 'upload_errors'):
+                self.request.upload_errors = {}
+            self.request.upload_errors[self.field_name] = str(error)
+
+    def upload_interrupted(self):
+        self.temporary.upload_interrupted()
+
+    def upload_complete(self):
+        self.memory.upload_complete()
+        self.temporary.upload_complete()
@@ -8,8 +8,18 @@ urlpatterns = [
     path('analyses/', views.analysis_list, name='analysis_list'),
     path('create/', views.analysis_create, name='analysis_create'),
     path('<int:pk>/', views.analysis_detail, name='analysis_detail'),
+    path('<int:pk>/status/', views.analysis_status, name='analysis_status'),
+    path('<int:pk>/rerun/', views.analysis_rerun, name='analysis_rerun'),
     path('<int:pk>/delete/', views.analysis_delete, name='analysis_delete'),
     path('<int:pk>/variants_api/', views.analysis_variants_api, name='analysis_variants_api'),
+    path('<int:pk>/annotations_api/', views.analysis_annotations_api, name='analysis_annotations_api'),
+    path('<int:pk>/plot_data/', views.analysis_plot_data, name='analysis_plot_data'),
+    path('<int:pk>/density/', views.analysis_density_api, name='analysis_density_api'),
+    path('<int:pk>/variants.csv', views.analysis_variants_csv, name='analysis_variants_csv'),
+    path('<int:pk>/plots/<str:name>', views.analysis_plot, name='analysis_plot'),
+    path('<int:pk>/files/<path:name>', views.analysis_file, name='analysis_file'),
+    path('cache/variants/', views.variant_cache_stats, name='variant_cache_stats'),
+    path('metrics', views.metrics, name='metrics'),
     # Futuras rotas para gráficos ou relatórios extras podem ser adicionadas aqui
 ]
 
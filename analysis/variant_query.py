@@ -0,0 +1,362 @@
+import re
+import threading
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pandas as pd
+
+from .table_cache import variant_tables
+from .variant_store import VARIANT_COLUMNS, SCHEMA, is_parquet, parse_region, read_rows, count_rows
+
+NUMERIC_COLUMNS = ("POS", "QUAL")
+# Filtro por lista de valores exatos; nas demais colunas de texto o filtro é por trecho
+CATEGORICAL_COLUMNS = ("CHROM", "TYPE", "IMPACT")
+# Colunas com poucos valores distintos, lidas como dicionário (menos memória)
+DICTIONARY_COLUMNS = ["CHROM", "TYPE", "IMPACT"]
+
+_NUMERIC_TERM = re.compile(r"^[\d.eE+\-]+$|^(nan|inf)$", re.IGNORECASE)
+_NUMBER = r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+_RANGE_PATTERN = re.compile(rf"^\s*({_NUMBER})?\s*(?:(\.\.|-|:)\s*({_NUMBER})?)?\s*$")
+
+
+def parse_range(text):
+    """Interpreta ``min-max`` (``min..max``, extremos opcionais) ou um valor exato."""
+    text = text.strip()
+    match = _RANGE_PATTERN.match(text)
+    if not text or not match or not (match.group(1) or match.group(3)):
+        raise ValueError(f"Intervalo inválido: {text!r}")
+    low, sep, high = match.groups()
+    low = float(low) if low else None
+    if not sep:
+        return low, low
+    return low, float(high) if high else None
+
+
+class VariantTable:
+    """Tabela de variantes carregada em memória, com índices calculados sob demanda.
+
+    A tabela já vem ordenada por CHROM/POS (ver ``variant_store``), então cada
+    cromossomo ocupa um intervalo contíguo de linhas e consultas por região são
+    buscas binárias em POS. As permutações de ordenação por coluna são
+    calculadas na primeira vez que são pedidas e reaproveitadas depois.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.num_rows = table.num_rows
+        self.pos = table.column("POS").to_numpy()
+        self._chrom_ranges = None
+        self._orders = {}
+        self._ranks = {}
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_path(cls, path):
+        if is_parquet(path):
+            table = pq.read_table(path, read_dictionary=DICTIONARY_COLUMNS)
+        else:
+            df = pd.read_csv(path, keep_default_na=False, dtype={"CHROM": str})
+            table = pa.Table.from_pandas(df[VARIANT_COLUMNS], schema=SCHEMA, preserve_index=False)
+        return cls(table.combine_chunks())
+
+    @property
+    def nbytes(self):
+        return (self.table.nbytes
+                + sum(order.nbytes for order in self._orders.values())
+                + sum(rank.nbytes for rank in self._ranks.values())
+                + sum(d.nbytes + i.nbytes for d, i in self._encoded.values()))
+
+    def column(self, name):
+        return self.table.column(name)
+
+    def chrom_ranges(self):
+        """``{chrom: [(primeira linha, última linha + 1), ...]}``."""
+        if self._chrom_ranges is None:
+            chroms = self.column("CHROM").to_numpy(zero_copy_only=False)
+            ranges = {}
+            if chroms.size:
+                starts = np.r_[0, np.flatnonzero(chroms[1:] != chroms[:-1]) + 1]
+                ends = np.r_[starts[1:], chroms.size]
+                for start, end in zip(starts.tolist(), ends.tolist()):
+                    # Tabelas antigas (CSV) podem repetir um cromossomo fora de ordem
+                    ranges.setdefault(chroms[start], []).append((start, end))
+            self._chrom_ranges = ranges
+        return self._chrom_ranges
+
+    def region_rows(self, chrom, start=None, end=None):
+        """Linhas de uma região como lista de intervalos ``(início, fim)``."""
+        rows = []
+        for lo, hi in self.chrom_ranges().get(chrom, []):
+            pos = self.pos[lo:hi]
+            first = lo + int(np.searchsorted(pos, start, side="left")) if start is not None else lo
+            last = lo + int(np.searchsorted(pos, end, side="right")) if end is not None else hi
+            if last > first:
+                rows.append((first, last))
+        return rows
+
+    def sort_order(self, column, descending=False):
+        """Permutação estável que ordena a tabela por ``column``.
+
+        Empates mantêm a ordem da tabela (CHROM/POS) nos dois sentidos.
+        """
+        key = (column, descending)
+        with self._lock:
+            if key not in self._orders:
+                values = self.column(column)
+                if pa.types.is_dictionary(values.type):
+                    values = values.cast(values.type.value_type)
+                direction = "descending" if descending else "ascending"
+                self._orders[key] = pc.sort_indices(values, sort_keys=[("", direction)]) \
+                    .to_numpy().astype(np.int64)
+            return self._orders[key]
+
+    def sort_rank(self, column):
+        """Posto denso de cada linha em ``column`` (valores iguais, mesmo posto)."""
+        order = self.sort_order(column)
+        with self._lock:
+            if column not in self._ranks:
+                values = self.column(column)
+                if pa.types.is_dictionary(values.type):
+                    values = values.cast(values.type.value_type)
+                ordered = values.take(pa.array(order)).to_numpy(zero_copy_only=False)
+                changed = np.ones(order.size, dtype=np.int64)
+                if order.size:
+                    changed[0] = 0
+                    changed[1:] = ordered[1:] != ordered[:-1]
+                rank = np.empty(order.size, dtype=np.int64)
+                rank[order] = np.cumsum(changed)
+                self._ranks[column] = rank
+            return self._ranks[column]
+
+    def encoded(self, column):
+        """Coluna codificada como ``(valores distintos em minúsculas, índice por linha)``.
+
+        Filtros de texto comparam só os valores distintos (poucos, em geral) e
+        expandem o resultado para as linhas pelo índice.
+        """
+        with self._lock:
+            if column not in self._encoded:
+                values = self.column(column)
+                if not pa.types.is_string(values.type) and not pa.types.is_dictionary(values.type):
+                    values = pa.array(pd.Series(values.to_numpy()).astype(str), type=pa.string())
+                if not pa.types.is_dictionary(values.type):
+                    values = pc.dictionary_encode(values)
+                if isinstance(values, pa.ChunkedArray):
+                    values = values.combine_chunks() if values.num_chunks else \
+                        pa.array([], type=pa.dictionary(pa.int32(), pa.string()))
+                dictionary = pc.utf8_lower(values.dictionary.cast(pa.string()))
+                indices = values.indices.to_numpy(zero_copy_only=False)
+                self._encoded[column] = (dictionary, indices)
+            return self._encoded[column]
+
+    def match(self, column, pattern):
+        """Linhas cujo valor em ``column`` contém ``pattern`` (sem diferenciar maiúsculas)."""
+        dictionary, indices = self.encoded(column)
+        matched = pc.match_substring(dictionary, pattern.lower()).fill_null(False)
+        return matched.to_numpy(zero_copy_only=False)[indices]
+
+    def isin(self, column, values):
+        dictionary, indices = self.encoded(column)
+        matched = pc.is_in(dictionary, value_set=pa.array([v.lower() for v in values], type=pa.string()))
+        return matched.fill_null(False).to_numpy(zero_copy_only=False)[indices]
+
+
+# ---------------------------
+# CACHE
+# ---------------------------
+def load_variant_table(path, key=None):
+    """``VariantTable`` de ``path``, reaproveitada do cache enquanto o arquivo não mudar.
+
+    ``key`` identifica a entrada (em geral o id da análise); padrão: o caminho.
+    """
+    return variant_tables.get(key if key is not None else path, path, VariantTable.from_path)
+
+
+# ---------------------------
+# CONSULTA
+# ---------------------------
+class VariantQuery:
+    """Consulta à tabela de variantes: filtros tipados, região, ordenação e página.
+
+    ``filters`` mapeia coluna -> critério: ``(mín, máx)`` para POS/QUAL, lista
+    de valores para CHROM/TYPE/IMPACT e trecho de texto (sem diferenciar
+    maiúsculas) para REF/ALT/GENES. ``search`` procura um trecho em qualquer
+    coluna, como a caixa de busca do DataTables.
+    """
+
+    def __init__(self, region=None, filters=None, search="", order=None, start=0, length=10,
+                 columns=None):
+        self.region = region
+        self.filters = filters or {}
+        self.search = search
+        self.order = order or []
+        self.start = start
+        self.length = length
+        self.columns = columns or VARIANT_COLUMNS
+
+    @classmethod
+    def from_params(cls, params, max_length=1000):
+        """Monta a consulta a partir dos parâmetros do DataTables (e dos filtros extras).
+
+        Além do protocolo do DataTables (``order[i][...]``, ``columns[i][data]``,
+        ``columns[i][search][value]``) aceita ``region``, ``chrom``,
+        ``qual_min``/``qual_max``, ``type``, ``impact`` e ``gene``.
+        """
+        start = max(int(params.get("start", 0)), 0)
+        length = int(params.get("length", 10))
+        if length < 0 or length > max_length:
+            length = max_length
+
+        data_columns = {}
+        filters = {}
+        for key, value in params.items():
+            match = re.match(r"^columns\[(\d+)\]\[data\]$", key)
+            if match and value in VARIANT_COLUMNS:
+                data_columns[int(match.group(1))] = value
+        for i, name in data_columns.items():
+            value = params.get(f"columns[{i}][search][value]", "")
+            if value:
+                filters[name] = cls.parse_filter(name, value)
+
+        if params.get("chrom"):
+            filters["CHROM"] = cls.parse_filter("CHROM", params.get("chrom"))
+        if params.get("qual_min") or params.get("qual_max"):
+            filters["QUAL"] = (float(params["qual_min"]) if params.get("qual_min") else None,
+                               float(params["qual_max"]) if params.get("qual_max") else None)
+        for name, key in (("TYPE", "type"), ("IMPACT", "impact")):
+            raw = params.getlist(key) if hasattr(params, "getlist") else [params.get(key, "")]
+            values = [v.strip() for item in raw for v in item.split(",") if v.strip()]
+            if values:
+                filters[name] = values
+        if params.get("gene"):
+            filters["GENES"] = params.get("gene")
+
+        order = []
+        i = 0
+        while f"order[{i}][column]" in params:
+            name = data_columns.get(int(params[f"order[{i}][column]"]))
+            if name:
+                order.append((name, params.get(f"order[{i}][dir]", "asc") == "desc"))
+            i += 1
+
+        region = params.get("region", "").strip()
+        return cls(
+            region=parse_region(region) if region else None,
+            filters=filters,
+            search=params.get("search[value]", ""),
+            order=order,
+            start=start,
+            length=length,
+            columns=[data_columns[i] for i in sorted(data_columns)] or None,
+        )
+
+    @staticmethod
+    def parse_filter(name, value):
+        if name in NUMERIC_COLUMNS:
+            return parse_range(value)
+        if name in CATEGORICAL_COLUMNS:
+            return [v.strip() for v in value.split(",") if v.strip()]
+        return value
+
+    @property
+    def is_plain(self):
+        """Sem filtros nem ordenação: a página sai direto da ordem do arquivo."""
+        return not (self.region or self.filters or self.search or self.order)
+
+    # ---------------------------
+    # Execução
+    # ---------------------------
+    def mask(self, table):
+        """Máscara booleana das linhas que passam em todos os filtros (None = todas)."""
+        mask = None
+
+        def combine(current, new):
+            return new if current is None else current & new
+
+        if self.region:
+            region_mask = np.zeros(table.num_rows, dtype=bool)
+            for lo, hi in table.region_rows(*self.region):
+                region_mask[lo:hi] = True
+            mask = region_mask
+
+        for name, criterion in self.filters.items():
+            if name in NUMERIC_COLUMNS:
+                low, high = criterion
+                array = table.column(name).to_numpy()
+                selected = np.ones(array.size, dtype=bool)
+                if low is not None:
+                    selected &= array >= low
+                if high is not None:
+                    selected &= array <= high
+            elif name in CATEGORICAL_COLUMNS:
+                selected = table.isin(name, criterion)
+            else:
+                selected = table.match(name, criterion)
+            mask = combine(mask, selected)
+
+        if self.search:
+            found = np.zeros(table.num_rows, dtype=bool)
+            for name in VARIANT_COLUMNS:
+                # POS/QUAL só podem conter termos numéricos
+                if name in NUMERIC_COLUMNS and not _NUMERIC_TERM.match(self.search):
+                    continue
+                found |= table.match(name, self.search)
+            mask = combine(mask, found)
+        return mask
+
+    def execute(self, table):
+        """Retorna ``(linhas filtradas, página como lista de dicts)``."""
+        mask = self.mask(table)
+        if self.order:
+            rows = self.sorted_rows(table, mask)
+        elif mask is not None:
+            rows = np.flatnonzero(mask)
+        else:
+            rows = np.arange(table.num_rows)
+
+        page = rows[self.start:self.start + self.length]
+        records = table.table.select(self.columns).take(pa.array(page, type=pa.int64())).to_pylist()
+        return int(rows.size), records
+
+    def sorted_rows(self, table, mask=None):
+        """Índices das linhas selecionadas na ordem pedida.
+
+        Uma chave usa direto a permutação pré-calculada da coluna; várias chaves
+        combinam, com lexsort, a posição de cada linha selecionada em cada uma.
+        """
+        if len(self.order) == 1:
+            name, descending = self.order[0]
+            rows = table.sort_order(name, descending)
+            return rows if mask is None else rows[mask[rows]]
+
+        rows = np.arange(table.num_rows) if mask is None else np.flatnonzero(mask)
+        keys = []
+        for name, descending in reversed(self.order):
+            rank = table.sort_rank(name)[rows]
+            keys.append(-rank if descending else rank)
+        return rows[np.lexsort(keys)]
+
+
+def run_query(path, query, key=None):
+    """Executa ``query`` sobre a tabela em ``path``: ``(total, filtradas, página)``.
+
+    Páginas sem filtros nem ordenação de um Parquet ainda fora do cache leem
+    só os row groups necessários; as demais usam a tabela carregada em
+    memória (``load_variant_table``), que fica no cache para as próximas.
+    """
+    if query.is_plain and is_parquet(path):
+        table = variant_tables.peek(key if key is not None else path, path)
+    else:
+        table = load_variant_table(path, key)
+
+    if table is None:
+        total = filtered = count_rows(path)
+        records = read_rows(path, query.start, query.length, columns=query.columns)[query.columns] \
+            .to_dict("records")
+    else:
+        total = table.num_rows
+        filtered, records = query.execute(table)
+    # Valores como texto, como a tabela espera (e sem NaN no JSON)
+    return total, filtered, [{k: str(v) for k, v in row.items()} for row in records]
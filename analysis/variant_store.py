@@ -0,0 +1,317 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .vcf_reader import RECORD_COLUMNS
+
+# Colunas da tabela de variantes exportada
+VARIANT_COLUMNS = RECORD_COLUMNS + ["GENES"]
+
+STORE_NAME = "variants.parquet"
+LEGACY_CSV_NAME = "variants.csv"
+
+# Linhas por row group: a unidade mínima lida pela API (página ou região)
+ROW_GROUP_SIZE = 65536
+
+# Linhas lidas de cada sequência ordenada por vez na intercalação (ordenação externa)
+MERGE_BATCH_ROWS = 8192
+
+SCHEMA = pa.schema([
+    ("CHROM", pa.string()),
+    ("POS", pa.int64()),
+    ("REF", pa.string()),
+    ("ALT", pa.string()),
+    ("QUAL", pa.float64()),
+    ("TYPE", pa.string()),
+    ("IMPACT", pa.string()),
+    ("GENES", pa.string()),
+])
+
+
+def is_parquet(path):
+    return str(path).endswith(".parquet")
+
+
+def find_variant_table(results_dir):
+    """Tabela de variantes de uma análise: o Parquet, ou o CSV de análises antigas."""
+    for name in (STORE_NAME, LEGACY_CSV_NAME):
+        path = os.path.join(results_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def part_path(path, i):
+    """Caminho de uma parte (shard) de ``path``, mantendo a extensão."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.part{i}{ext}"
+
+
+# ---------------------------
+# ESCRITA
+# ---------------------------
+def open_writer(path, row_group_size=ROW_GROUP_SIZE):
+    """Escritor incremental da tabela de variantes, escolhido pela extensão."""
+    if is_parquet(path):
+        return ParquetVariantWriter(path, row_group_size)
+    return CsvVariantWriter(path)
+
+
+class CsvVariantWriter:
+    def __init__(self, path):
+        self.path = path
+        self.first = True
+
+    def write(self, chunk):
+        chunk.to_csv(self.path, index=False, mode="w" if self.first else "a", header=self.first)
+        self.first = False
+
+    def write_table(self, table):
+        self.write(table.to_pandas())
+
+    def close(self):
+        if self.first:
+            self.write(pd.DataFrame(columns=VARIANT_COLUMNS))
+
+
+class ParquetVariantWriter:
+    """Grava a tabela em Parquet ordenada por CHROM/POS, em row groups de tamanho fixo.
+
+    CHROM segue a ordem de primeira ocorrência no VCF e POS é crescente dentro
+    de cada cromossomo; o Parquet guarda min/max por row group, o que permite
+    ler só os grupos de uma página ou região. VCFs já ordenados (o caso comum)
+    são gravados direto; os demais são reordenados ao fechar com uma ordenação
+    externa, sem carregar a tabela inteira. O arquivo final só aparece em
+    ``path`` quando completo.
+    """
+
+    def __init__(self, path, row_group_size=ROW_GROUP_SIZE):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.row_group_size = row_group_size
+        self.writer = pq.ParquetWriter(self.tmp_path, SCHEMA)
+        self.buffer = []
+        self.buffered = 0
+        self.chroms = []
+        self.seen = set()
+        self.last_pos = None
+        self.sorted = True
+
+    def write(self, chunk):
+        self.write_table(pa.Table.from_pandas(chunk[VARIANT_COLUMNS], schema=SCHEMA, preserve_index=False))
+
+    def write_table(self, table):
+        if table.num_rows == 0:
+            return
+        self._track_order(table)
+        self.buffer.append(table)
+        self.buffered += table.num_rows
+        if self.buffered >= self.row_group_size:
+            self._flush(final=False)
+
+    def _track_order(self, table):
+        chroms = table.column("CHROM").to_numpy(zero_copy_only=False)
+        pos = table.column("POS").to_numpy()
+        starts = np.r_[0, np.flatnonzero(chroms[1:] != chroms[:-1]) + 1]
+        for i in starts.tolist():
+            chrom = chroms[i]
+            if i == 0 and self.chroms and chrom == self.chroms[-1]:
+                if pos[0] < self.last_pos:
+                    self.sorted = False
+                continue
+            if chrom in self.seen:
+                self.sorted = False
+            else:
+                self.seen.add(chrom)
+                self.chroms.append(chrom)
+        same = chroms[1:] == chroms[:-1]
+        if (np.diff(pos)[same] < 0).any():
+            self.sorted = False
+        self.last_pos = int(pos[-1])
+
+    def _flush(self, final):
+        if not self.buffer:
+            return
+        table = pa.concat_tables(self.buffer)
+        n_full = table.num_rows - table.num_rows % self.row_group_size
+        end = table.num_rows if final else n_full
+        if end:
+            self.writer.write_table(table.slice(0, end), row_group_size=self.row_group_size)
+        rest = table.slice(end)
+        self.buffer = [rest] if rest.num_rows else []
+        self.buffered = rest.num_rows
+
+    def close(self):
+        self._flush(final=True)
+        self.writer.close()
+        if self.sorted:
+            os.replace(self.tmp_path, self.path)
+            return
+        # Ordenação externa por (cromossomo na ordem em que apareceu, POS): cada
+        # row group vira uma sequência ordenada e as sequências são intercaladas;
+        # a memória fica em um row group mais um lote por sequência
+        unsorted_path = self.tmp_path
+        runs_path = f"{self.path}.runs.tmp"
+        try:
+            runs = self._write_sorted_runs(unsorted_path, runs_path)
+            os.remove(unsorted_path)
+            self.tmp_path = f"{self.path}.sorting.tmp"
+            self.writer = pq.ParquetWriter(self.tmp_path, SCHEMA)
+            self._merge_runs(runs_path, runs)
+            self._flush(final=True)
+            self.writer.close()
+        finally:
+            for path in (unsorted_path, runs_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        os.replace(self.tmp_path, self.path)
+
+    def _merge_keys(self, table):
+        """(cromossomo << 32 | POS, número da linha no arquivo): chave única de cada linha."""
+        rank = pc.index_in(table.column("CHROM"), value_set=pa.array(self.chroms, pa.string()))
+        # POS do VCF cabe em 32 bits
+        key = (rank.to_numpy(zero_copy_only=False).astype(np.int64) << 32) | table.column("POS").to_numpy()
+        return key, table.column("_ROW").to_numpy()
+
+    def _write_sorted_runs(self, unsorted_path, runs_path):
+        """Grava cada row group ordenado em ``runs_path``; retorna os row groups de cada sequência."""
+        source = pq.ParquetFile(unsorted_path)
+        runs = []
+        first_row = 0
+        schema = SCHEMA.append(pa.field("_ROW", pa.int64()))
+        with pq.ParquetWriter(runs_path, schema) as writer:
+            group = 0
+            for i in range(source.num_row_groups):
+                table = source.read_row_group(i)
+                table = table.append_column("_ROW", pa.array(np.arange(first_row, first_row + table.num_rows)))
+                first_row += table.num_rows
+                key, row = self._merge_keys(table)
+                writer.write_table(table.take(np.lexsort((row, key))), row_group_size=MERGE_BATCH_ROWS)
+                n_groups = -(-table.num_rows // MERGE_BATCH_ROWS)
+                runs.append(range(group, group + n_groups))
+                group += n_groups
+        return runs
+
+    def _merge_runs(self, runs_path, runs):
+        """Intercala as sequências ordenadas, um lote de cada por vez.
+
+        A cada rodada, a menor das últimas chaves dos lotes carregados é um
+        limite seguro: nenhuma linha ainda não lida fica abaixo dele, então
+        todas as linhas até o limite saem ordenadas.
+        """
+        source = pq.ParquetFile(runs_path)
+        pending = [iter(run) for run in runs]
+        batches = [None] * len(runs)
+        while True:
+            for i, groups in enumerate(pending):
+                if batches[i] is None or batches[i].num_rows == 0:
+                    group = next(groups, None)
+                    batches[i] = None if group is None else source.read_row_group(group)
+            loaded = [(i, batch, *self._merge_keys(batch)) for i, batch in enumerate(batches) if batch is not None]
+            if not loaded:
+                return
+            bound_key, bound_row = min((key[-1], row[-1]) for _, _, key, row in loaded)
+            parts = []
+            for i, batch, key, row in loaded:
+                n = int(((key < bound_key) | ((key == bound_key) & (row <= bound_row))).sum())
+                parts.append(batch.slice(0, n))
+                batches[i] = batch.slice(n)
+            merged = pa.concat_tables(parts)
+            key, row = self._merge_keys(merged)
+            self.buffer.append(merged.take(np.lexsort((row, key))).drop_columns(["_ROW"]))
+            self.buffered += merged.num_rows
+            self._flush(final=False)
+
+
+def concat_parts(part_paths, output_path):
+    """Junta as partes gravadas pelos shards, na ordem, em ``output_path``."""
+    if not is_parquet(output_path):
+        with open(output_path, "wb") as out:
+            for i, path in enumerate(part_paths):
+                with open(path, "rb") as part:
+                    if i > 0:
+                        part.readline()  # só o primeiro cabeçalho
+                    shutil.copyfileobj(part, out)
+        return
+    writer = open_writer(output_path)
+    for path in part_paths:
+        parquet_file = pq.ParquetFile(path)
+        for i in range(parquet_file.num_row_groups):
+            writer.write_table(parquet_file.read_row_group(i))
+    writer.close()
+
+
+# ---------------------------
+# LEITURA
+# ---------------------------
+def iter_chunks(path, chunk_size=50000, columns=None):
+    """Itera sobre a tabela em DataFrames de até ``chunk_size`` linhas."""
+    if is_parquet(path):
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+        return
+    for chunk in pd.read_csv(path, chunksize=chunk_size, usecols=columns,
+                             keep_default_na=False, dtype={"CHROM": str}):
+        yield chunk.reset_index(drop=True)
+
+
+def count_rows(path):
+    """Número de variantes (dos metadados, no Parquet)."""
+    if is_parquet(path):
+        return pq.ParquetFile(path).metadata.num_rows
+    return sum(len(chunk) for chunk in iter_chunks(path, columns=["POS"]))
+
+
+def read_rows(path, start, length, columns=None):
+    """Linhas ``[start, start + length)``, lendo só os row groups que as contêm."""
+    if not is_parquet(path):
+        rows = pd.read_csv(path, skiprows=range(1, start + 1), nrows=length, usecols=columns,
+                           keep_default_na=False, dtype={"CHROM": str})
+        return rows.reset_index(drop=True)
+
+    parquet_file = pq.ParquetFile(path)
+    sizes = [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)]
+    bounds = np.cumsum([0] + sizes)
+    end = start + length
+    groups = [i for i in range(len(sizes)) if bounds[i] < end and bounds[i + 1] > start]
+    if not groups:
+        return pd.DataFrame(columns=columns or VARIANT_COLUMNS)
+    table = parquet_file.read_row_groups(groups, columns=columns)
+    offset = start - int(bounds[groups[0]])
+    return table.slice(offset, length).to_pandas()
+
+
+def iter_csv(path, chunk_size=50000):
+    """Gera a tabela como texto CSV, bloco a bloco (download sob demanda)."""
+    if not is_parquet(path):
+        with open(path, "r", encoding="utf-8") as f:
+            yield from iter(lambda: f.read(1024 * 1024), "")
+        return
+    first = True
+    for chunk in iter_chunks(path, chunk_size):
+        yield chunk.to_csv(index=False, header=first)
+        first = False
+    if first:
+        yield pd.DataFrame(columns=VARIANT_COLUMNS).to_csv(index=False)
+
+
+def parse_region(text):
+    """Interpreta ``chrom``, ``chrom:pos`` ou ``chrom:início-fim`` (1-based, inclusivo)."""
+    text = text.strip().replace(",", "")
+    # Nomes de contig podem ter ":" (ex.: HLA-A*01:01); a posição vem depois do último
+    chrom, _, span = text.rpartition(":") if ":" in text else (text, "", "")
+    if not chrom:
+        raise ValueError(f"Região inválida: {text!r}")
+    if not span:
+        return chrom, None, None
+    first, dash, last = span.partition("-")
+    start = int(first) if first else None
+    end = int(last) if last else (None if dash else start)
+    if start is not None and end is not None and end < start:
+        raise ValueError(f"Região inválida: {text!r}")
+    return chrom, start, end
@@ -1,23 +1,115 @@
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import os
-from collections import defaultdict, Counter
-import vcf  # PyVCF
-from BCBio import GFF
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from .gff_parser import load_gene_index
+from .annotation import assign_genes, join_genes, GeneTally
+from .aggregates import VariantStats, DensityPyramid, DENSITY_BASE_WINDOW
+from .vcf_reader import (iter_records, iter_native, iter_range_lines, shard_byte_ranges,
+                         RECORD_COLUMNS, DEFAULT_BACKEND)
+from .variant_store import open_writer, concat_parts, iter_chunks, part_path
+from .plots import PlotRenderer, coarsen_steps, MUTATION_DENSITY_BINS, POOL_START_METHOD
+import math
 import warnings
 warnings.filterwarnings("ignore")
 
+# Faixas de bytes por processo no modo paralelo (faixas menores equilibram a carga)
+SHARDS_PER_WORKER = 4
+
+# Barras do gráfico de QUAL (bins vizinhos do histograma são agrupados)
+QUAL_PLOT_BINS = 30
+
+# Hotspots guardados em ``metrics`` (as janelas mais densas), mantendo-o pequeno;
+# o total de janelas acima do limiar fica em ``hotspot_count``
+MAX_HOTSPOTS = 100
+
+
+def export_chunk(rows, writer, stats, gene_index=None, tally=None, weight_by_alleles=False):
+    """Monta o DataFrame de um bloco de registros, atualiza os agregados e o grava."""
+    chunk = pd.DataFrame(rows, columns=RECORD_COLUMNS)
+    # QUAL sempre float: a saída não depende de como os registros foram divididos
+    chunk["QUAL"] = chunk["QUAL"].astype(np.float64)
+    stats.update(chunk)
+    if gene_index is not None:
+        pairs = assign_genes(chunk, gene_index)
+        weights = chunk["ALT"].str.count(",").to_numpy() + 1 if weight_by_alleles else None
+        tally.update(chunk, pairs, weights=weights)
+        chunk["GENES"] = join_genes(pairs, len(chunk))
+    else:
+        chunk["GENES"] = ""
+    writer.write(chunk)
+    return chunk
+
+
+# ---------------------------
+# SHARDS (modo paralelo)
+# ---------------------------
+_shard_gene_index = None
+
+
+def _init_shard_worker(gene_index):
+    global _shard_gene_index
+    _shard_gene_index = gene_index
+
+
+def process_shard(vcf_path, start, end, output_path, chunk_size, base_window, weight_by_alleles):
+    """Processa uma faixa de bytes do VCF e devolve seus agregados parciais.
+
+    Roda num processo do pool; as variantes vão para ``output_path`` e os
+    agregados (``VariantStats`` e, com GFF, ``GeneTally``) voltam para o
+    processo principal, que os combina na ordem das faixas.
+    """
+    stats = VariantStats(base_window=base_window)
+    tally = GeneTally() if _shard_gene_index is not None else None
+    writer = open_writer(output_path)
+    rows = []
+    for record in iter_native(iter_range_lines(vcf_path, start, end)):
+        rows.append(record)
+        if len(rows) >= chunk_size:
+            export_chunk(rows, writer, stats, _shard_gene_index, tally, weight_by_alleles)
+            rows = []
+    export_chunk(rows, writer, stats, _shard_gene_index, tally, weight_by_alleles)
+    writer.close()
+    return stats, tally
+
 
 class VCFAnalyzer:
-    def __init__(self, vcf_path):
+    """Processa um VCF, gerando a tabela de variantes, métricas e gráficos de QC.
+
+    Com ``streaming=True`` os registros são processados em blocos de
+    ``chunk_size`` linhas: o CSV é escrito incrementalmente e só os agregados
+    (contadores, histograma de QUAL e contagens de densidade por janela)
+    ficam em memória, em vez da tabela inteira.
+
+    ``backend`` escolhe o leitor de VCF (ver ``vcf_reader.PARSER_BACKENDS``):
+    o tokenizador nativo, padrão, ou o ``vcf.Reader`` do PyVCF.
+
+    Com ``workers > 1`` o VCF é dividido em faixas de bytes alinhadas aos
+    registros, processadas num pool de processos e combinadas; o resultado
+    (sempre no modo streaming) é idêntico ao da execução serial. VCFs
+    compactados e o backend PyVCF são processados serialmente.
+
+    Com ``region`` só as variantes da região são lidas, pelo índice tabix:
+    ``vcf_path`` deve ser um VCF em BGZF com ``.tbi`` (ver ``tabix``).
+    """
+
+    def __init__(self, vcf_path, streaming=False, chunk_size=50000, window_size=1000,
+                 backend=DEFAULT_BACKEND, workers=1, region=None):
         self.vcf_path = vcf_path
+        self.backend = backend
+        self.region = region or None
+        self.workers = workers
+        self.streaming = streaming or workers > 1
+        self.chunk_size = chunk_size
+        self.window_size = window_size
+        self.output_path = None
+        self.stats = None
+        self.gene_tally = None
         self.df_variants = None
-        self.df_quality = None
-        self.qual_scores = []
-        self.density_data = defaultdict(list)
+        self._pyramid = None
+        self._density = {}
         self.annotations = []
 
         self.metrics = {
@@ -31,256 +123,307 @@ class VCFAnalyzer:
             "ti_tv_ratio": 0,
             "mean_quality": 0,
             "chrom_distribution": {},
-            "annotations": [],
-            "impact_counts": defaultdict(int),
+            "impact_counts": {},
             "top_genes": [],
             "ti_tv_gene": {},
-            "hotspots": []
+            "hotspots": [],
+            "hotspot_count": 0
         }
 
     # ---------------------------
     # PROCESSAMENTO DO VCF
     # ---------------------------
-    def process_and_export(self, output_csv_path):
-        reader = vcf.Reader(filename=self.vcf_path)
+    def process_and_export(self, output_path, gene_index=None, weight_by_alleles=False):
+        """Lê o VCF, calcula os agregados e exporta a tabela de variantes.
+
+        O formato segue a extensão de ``output_path``: ``.parquet`` (ver
+        ``variant_store``) ou CSV.
+
+        Com ``gene_index`` a coluna GENES é preenchida durante a leitura e as
+        contagens por gene (ponderadas pelo número de alelos alternativos se
+        ``weight_by_alleles``) vão para ``top_genes``/``ti_tv_gene``.
+        """
+        self.output_path = output_path
+        self.stats = VariantStats(base_window=math.gcd(self.window_size, DENSITY_BASE_WINDOW))
+        self._pyramid = None
+        self._density = {}
+        self.gene_tally = GeneTally() if gene_index is not None else None
+
+        if (self.workers > 1 and self.backend == "native" and self.region is None
+                and not str(self.vcf_path).endswith(".gz")):
+            self._process_parallel(output_path, gene_index, weight_by_alleles)
+            self._apply_aggregates()
+            return None
+
+        writer = open_writer(output_path)
+        export = dict(writer=writer, stats=self.stats, gene_index=gene_index, tally=self.gene_tally,
+                      weight_by_alleles=weight_by_alleles)
         variants_list = []
 
-        TI = {("A", "G"), ("G", "A"), ("C", "T"), ("T", "C")}
-        TV = {("A", "C"), ("C", "A"), ("A", "T"), ("T", "A"),
-              ("G", "C"), ("C", "G"), ("G", "T"), ("T", "G")}
-
-        for record in reader:
-            self.metrics["total_variants"] += 1
-            chrom = record.CHROM
-            pos = record.POS
-            ref = str(record.REF)
-            alt_list = [str(a) for a in record.ALT] if record.ALT else ["N"]
-            qual = record.QUAL if record.QUAL is not None else 0
-
-            var_type = "SNP" if record.is_snp else "INDEL" if record.is_indel else "MNV"
-            if record.is_snp:
-                self.metrics["snp_count"] += 1
-            elif record.is_indel:
-                self.metrics["indel_count"] += 1
-            else:
-                self.metrics["mnv_count"] += 1
-
-            self.qual_scores.append(qual)
-            if qual < 20:
-                self.metrics["low_quality_count"] += 1
-
-            if record.is_snp and len(alt_list) == 1:
-                pair = (ref, alt_list[0])
-                if pair in TI:
-                    self.metrics["transitions"] += 1
-                elif pair in TV:
-                    self.metrics["transversions"] += 1
-
-            self.metrics["chrom_distribution"][chrom] = self.metrics["chrom_distribution"].get(chrom, 0) + 1
-            self.density_data[chrom].append(pos if pos else 0)
-
-            # Impacto funcional
-            impact_info = record.INFO.get("ANN")
-            if impact_info:
-                ann_str = impact_info[0] if isinstance(impact_info, list) else impact_info
-                if "synonymous_variant" in ann_str:
-                    self.metrics["impact_counts"]["synonymous"] += 1
-                elif "missense_variant" in ann_str:
-                    self.metrics["impact_counts"]["nonsynonymous"] += 1
-                elif "frameshift_variant" in ann_str:
-                    self.metrics["impact_counts"]["frameshift"] += 1
-                elif "stop_gained" in ann_str:
-                    self.metrics["impact_counts"]["stop_gain"] += 1
-                elif "stop_lost" in ann_str:
-                    self.metrics["impact_counts"]["stop_loss"] += 1
-
-            variants_list.append({
-                "CHROM": chrom,
-                "POS": pos,
-                "REF": ref,
-                "ALT": ",".join(alt_list),
-                "QUAL": qual,
-                "TYPE": var_type,
-                "GENES": ""
-            })
-
-        self.qual_scores = [q for q in self.qual_scores if q is not None]
-        if self.qual_scores:
-            self.metrics["mean_quality"] = float(np.mean(self.qual_scores))
-        if self.metrics["transversions"] > 0:
-            self.metrics["ti_tv_ratio"] = self.metrics["transitions"] / self.metrics["transversions"]
-
-        df = pd.DataFrame(variants_list)
-        df.to_csv(output_csv_path, index=False)
-        self.df_variants = df
-        self.df_quality = pd.DataFrame({"QUAL": self.qual_scores})
+        for record in iter_records(self.vcf_path, self.backend, region=self.region):
+            variants_list.append(record)
+
+            if self.streaming and len(variants_list) >= self.chunk_size:
+                export_chunk(variants_list, **export)
+                variants_list = []
 
-        if not self.qual_scores:
-            self.qual_scores = [0]
-        if not self.density_data:
-            self.density_data = {"chr1": [0]}
+        df = export_chunk(variants_list, **export)
+        writer.close()
+        self._apply_aggregates()
+        if self.streaming:
+            return None
 
+        self.df_variants = df
         return df
 
+    def _apply_aggregates(self):
+        self.stats.apply(self.metrics)
+        if self.gene_tally is not None:
+            self.metrics["top_genes"] = self.gene_tally.top(10)
+            self.metrics["ti_tv_gene"] = self.gene_tally.ratios()
+
+    def _process_parallel(self, output_path, gene_index, weight_by_alleles):
+        ranges = shard_byte_ranges(self.vcf_path, self.workers * SHARDS_PER_WORKER)
+        part_paths = [part_path(output_path, i) for i in range(len(ranges))]
+        # O índice de genes vai para cada processo uma vez (initargs), não por tarefa
+        pool = ProcessPoolExecutor(
+            max_workers=min(self.workers, max(len(ranges), 1)),
+            mp_context=multiprocessing.get_context(POOL_START_METHOD),
+            initializer=_init_shard_worker,
+            initargs=(gene_index,),
+        )
+        try:
+            with pool:
+                futures = [
+                    pool.submit(process_shard, self.vcf_path, start, end, path,
+                                self.chunk_size, self.stats.density.base_window, weight_by_alleles)
+                    for (start, end), path in zip(ranges, part_paths)
+                ]
+                # Combina na ordem das faixas: contadores por chave mantêm a ordem serial
+                for future in futures:
+                    stats, tally = future.result()
+                    self.stats.merge(stats)
+                    if self.gene_tally is not None:
+                        self.gene_tally.merge(tally)
+
+            if part_paths:
+                concat_parts(part_paths, output_path)
+            else:
+                open_writer(output_path).close()
+        finally:
+            for path in part_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def iter_variant_chunks(self, chunk_size=None):
+        """Itera sobre a tabela de variantes em blocos (da memória ou do arquivo exportado)."""
+        if self.df_variants is not None:
+            yield self.df_variants
+            return
+        if self.output_path is None:
+            raise ValueError("VCF não processado")
+        yield from iter_chunks(self.output_path, chunk_size or self.chunk_size)
+
+    # ---------------------------
+    # ESTADO (REANÁLISE INCREMENTAL)
+    # ---------------------------
+    def variant_positions(self):
+        """Posições das variantes por cromossomo, como arrays (ordem da tabela)."""
+        parts = {}
+        for chunk in self.iter_variant_chunks():
+            pos = chunk["POS"].to_numpy(dtype=np.int64)
+            for chrom, rows in chunk.groupby("CHROM", sort=False).indices.items():
+                parts.setdefault(chrom, []).append(pos[rows])
+        return {chrom: np.concatenate(arrays) for chrom, arrays in parts.items()}
+
+    def save_state(self, state_path):
+        """Grava os agregados e as posições por cromossomo em ``state_path`` (.npz).
+
+        Com eles ``restore_state`` refaz densidade, gráficos e métricas sem
+        reler o VCF.
+        """
+        positions = self.variant_positions()
+        chroms = list(positions)
+        sizes = [positions[c].size for c in chroms]
+        state = self.stats.state()
+        # Bins do histograma de QUAL vão como array, fora do JSON
+        qual_counts = np.asarray(state["quality"].pop("counts"), dtype=np.int64)
+        tmp_path = f"{state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                stats=np.array(json.dumps(state)),
+                qual_counts=qual_counts,
+                chroms=np.array(chroms, dtype=str),
+                offsets=np.cumsum([0] + sizes).astype(np.int64),
+                positions=np.concatenate([positions[c] for c in chroms]) if chroms else np.zeros(0, dtype=np.int64),
+            )
+        os.replace(tmp_path, state_path)
+
+    def restore_state(self, state_path, output_path):
+        """Retoma uma análise já processada a partir de ``save_state`` e da tabela exportada."""
+        with np.load(state_path) as data:
+            state = json.loads(str(data["stats"]))
+            if "qual_counts" in data:
+                state["quality"]["counts"] = data["qual_counts"]
+            chroms = data["chroms"].tolist()
+            offsets = data["offsets"]
+            all_positions = data["positions"]
+            positions = {chrom: all_positions[offsets[i]:offsets[i + 1]] for i, chrom in enumerate(chroms)}
+        self._pyramid = None
+        self._density = {}
+        self.stats = VariantStats.from_state(
+            state, positions, base_window=math.gcd(self.window_size, DENSITY_BASE_WINDOW)
+        )
+        self.output_path = output_path
+        # Tudo passa a vir dos agregados e do arquivo, como no modo streaming
+        self.streaming = True
+        self.df_variants = None
+        self._apply_aggregates()
+
     # ---------------------------
     # ANOTAÇÃO COM GFF
     # ---------------------------
-    def annotate_with_gff(self, gff_path):
-        if self.df_variants is None:
-            raise ValueError("VCF não processado")
+    def annotate_with_gff(self, gff_path, cache_dir=None, weight_by_alleles=False):
+        gene_index = load_gene_index(gff_path, cache_dir=cache_dir)
+        return self.annotate(gene_index, weight_by_alleles=weight_by_alleles)
 
-        annotations = []
-        gff_data = {}
-        with open(gff_path) as gff_file:
-            for rec in GFF.parse(gff_file):
-                chrom = rec.id
-                gff_data.setdefault(chrom, [])
-                for feature in rec.features:
-                    if 'gene' in feature.type.lower():
-                        start = int(feature.location.start)
-                        end = int(feature.location.end)
-                        gene_id = feature.qualifiers.get('Name', feature.qualifiers.get('ID', ['unknown']))[0]
-                        gff_data[chrom].append((start, end, gene_id))
-
-        for idx, row in self.df_variants.iterrows():
-            chrom = row['CHROM']
-            pos = row['POS']
-            genes = []
-            if chrom in gff_data:
-                for start, end, gene_id in gff_data[chrom]:
-                    if start <= pos <= end:
-                        genes.append(gene_id)
-            self.df_variants.at[idx, 'GENES'] = ','.join(genes) if genes else ''
-            annotations.append({
-                "CHROM": chrom,
-                "POS": pos,
-                "REF": row['REF'],
-                "ALT": row['ALT'],
-                "GENES": ','.join(genes) if genes else ''
-            })
+    def annotate(self, gene_index, weight_by_alleles=False):
+        """Preenche GENES e as contagens por gene com ``gene_index``, após a leitura."""
+        if self.df_variants is None and self.output_path is None:
+            raise ValueError("VCF não processado")
 
+        # Junção ordenada variantes x genes, sem laços por linha
+        tally = GeneTally()
+
+        def weights(df):
+            return df["ALT"].str.count(",").to_numpy() + 1 if weight_by_alleles else None
+
+        if self.df_variants is not None:
+            pairs = assign_genes(self.df_variants, gene_index)
+            tally.update(self.df_variants, pairs, weights=weights(self.df_variants))
+            self.df_variants['GENES'] = join_genes(pairs, len(self.df_variants))
+            annotations = self.df_variants[["CHROM", "POS", "REF", "ALT", "GENES"]].to_dict("records")
+        else:
+            # Streaming: reescreve a tabela bloco a bloco com a coluna GENES
+            root, ext = os.path.splitext(self.output_path)
+            tmp_path = f"{root}.annotating{ext}"
+            writer = open_writer(tmp_path)
+            for chunk in self.iter_variant_chunks():
+                pairs = assign_genes(chunk, gene_index)
+                tally.update(chunk, pairs, weights=weights(chunk))
+                chunk["GENES"] = join_genes(pairs, len(chunk))
+                writer.write(chunk)
+            writer.close()
+            os.replace(tmp_path, self.output_path)
+            annotations = []
+
+        # Anotações por variante ficam fora de ``metrics`` (ver services.store_annotations)
         self.annotations = annotations
-        self.metrics['annotations'] = annotations
-
-        # Top genes
-        gene_counter = Counter()
-        for var in annotations:
-            for gene in var.get("GENES", "").split(","):
-                if gene:
-                    gene_counter[gene] += 1
-        self.metrics["top_genes"] = gene_counter.most_common(10)
-
-        # Ti/Tv por gene
-        TI = {("A", "G"), ("G", "A"), ("C", "T"), ("T", "C")}
-        TV = {("A", "C"), ("C", "A"), ("A", "T"), ("T", "A"),
-              ("G", "C"), ("C", "G"), ("G", "T"), ("T", "G")}
-        ti_tv_gene = defaultdict(lambda: {"Ti": 0, "Tv": 0})
-        for var in annotations:
-            genes = [g for g in var.get("GENES", "").split(",") if g]
-            ref, alt = var["REF"], var["ALT"]
-            for g in genes:
-                if (ref, alt) in TI:
-                    ti_tv_gene[g]["Ti"] += 1
-                elif (ref, alt) in TV:
-                    ti_tv_gene[g]["Tv"] += 1
-        self.metrics["ti_tv_gene"] = {g: t["Ti"] / t["Tv"] if t["Tv"] > 0 else 0
-                                      for g, t in ti_tv_gene.items()}
+        self.gene_tally = tally
+        self.metrics["top_genes"] = tally.top(10)
+        self.metrics["ti_tv_gene"] = tally.ratios()
 
         return annotations
 
     # ---------------------------
     # DENSIDADE & HOTSPOTS
     # ---------------------------
+    def density_pyramid(self):
+        """Pirâmide de densidade (ver ``DensityPyramid``), montada uma vez por análise."""
+        if self.stats is None:
+            raise ValueError("VCF não processado")
+        if self._pyramid is None:
+            self._pyramid = DensityPyramid.from_counter(self.stats.density)
+        return self._pyramid
+
     def calculate_density(self, window_size=1000):
-        density_rows = []
-        for chrom, positions in self.density_data.items():
-            if not positions:
-                continue
-            max_pos = max(positions)
-            bins = range(0, max_pos + window_size, window_size)
-            counts, edges = np.histogram(positions, bins=bins)
-            for i, count in enumerate(counts):
-                density_rows.append({
-                    "CHROM": chrom,
-                    "WINDOW_START": int(edges[i]),
-                    "COUNT": int(count),
-                    "DENSITY_NORM": float(count / (window_size / 1000))  # var/kb
-                })
-        df = pd.DataFrame(density_rows)
-        self.metrics["hotspots"] = df[df["DENSITY_NORM"] > 5].to_dict(orient="records")
+        df = self._density.get(window_size)
+        if df is None:
+            df = self._density[window_size] = self._density_frame(window_size)
+        hotspots = df[df["DENSITY_NORM"] > 5]
+        self.metrics["hotspots"] = hotspots.nlargest(MAX_HOTSPOTS, "COUNT").sort_index().to_dict(orient="records")
+        self.metrics["hotspot_count"] = len(hotspots)
         return df
 
+    def _density_frame(self, window_size):
+        pyramid = self.density_pyramid()
+        parts = []
+        if window_size % pyramid.base_window == 0:
+            # Soma os bins precomputados da pirâmide
+            for chrom in self.stats.chrom_distribution:
+                parts.append((chrom, *pyramid.windows(chrom, window_size)))
+        elif self.df_variants is not None:
+            for chrom, rows in self.df_variants.groupby("CHROM", sort=False).indices.items():
+                positions = self.df_variants["POS"].to_numpy(dtype=np.int64)[rows]
+                counts, edges = np.histogram(positions, bins=range(0, positions.max() + window_size, window_size))
+                parts.append((chrom, edges[:-1].astype(np.int64), counts.astype(np.int64)))
+        else:
+            raise ValueError(
+                f"Janela de {window_size} bp não é múltipla da resolução base ({pyramid.base_window} bp)"
+            )
+        counts = np.concatenate([c for _, _, c in parts]) if parts else np.zeros(0, dtype=np.int64)
+        return pd.DataFrame({
+            "CHROM": np.repeat([chrom for chrom, _, _ in parts], [c.size for _, _, c in parts]).astype(object),
+            "WINDOW_START": np.concatenate([s for _, s, _ in parts]) if parts else np.zeros(0, dtype=np.int64),
+            "COUNT": counts,
+            "DENSITY_NORM": counts / (window_size / 1000),  # var/kb
+        })
+
     def get_density_data(self, window_size=1000):
         df = self.calculate_density(window_size)
-        if df.empty:
-            return {}
         plot_data = {}
-        for chrom in df["CHROM"].unique():
-            sub = df[df["CHROM"] == chrom]
+        for chrom, rows in df.groupby("CHROM", sort=False).indices.items():
             plot_data[chrom] = {
-                "x": sub["WINDOW_START"].tolist(),
-                "y": sub["DENSITY_NORM"].tolist(),
-                "count": sub["COUNT"].tolist()
+                "x": df["WINDOW_START"].to_numpy()[rows].tolist(),
+                "y": df["DENSITY_NORM"].to_numpy()[rows].tolist(),
+                "count": df["COUNT"].to_numpy()[rows].tolist()
             }
         return plot_data
 
     # ---------------------------
     # PLOTS
     # ---------------------------
-    def generate_qc_plots(self, output_dir):
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Gráfico QUAL
-        qual_path = os.path.join(output_dir, "qc_quality_distribution.png")
-        if self.df_quality is not None:
-            plt.figure(figsize=(8, 4))
-            plt.hist(self.df_quality["QUAL"], bins=30, color='green', alpha=0.7)
-            plt.xlabel("QUAL")
-            plt.ylabel("Contagem")
-            plt.title("Distribuição de Qualidade")
-            plt.tight_layout()
-            plt.savefig(qual_path)
-            plt.close()
-
-        # Gráfico Densidade por cromossomo
-        density_path = os.path.join(output_dir, "density_per_chrom.png")
-        density_data = self.get_density_data()
-        if density_data:
-            plt.figure(figsize=(10, 5))
-            for chrom, data in density_data.items():
-                plt.bar(data["x"], data["y"], width=900, alpha=0.6, label=chrom)
-            plt.xlabel("Posição Genômica (bp)")
-            plt.ylabel("Densidade de Variantes (var/kb)")
-            plt.title("Densidade de Variantes por Cromossomo")
-            plt.legend()
-            plt.tight_layout()
-            plt.savefig(density_path)
-            plt.close()
-
-        mutation_density_path = self.generate_mutation_density_plot(output_dir)
-
-        return {
-            "qual_plot": qual_path,
-            "density_plot": density_path,
-            "mutation_density_plot": mutation_density_path
+    def plot_specs(self):
+        """Séries já agregadas de cada gráfico QC (ver ``plots.PlotRenderer``)."""
+        if self.stats is None:
+            raise ValueError("VCF não processado")
+        edges, counts = self.stats.quality.rebinned(QUAL_PLOT_BINS)
+        specs = {
+            "qual_plot": {"edges": edges, "counts": counts, "median": self.stats.quality.quantile(0.5)},
+            "mutation_density_plot": self.mutation_density_spec(),
         }
-    
-    def generate_mutation_density_plot(self, output_dir):
-        os.makedirs(output_dir, exist_ok=True)
-
-        density_path = os.path.join(output_dir, "mutation_density.png")
+        density_df = self.calculate_density(self.window_size)
+        if len(density_df):
+            starts = density_df["WINDOW_START"].to_numpy()
+            counts = density_df["COUNT"].to_numpy()
+            specs["density_plot"] = {"chroms": {
+                chrom: coarsen_steps(starts[rows], counts[rows], self.window_size)
+                for chrom, rows in density_df.groupby("CHROM", sort=False).indices.items()
+            }}
+        return specs
+
+    def mutation_density_spec(self):
+        """Histograma das posições (todos os cromossomos juntos) em ``MUTATION_DENSITY_BINS`` bins."""
+        if self.streaming or self.df_variants is None:
+            # Sem a tabela em memória: bins base da densidade, ponderados pelas contagens
+            density = self.stats.density
+            starts = [np.arange(c.size) * density.base_window for c in density.counts.values()]
+            if not starts:
+                return {"edges": np.zeros(1), "counts": np.zeros(0, dtype=np.int64)}
+            counts, edges = np.histogram(np.concatenate(starts), bins=MUTATION_DENSITY_BINS,
+                                         weights=np.concatenate(list(density.counts.values())))
+        else:
+            counts, edges = np.histogram(self.df_variants["POS"], bins=MUTATION_DENSITY_BINS)
+        return {"edges": edges, "counts": counts}
+
+    def generate_qc_plots(self, output_dir, workers=1):
+        """Desenha os gráficos QC em ``output_dir``; os inalterados não são redesenhados."""
+        return PlotRenderer(output_dir, workers=workers).render(self.plot_specs())
 
-        if self.df_variants is not None and "POS" in self.df_variants.columns:
-            plt.figure(figsize=(10, 4))
-            plt.hist(self.df_variants["POS"], bins=200, alpha=0.7)
-            plt.xlabel("Posição Genômica (bp)")
-            plt.ylabel("Contagem")
-            plt.title("Densidade de Mutação ao Longo do Genoma")
-            plt.tight_layout()
-            plt.savefig(density_path)
-            plt.close()
-
-        return density_path
+    def generate_mutation_density_plot(self, output_dir):
+        paths = PlotRenderer(output_dir).render({"mutation_density_plot": self.mutation_density_spec()})
+        return paths["mutation_density_plot"]
 
 
     # ---------------------------
@@ -290,4 +433,7 @@ class VCFAnalyzer:
         return self.metrics
 
     def get_quality_distribution_data(self):
-        return self.qual_scores
+        """Histograma de QUAL (bins fixos) com média, extremos e quantis."""
+        if self.stats is None:
+            raise ValueError("VCF não processado")
+        return self.stats.quality.to_dict()
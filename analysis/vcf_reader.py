@@ -0,0 +1,203 @@
+import gzip
+import os
+import re
+
+from .annotation import classify_impact
+
+PARSER_BACKENDS = ("native", "pyvcf")
+DEFAULT_BACKEND = "native"
+
+# Colunas produzidas pelos leitores, na ordem das tuplas geradas
+RECORD_COLUMNS = ["CHROM", "POS", "REF", "ALT", "QUAL", "TYPE", "IMPACT"]
+
+_ROW_PATTERN = re.compile("\t| +")
+_SNP_BASES = {"A", "C", "G", "T", "N", "*"}
+# Valores de ALT que o PyVCF converte em None (e exporta como "None")
+_MISSING = {".", "", "NA"}
+
+
+def open_vcf(path):
+    """Abre um VCF em modo texto, descompactando ``.gz`` como o PyVCF."""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path, "rt")
+
+
+def iter_records(path, backend=DEFAULT_BACKEND, region=None):
+    """Itera sobre as variantes de um VCF como tuplas ``RECORD_COLUMNS``.
+
+    ``backend`` escolhe entre o tokenizador nativo (lê só CHROM, POS, REF,
+    ALT, QUAL e as chaves ANN/SVTYPE do INFO) e o ``vcf.Reader`` do PyVCF.
+    Os dois produzem exatamente os mesmos valores.
+
+    Com ``region`` (``chrom:início-fim``) só as variantes sobrepostas à
+    região são lidas, pelo índice tabix (``path`` em BGZF com ``path.tbi``).
+    """
+    if region is not None:
+        if backend != "native":
+            raise ValueError("Leitura por região disponível apenas no backend nativo")
+        from .tabix import fetch_region
+        yield from iter_native(fetch_region(path, region))
+    elif backend == "native":
+        with open_vcf(path) as handle:
+            yield from iter_native(handle)
+    elif backend == "pyvcf":
+        yield from iter_pyvcf(path)
+    else:
+        raise ValueError(f"Backend de leitura de VCF desconhecido: {backend!r}")
+
+
+def shard_byte_ranges(path, n_shards):
+    """Divide o corpo de um VCF (sem compressão) em até ``n_shards`` faixas de bytes.
+
+    As faixas ``(início, fim)`` cobrem tudo após o cabeçalho e cada uma começa
+    no início de um registro, então podem ser lidas de forma independente.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        body = 0
+        while True:
+            line = f.readline()
+            if not line or not line.startswith(b"#"):
+                break
+            body = f.tell()
+
+        bounds = [body]
+        for i in range(1, max(n_shards, 1)):
+            target = body + (size - body) * i // n_shards
+            if target <= bounds[-1]:
+                continue
+            # Recuar um byte mantém o registro que começa exatamente em ``target``
+            f.seek(target - 1)
+            f.readline()
+            start = f.tell()
+            if start >= size:
+                break
+            if start > bounds[-1]:
+                bounds.append(start)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def iter_range_lines(path, start, end, block_size=8 * 1024 * 1024):
+    """Itera sobre as linhas de ``path`` entre os bytes ``start`` e ``end``."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        tail = b""
+        while remaining > 0:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            block = tail + block
+            cut = block.rfind(b"\n") + 1
+            tail = block[cut:]
+            yield from block[:cut].decode().split("\n")
+        if tail:
+            yield tail.decode()
+
+
+def iter_pyvcf(path):
+    import vcf  # PyVCF
+
+    for record in vcf.Reader(filename=path):
+        ref = str(record.REF)
+        alt_list = [str(a) for a in record.ALT] if record.ALT else ["N"]
+        qual = record.QUAL if record.QUAL is not None else 0
+        var_type = "SNP" if record.is_snp else "INDEL" if record.is_indel else "MNV"
+
+        # Impacto funcional
+        impact = ""
+        impact_info = record.INFO.get("ANN")
+        if impact_info:
+            ann_str = impact_info[0] if isinstance(impact_info, list) else impact_info
+            impact = classify_impact(ann_str)
+
+        yield (record.CHROM, record.POS, ref, ",".join(alt_list), qual, var_type, impact)
+
+
+def iter_native(lines):
+    """Tokenizador enxuto de linhas de VCF (cabeçalho incluso ou não)."""
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] == "#":
+            continue
+        record = parse_line(line)
+        if record is not None:
+            yield record
+
+
+def parse_line(line):
+    fields = _ROW_PATTERN.split(line) if " " in line else line.split("\t", 8)
+    if len(fields) < 8:
+        return None
+    chrom, pos, _, ref, alt_field, qual_field, _, info = fields[:8]
+
+    # int() nunca aceita ".", então QUALs decimais vão direto para float()
+    if "." in qual_field and qual_field != ".":
+        try:
+            qual = float(qual_field)
+        except ValueError:
+            qual = 0
+    else:
+        try:
+            qual = int(qual_field)
+        except ValueError:
+            try:
+                qual = float(qual_field)
+            except ValueError:
+                qual = 0
+
+    ann = None
+    is_sv = False
+    if info != "." and ("ANN" in info or "SVTYPE" in info):
+        for entry in info.split(";"):
+            key, _, value = entry.partition("=")
+            if key == "ANN":
+                ann = value.split(",", 1)[0]
+            elif key == "SVTYPE":
+                is_sv = True
+
+    if len(ref) == 1 and alt_field in _SNP_BASES:
+        # Caminho rápido: SNP bialélico, o caso mais comum
+        alt, var_type = alt_field, "SNP"
+    else:
+        alts = alt_field.split(",")
+        alt = ",".join("None" if a in _MISSING else a for a in alts)
+        var_type = variant_type(ref, alts, is_sv)
+
+    impact = ""
+    if ann and ann not in _MISSING:
+        impact = classify_impact(ann)
+    return (chrom, int(pos), ref, alt, qual, var_type, impact)
+
+
+def _alt_kind(alt):
+    """Classifica um ALT como o ``_parse_alt`` do PyVCF (None, SNV, MNV ou outro)."""
+    if alt in _MISSING:
+        return None
+    if "[" in alt or "]" in alt:
+        return "BND"
+    if len(alt) > 1 and (alt[0] == "." or alt[-1] == "."):
+        return "BND"
+    if alt[0] == "<" and alt[-1] == ">":
+        return "SV"
+    return "SNV" if len(alt) == 1 else "MNV"
+
+
+def variant_type(ref, alts, is_sv=False):
+    """Reproduz ``_Record.is_snp``/``is_indel`` do PyVCF sem criar objetos."""
+    kinds = [_alt_kind(a) for a in alts]
+
+    if len(ref) <= 1 and all(k == "SNV" and a in _SNP_BASES for a, k in zip(alts, kinds)):
+        return "SNP"
+
+    if len(ref) > 1 and not is_sv:
+        return "INDEL"
+    for alt, kind in zip(alts, kinds):
+        if kind is None or kind not in ("SNV", "MNV"):
+            return "MNV"
+        if len(alt) != len(ref):
+            return "MNV" if is_sv else "INDEL"
+    return "MNV"
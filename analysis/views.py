@@ -1,23 +1,47 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import Analysis
-from .forms import AnalysisForm
+from .forms import AnalysisForm, AnalysisRerunForm
 from .services import start_analysis_background
+from .jobs import JobAlreadyOpen
 from django.conf import settings
 import os
-import pandas as pd
-import json
-from django.http import JsonResponse
+import hashlib
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, Http404
+from django.views.decorators.http import condition
+from .variant_store import find_variant_table, iter_csv
+from .variant_query import VariantQuery, run_query
+from .table_cache import variant_tables, density_pyramids
+from .aggregates import DensityPyramid, DENSITY_PYRAMID_NAME
+from .reference_store import release_reference
+from .file_serving import analysis_file_path, analysis_file_url, find_indexed_vcf, results_dir, serve_file
+from .plots import PlotRenderer, load_plot_specs, PLOT_NAMES
+from .tabix import INDEXED_VCF_NAME, INDEX_SUFFIX
+from .metrics import collect_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+# Maior página aceita pela API de variantes
+MAX_PAGE_LENGTH = 1000
+
+# Análises por página na lista
+ANALYSES_PER_PAGE = 25
+
+# Janelas por cromossomo da API de densidade, quando a janela não é fixada
+DENSITY_MAX_BINS = 2000
 
 def home(request):
     return render(request, 'analysis/home.html')
 
 def analysis_list(request):
-    analyses = Analysis.objects.all().order_by('-created_at')
-    return render(request, 'analysis/analysis_list.html', {'analyses': analyses})
+    # Só o resumo de cada análise, uma página por vez
+    analyses = Analysis.objects.summaries().order_by('-created_at', '-id')
+    page_obj = Paginator(analyses, ANALYSES_PER_PAGE).get_page(request.GET.get('page'))
+    return render(request, 'analysis/analysis_list.html', {'analyses': page_obj, 'page_obj': page_obj})
 
 def analysis_create(request):
     if request.method == 'POST':
-        form = AnalysisForm(request.POST, request.FILES)
+        form = AnalysisForm(request.POST, request.FILES, upload_errors=getattr(request, 'upload_errors', None))
         if form.is_valid():
             analysis = form.save()
             try:
@@ -32,7 +56,9 @@ def analysis_create(request):
     return render(request, 'analysis/analysis_form.html', {'form': form})
 
 def analysis_detail(request, pk):
-    analysis = get_object_or_404(Analysis, pk=pk)
+    # Página leve: só o resumo; variantes, anotações e séries dos gráficos
+    # vêm das APIs JSON (carregadas pelo navegador sob demanda)
+    analysis = get_object_or_404(Analysis.objects.with_results().defer('plot_data'), pk=pk)
 
     # Métricas
     metrics = analysis.metrics or {}
@@ -46,33 +72,64 @@ def analysis_detail(request, pk):
                 pass
     analysis.metrics = metrics
 
+    context = {
+        'analysis': analysis,
+        'igv': igv_urls(analysis),
+    }
 
+    return render(request, 'analysis/analysis_detail.html', context)
 
-    # ---- Separar dados ----
 
-    # Variantes (vem do CSV)
-    variants = []
-    variants_csv = os.path.join(settings.MEDIA_ROOT, f"results/{analysis.id}/variants.csv")
+def igv_urls(analysis):
+    """URLs (pela view ``analysis_file``) do VCF, da referência e dos seus índices para o IGV."""
+    urls = {}
+    if find_indexed_vcf(analysis):
+        urls['vcf'] = analysis_file_url(analysis.id, INDEXED_VCF_NAME)
+        urls['vcf_index'] = analysis_file_url(analysis.id, INDEXED_VCF_NAME + INDEX_SUFFIX)
+    elif analysis.vcf_file:
+        urls['vcf'] = analysis_file_url(analysis.id, f"vcf/{os.path.basename(analysis.vcf_file.name)}")
+    if analysis.reference_file:
+        fasta = f"reference/{os.path.basename(analysis.reference_file.name)}"
+        urls['fasta'] = analysis_file_url(analysis.id, fasta)
+        # Índices gerados por run_analysis (ou enviados com um FASTA em bgzip)
+        for key, suffix in (('fasta_index', '.fai'), ('fasta_gzi', '.gzi')):
+            if os.path.exists(analysis.reference_file.path + suffix):
+                urls[key] = analysis_file_url(analysis.id, fasta + suffix)
+    return urls
 
-    if os.path.exists(variants_csv):
-        try:
-            df = pd.read_csv(variants_csv)
-            variants = df.fillna("").astype(str).to_dict("records")
-        except Exception as e:
-            print("Erro ao carregar variants.csv:", e)
 
-    # Anotações (vem das métricas JSON)
-    annotations = metrics.get("annotations", [])
+def analysis_status(request, pk):
+    """Resumo da análise para acompanhamento (polling) enquanto ela executa."""
+    analysis = get_object_or_404(Analysis.objects.summaries(), pk=pk)
+    return JsonResponse(analysis.summary())
 
-    context = {
-        'analysis': analysis,
-        'analysis_metrics': metrics,
-        'variants_json': json.dumps(variants),
-        'annotations_json': json.dumps(annotations),
-        'MEDIA_URL': settings.MEDIA_URL,
-    }
 
-    return render(request, 'analysis/analysis_detail.html', context)
+def analysis_rerun(request, pk):
+    # Reaproveita as etapas cujas entradas não mudaram (ver pipeline_state)
+    analysis = get_object_or_404(Analysis, pk=pk)
+    if request.method == 'POST':
+        previous_gff = analysis.gff_file.name
+        form = AnalysisRerunForm(request.POST, request.FILES, instance=analysis,
+                                 upload_errors=getattr(request, 'upload_errors', None))
+        if form.is_valid():
+            try:
+                # A tarefa nova e os parâmetros são gravados juntos: com uma
+                # tarefa na fila ou em execução (mesmo de um envio simultâneo),
+                # nada muda, pois o worker ignoraria os novos parâmetros
+                with transaction.atomic():
+                    start_analysis_background(analysis.id, reuse_open=False)
+                    analysis = form.save(commit=False)
+                    analysis.status = 'PENDING'
+                    analysis.save()
+            except JobAlreadyOpen:
+                form.add_error(None, "A análise ainda está na fila ou em execução; aguarde o fim para reanalisar.")
+            else:
+                if previous_gff and previous_gff != analysis.gff_file.name:
+                    release_reference(previous_gff)
+                return redirect('analysis_detail', pk=analysis.pk)
+    else:
+        form = AnalysisRerunForm(instance=analysis)
+    return render(request, 'analysis/analysis_rerun.html', {'form': form, 'analysis': analysis})
 
 
 def analysis_delete(request, pk):
@@ -82,39 +139,205 @@ def analysis_delete(request, pk):
         return redirect('analysis_list')
     return render(request, 'analysis/analysis_confirm_delete.html', {'analysis': analysis})
 
-def analysis_variants_api(request, pk):
-    """API para DataTables retornar variantes paginadas."""
-    analysis = get_object_or_404(Analysis, pk=pk)
+def analysis_etag(request, pk, *args, **kwargs):
+    """ETag das APIs JSON: versão da análise (``updated_at``) + parâmetros da consulta."""
+    updated_at = Analysis.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    query = hashlib.md5(request.GET.urlencode().encode()).hexdigest()[:16]
+    return f"{pk}-{int(updated_at.timestamp() * 1e6)}-{query}"
+
 
-    start = int(request.GET.get('start', 0))
+def paginate_params(request):
+    start = max(int(request.GET.get('start', 0)), 0)
     length = int(request.GET.get('length', 10))
+    if length < 0 or length > MAX_PAGE_LENGTH:
+        length = MAX_PAGE_LENGTH
+    return start, length
+
+
+@condition(etag_func=analysis_etag)
+def analysis_variants_api(request, pk):
+    """API para DataTables retornar variantes paginadas.
+
+    Aceita ordenação e filtros por coluna do DataTables, além de ``region``
+    (``chrom:início-fim``), ``qual_min``/``qual_max``, ``type``, ``impact`` e
+    ``gene`` (ver ``variant_query.VariantQuery``).
+    """
+    analysis = get_object_or_404(Analysis.objects.only('id'), pk=pk)
     draw = int(request.GET.get('draw', 1))
-    search_value = request.GET.get('search[value]', '')
 
-    csv_path = os.path.join(settings.MEDIA_ROOT, f'results/{analysis.id}/variants.csv')
+    try:
+        query = VariantQuery.from_params(request.GET, max_length=MAX_PAGE_LENGTH)
+    except ValueError as e:
+        return JsonResponse({'draw': draw, 'error': str(e)}, status=400)
+
+    table_path = find_variant_table(os.path.join(settings.MEDIA_ROOT, f'results/{analysis.id}'))
 
     data = []
     records_total = 0
     records_filtered = 0
 
-    if os.path.exists(csv_path):
+    if table_path:
         try:
-            df = pd.read_csv(csv_path, encoding='utf-8')
-            records_total = len(df)
+            records_total, records_filtered, data = run_query(table_path, query, key=analysis.id)
+        except Exception as e:
+            print(f"Erro ao ler tabela de variantes: {e}")
 
-            if search_value:
-                df = df[df.astype(str).apply(lambda x: x.str.contains(search_value, case=False, na=False)).any(axis=1)]
+    return JsonResponse({
+        'draw': draw,
+        'recordsTotal': records_total,
+        'recordsFiltered': records_filtered,
+        'data': data
+    })
 
-            records_filtered = len(df)
-            df_page = df.iloc[start:start+length]
-            data = df_page.astype(str).to_dict('records')
 
-        except Exception as e:
-            print(f"Erro ao ler CSV de variantes: {e}")
+@condition(etag_func=analysis_etag)
+def analysis_annotations_api(request, pk):
+    """Anotações (variante x genes) paginadas, no formato do DataTables.
+
+    ``search[value]`` filtra por cromossomo ou gene (sem diferenciar maiúsculas).
+    """
+    analysis = get_object_or_404(Analysis.objects.only('id'), pk=pk)
+    draw = int(request.GET.get('draw', 1))
+    try:
+        start, length = paginate_params(request)
+    except ValueError as e:
+        return JsonResponse({'draw': draw, 'error': str(e)}, status=400)
+
+    annotations = analysis.annotations.order_by('id')
+    records_total = annotations.count()
+    search = request.GET.get('search[value]', '').strip()
+    if search:
+        annotations = annotations.filter(Q(chrom__icontains=search) | Q(genes__icontains=search))
+        records_filtered = annotations.count()
+    else:
+        records_filtered = records_total
 
     return JsonResponse({
         'draw': draw,
         'recordsTotal': records_total,
         'recordsFiltered': records_filtered,
-        'data': data
+        'data': [a.as_row() for a in annotations[start:start + length]],
     })
+
+
+@condition(etag_func=analysis_etag)
+def analysis_plot_data(request, pk):
+    """Séries dos gráficos interativos, uma por requisição.
+
+    ``series=quality`` ou ``series=density`` (esta, opcionalmente, de um só
+    cromossomo com ``chrom``); sem ``series``, lista as séries e cromossomos.
+    """
+    analysis = get_object_or_404(Analysis.objects.only('id', 'plot_data'), pk=pk)
+    plot_data = analysis.plot_data or {}
+    series = request.GET.get('series')
+
+    if not series:
+        return JsonResponse({
+            'series': [name for name in ('quality', 'density') if name in plot_data],
+            'chroms': list(plot_data.get('density', {})),
+            'plots': plot_data.get('plots', {}),
+        })
+    if series not in ('quality', 'density'):
+        return JsonResponse({'error': f"Série desconhecida: {series}"}, status=400)
+
+    data = plot_data.get(series, [] if series == 'quality' else {})
+    chrom = request.GET.get('chrom')
+    if series == 'density' and chrom:
+        if chrom not in data:
+            raise Http404("Cromossomo sem dados de densidade")
+        data = {chrom: data[chrom]}
+    return JsonResponse({'series': series, 'data': data})
+
+
+@condition(etag_func=analysis_etag)
+def analysis_density_api(request, pk):
+    """Densidade em qualquer janela e trecho, somando os bins da pirâmide da análise.
+
+    Parâmetros: ``chrom`` (padrão: todos), ``start``/``end`` (bp) e
+    ``window_size``; sem ``window_size``, usa a menor janela da pirâmide com
+    até ``bins`` janelas no trecho (zoom).
+    """
+    analysis = get_object_or_404(Analysis.objects.only('id'), pk=pk)
+    path = os.path.join(settings.MEDIA_ROOT, f'results/{analysis.id}', DENSITY_PYRAMID_NAME)
+    if not os.path.exists(path):
+        raise Http404("Pirâmide de densidade não encontrada")
+    pyramid = density_pyramids.get(analysis.id, path, DensityPyramid.load)
+
+    chrom = request.GET.get('chrom')
+    if chrom and chrom not in pyramid.levels:
+        raise Http404("Cromossomo sem dados de densidade")
+    chroms = [chrom] if chrom else pyramid.chroms
+    try:
+        start = max(int(request.GET.get('start', 0)), 0)
+        end = int(request.GET['end']) if request.GET.get('end') else None
+        window_size = int(request.GET['window_size']) if request.GET.get('window_size') else None
+        bins = min(max(int(request.GET.get('bins', DENSITY_MAX_BINS)), 1), DENSITY_MAX_BINS)
+        if window_size is None:
+            stop = end if end is not None else max((pyramid.length(c) for c in chroms), default=start)
+            window_size = pyramid.auto_window(start, max(stop, start), bins)
+        data = {}
+        for name in chroms:
+            starts, counts = pyramid.windows(name, window_size, start, end)
+            data[name] = {
+                'x': starts.tolist(),
+                'y': (counts / (window_size / 1000)).tolist(),  # var/kb
+                'count': counts.tolist(),
+            }
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({'base_window': pyramid.base_window, 'window_size': window_size, 'data': data})
+
+
+def analysis_variants_csv(request, pk):
+    """Download da tabela de variantes em CSV, gerado sob demanda a partir do Parquet."""
+    analysis = get_object_or_404(Analysis, pk=pk)
+    table_path = find_variant_table(os.path.join(settings.MEDIA_ROOT, f'results/{analysis.id}'))
+    if not table_path:
+        raise Http404("Tabela de variantes não encontrada")
+
+    response = StreamingHttpResponse(iter_csv(table_path), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="variants_{analysis.id}.csv"'
+    return response
+
+
+def analysis_file(request, pk, name):
+    """Arquivos de uma análise (uploads, índices e resultados), com ``Range`` e cache HTTP.
+
+    Só os arquivos da própria análise são acessíveis (ver
+    ``file_serving.analysis_file_path``); o IGV lê FASTA e VCF por trechos.
+    """
+    analysis = get_object_or_404(Analysis.objects.only('id', 'vcf_file', 'reference_file', 'gff_file'), pk=pk)
+    path = analysis_file_path(analysis, name)
+    if not path or not os.path.isfile(path):
+        raise Http404("Arquivo não encontrado")
+    return serve_file(request, path)
+
+
+def analysis_plot(request, pk, name):
+    """Gráfico QC em PNG, desenhado no primeiro acesso a partir das séries gravadas pela análise.
+
+    O PNG fica em ``results/<id>/plots/`` e só é redesenhado quando as séries
+    mudam; pedidos simultâneos do mesmo gráfico resultam num só desenho.
+    """
+    analysis = get_object_or_404(Analysis.objects.only('id'), pk=pk)
+    if name not in PLOT_NAMES:
+        raise Http404("Gráfico desconhecido")
+    plots_dir = os.path.join(results_dir(analysis.id), 'plots')
+    specs = load_plot_specs(plots_dir) or {}
+    if PLOT_NAMES[name] not in specs:
+        raise Http404("Gráfico não disponível")
+    path = PlotRenderer(plots_dir).render_one(PLOT_NAMES[name], specs[PLOT_NAMES[name]])
+    return serve_file(request, path)
+
+
+def variant_cache_stats(request):
+    """Contadores do cache de tabelas de variantes deste processo."""
+    return JsonResponse(dict(variant_tables.stats(), density_pyramids=density_pyramids.stats()))
+
+
+def metrics(request):
+    """Métricas da fila e das análises no formato de texto do Prometheus."""
+    return HttpResponse(collect_metrics().render(), content_type=METRICS_CONTENT_TYPE)
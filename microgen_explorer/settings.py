@@ -43,6 +43,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Compressão das respostas (as APIs JSON de variantes/anotações/gráficos);
+    # arquivos servidos com Range ficam de fora
+    'analysis.middleware.RangeAwareGZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,6 +82,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Vários processos worker escrevem no mesmo arquivo; espera pela trava
+        'OPTIONS': {'timeout': 30},
     }
 }
 
@@ -127,3 +132,54 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Media files (Uploads and generated outputs)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# VCFs a partir deste tamanho são processados em modo streaming (blocos de
+# VCF_STREAMING_CHUNK_SIZE registros), mantendo a memória limitada
+VCF_STREAMING_MIN_BYTES = 256 * 1024 * 1024
+VCF_STREAMING_CHUNK_SIZE = 50000
+
+# VCFs a partir deste tamanho são divididos em faixas processadas por
+# VCF_PARALLEL_WORKERS processos (1 desativa o modo paralelo)
+VCF_PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+VCF_PARALLEL_WORKERS = 4
+
+# Processos usados para desenhar os gráficos QC (PNG) de uma análise
+PLOT_WORKERS = 3
+
+# Dumps de perfil de cada análise em results/<id>/profile/, por etapa:
+# <etapa>.prof (cProfile) e <etapa>.tracemalloc.txt (maiores alocações).
+# Deixam a análise mais lenta; ligar só para investigar uma execução
+ANALYSIS_PROFILE_CPROFILE = False
+ANALYSIS_PROFILE_TRACEMALLOC = False
+
+# Leitor de VCF usado nas análises: 'native' (tokenizador enxuto) ou 'pyvcf'
+VCF_PARSER_BACKEND = 'native'
+
+# Memória máxima (bytes) das tabelas de variantes mantidas em cache por
+# processo do servidor, para paginação/filtros sem reler o disco
+VARIANT_TABLE_CACHE_BYTES = 512 * 1024 * 1024
+
+# Idem para as pirâmides de densidade (API de densidade com zoom)
+DENSITY_PYRAMID_CACHE_BYTES = 64 * 1024 * 1024
+
+# Cache dos modelos de genes (GFF) já analisados, indexado pelo hash do arquivo
+GFF_CACHE_DIR = MEDIA_ROOT / 'cache' / 'gff'
+
+# Uploads são inspecionados enquanto chegam (hash, compressão, validação do
+# formato). Os grandes vão para um temporário que depois é movido para o
+# destino: com FILE_UPLOAD_TEMP_DIR no mesmo disco de MEDIA_ROOT a mudança é
+# só um rename, sem regravar o arquivo
+FILE_UPLOAD_HANDLERS = ['analysis.upload_handlers.InspectingUploadHandler']
+
+# FASTA/GFF enviados ficam num armazenamento por conteúdo (SHA-256), um
+# arquivo por conteúdo; os que nenhuma análise usa são apagados, exceto se
+# gravados há menos deste intervalo (segundos), ver `manage.py gc_references`
+REFERENCE_STORE_GRACE_SECONDS = 3600
+
+# Fila de análises (manage.py run_worker): processos por worker, tentativas
+# por tarefa e intervalos de heartbeat / detecção de workers mortos (segundos)
+ANALYSIS_WORKER_PROCESSES = os.cpu_count() or 2
+ANALYSIS_WORKER_POLL_SECONDS = 2
+ANALYSIS_JOB_MAX_ATTEMPTS = 3
+ANALYSIS_JOB_HEARTBEAT_SECONDS = 10
+ANALYSIS_JOB_STALE_SECONDS = 60